@@ -27,6 +27,12 @@ from models.file import File
 from models.comment import Comment
 from models.knowledge_collaborator import KnowledgeCollaborator
 from models.user_activity import UserActivity
+from models.user_activity_daily import UserActivityDaily
+from models.department_stats import DepartmentStats
+from models.gamification_event import GamificationEvent
+from models.gamification_dead_letter import GamificationDeadLetter
+from models.user_stats import UserStats
+from models.cache_version import CacheVersion
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,53 @@
+"""add department_stats and department ranking indexes
+
+Revision ID: 3b9d7c5e2f14
+Revises: 8c2f4e1a9b37
+Create Date: 2026-10-18 11:40:02.771930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9d7c5e2f14'
+down_revision: Union[str, None] = '8c2f4e1a9b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('department_stats',
+        sa.Column('department', sa.String(length=100), nullable=False),
+        sa.Column('user_count', sa.Integer(), nullable=False),
+        sa.Column('total_points', sa.Integer(), nullable=False),
+        sa.Column('total_level', sa.Integer(), nullable=False),
+        sa.Column('knowledge_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('department')
+    )
+    op.create_index('ix_users_department_level', 'users', ['department', 'level', 'experience_points'])
+    op.create_index('ix_users_department_points', 'users', ['department', 'points'])
+
+    # 既存のユーザー・ナレッジから部署集計を作成
+    op.execute(
+        """
+        INSERT INTO department_stats (department, user_count, total_points, total_level, knowledge_count)
+        SELECT u.department, COUNT(*), COALESCE(SUM(u.points), 0), COALESCE(SUM(u.level), 0), COALESCE(SUM(k.knowledge_count), 0)
+        FROM users u
+        LEFT JOIN (
+            SELECT author_id, COUNT(*) AS knowledge_count FROM knowledges GROUP BY author_id
+        ) k ON k.author_id = u.id
+        WHERE u.department IS NOT NULL AND u.department <> ''
+        GROUP BY u.department
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_department_points', table_name='users')
+    op.drop_index('ix_users_department_level', table_name='users')
+    op.drop_table('department_stats')
@@ -0,0 +1,45 @@
+"""add gamification_dead_letters
+
+Revision ID: 6a1c8e4b9d27
+Revises: d3a9f5c7b2e1
+Create Date: 2026-10-21 09:37:12.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a1c8e4b9d27'
+down_revision: Union[str, None] = 'd3a9f5c7b2e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('gamification_dead_letters',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('event_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('action', sa.String(length=50), nullable=False),
+        sa.Column('xp_amount', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('failed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_gamification_dead_letters_id'), 'gamification_dead_letters', ['id'], unique=False)
+    op.create_index(op.f('ix_gamification_dead_letters_user_id'), 'gamification_dead_letters', ['user_id'], unique=False)
+
+    # 上限に達して残っていたイベントは、次に処理された時点で移される
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_gamification_dead_letters_user_id'), table_name='gamification_dead_letters')
+    op.drop_index(op.f('ix_gamification_dead_letters_id'), table_name='gamification_dead_letters')
+    op.drop_table('gamification_dead_letters')
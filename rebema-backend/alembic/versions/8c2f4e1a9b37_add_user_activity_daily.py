@@ -0,0 +1,49 @@
+"""add user_activity_daily rollup
+
+Revision ID: 8c2f4e1a9b37
+Revises: 5d471a54ead8
+Create Date: 2026-10-18 09:12:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2f4e1a9b37'
+down_revision: Union[str, None] = '5d471a54ead8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_activity_daily',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('action', sa.String(length=50), nullable=False),
+        sa.Column('activity_count', sa.Integer(), nullable=False),
+        sa.Column('xp_amount', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'day', 'action')
+    )
+    op.create_index('ix_user_activity_daily_day_user', 'user_activity_daily', ['day', 'user_id'])
+
+    # 既存のアクティビティから日次集計を作成
+    op.execute(
+        """
+        INSERT INTO user_activity_daily (user_id, day, action, activity_count, xp_amount)
+        SELECT user_id, DATE(timestamp), action, COUNT(*), COALESCE(SUM(xp_amount), 0)
+        FROM user_activities
+        WHERE user_id IS NOT NULL AND action IS NOT NULL AND timestamp IS NOT NULL
+        GROUP BY user_id, DATE(timestamp), action
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_activity_daily_day_user', table_name='user_activity_daily')
+    op.drop_table('user_activity_daily')
@@ -0,0 +1,32 @@
+"""backfill user_stats recent activity
+
+Revision ID: 9e2b5d7f3a18
+Revises: 6a1c8e4b9d27
+Create Date: 2026-10-21 14:05:51.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from utils.user_stats import backfill_recent_activity
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e2b5d7f3a18'
+down_revision: Union[str, None] = '6a1c8e4b9d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 最近の活動（recent_*）を作成する（プロフィールの取得では書き込みを行わないため）
+    count = backfill_recent_activity(op.get_bind())
+    print(f"user_stats の最近の活動を作成しました: {count}件")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
@@ -0,0 +1,35 @@
+"""derive level from cumulative experience_points
+
+Revision ID: a7e05f3c91d2
+Revises: e41a6b0d8c55
+Create Date: 2026-10-18 16:22:09.640581
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e05f3c91d2'
+down_revision: Union[str, None] = 'e41a6b0d8c55'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # experience_points を累計経験値として扱うため、現在のレベルと経験値から算出する
+    # （レベル L に到達するまでの累計経験値は 5 * L * (L - 1)）
+    op.execute(
+        """
+        UPDATE users
+        SET experience_points = 5 * COALESCE(level, 1) * (COALESCE(level, 1) - 1) + COALESCE(current_xp, 0)
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
@@ -0,0 +1,33 @@
+"""add cache_versions
+
+Revision ID: b4e8d2f6a913
+Revises: f2b6c4d1e8a3
+Create Date: 2026-10-19 09:12:40.517203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e8d2f6a913'
+down_revision: Union[str, None] = 'f2b6c4d1e8a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 行は最初の変更時に作成される（行がない間のバージョンは 0）
+    op.create_table('cache_versions',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('cache_versions')
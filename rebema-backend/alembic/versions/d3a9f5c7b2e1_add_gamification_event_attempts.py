@@ -0,0 +1,31 @@
+"""add gamification_events.attempts
+
+Revision ID: d3a9f5c7b2e1
+Revises: b4e8d2f6a913
+Create Date: 2026-10-20 10:04:18.302715
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a9f5c7b2e1'
+down_revision: Union[str, None] = 'b4e8d2f6a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 反映に失敗した回数（GAMIFICATION_MAX_ATTEMPTS に達したイベントは処理対象から外れる）
+    op.add_column('gamification_events',
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('gamification_events', 'attempts')
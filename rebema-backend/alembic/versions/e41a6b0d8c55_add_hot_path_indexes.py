@@ -0,0 +1,43 @@
+"""add hot path indexes
+
+Revision ID: e41a6b0d8c55
+Revises: 3b9d7c5e2f14
+Create Date: 2026-10-18 14:05:31.202117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41a6b0d8c55'
+down_revision: Union[str, None] = '3b9d7c5e2f14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (インデックス名, テーブル名, カラム)
+INDEXES = [
+    ('ix_comments_knowledge_created', 'comments', ['knowledge_id', 'created_at']),
+    ('ix_comments_author_created', 'comments', ['author_id', 'created_at']),
+    ('ix_files_knowledge_id', 'files', ['knowledge_id']),
+    ('ix_knowledges_created_at', 'knowledges', ['created_at']),
+    ('ix_knowledges_views', 'knowledges', ['views']),
+    ('ix_knowledges_author_created', 'knowledges', ['author_id', 'created_at']),
+    ('ix_user_activities_user_timestamp', 'user_activities', ['user_id', 'timestamp']),
+    ('ix_users_level_experience', 'users', ['level', 'experience_points']),
+    ('ix_users_points', 'users', ['points']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,62 @@
+"""add user_stats
+
+Revision ID: f2b6c4d1e8a3
+Revises: c58e2d9a7f60
+Create Date: 2026-10-18 20:31:57.418826
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6c4d1e8a3'
+down_revision: Union[str, None] = 'c58e2d9a7f60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('knowledge_count', sa.Integer(), nullable=False),
+        sa.Column('comment_count', sa.Integer(), nullable=False),
+        sa.Column('total_views', sa.Integer(), nullable=False),
+        sa.Column('recent_knowledge', sa.JSON(), nullable=True),
+        sa.Column('recent_comments', sa.JSON(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # 既存ユーザーの件数を集計して行を作成する
+    # （以降は書き込み時の差分の加算で維持する。最近の活動は 9e2b5d7f3a18 で作成する）
+    op.execute(
+        """
+        INSERT INTO user_stats (user_id, knowledge_count, comment_count, total_views, updated_at)
+        SELECT users.id,
+               COALESCE(k.knowledge_count, 0),
+               COALESCE(c.comment_count, 0),
+               COALESCE(k.total_views, 0),
+               CURRENT_TIMESTAMP
+        FROM users
+        LEFT JOIN (
+            SELECT author_id, COUNT(*) AS knowledge_count, SUM(views) AS total_views
+            FROM knowledges
+            GROUP BY author_id
+        ) k ON k.author_id = users.id
+        LEFT JOIN (
+            SELECT author_id, COUNT(*) AS comment_count
+            FROM comments
+            GROUP BY author_id
+        ) c ON c.author_id = users.id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_stats')
@@ -0,0 +1,3 @@
+"""
+Benchmarks for the hot API endpoints (run with `python -m benchmarks.run`)
+"""
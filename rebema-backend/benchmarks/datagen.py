@@ -0,0 +1,247 @@
+"""
+ベンチマーク用の合成データを一括投入する
+
+    python -m benchmarks.datagen --database-url sqlite:///benchmarks/bench.db --scale 0.1
+
+既定の件数（scale=1.0）は ユーザー1万・ナレッジ10万・コメント100万・アクティビティ100万。
+乱数のシードを固定しているため、同じ件数なら毎回同じデータになる。
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.engine import Engine
+
+from models.database import Base
+# テーブル作成のため全モデルを読み込む
+from models.user import User
+from models.knowledge import Knowledge
+from models.file import File
+from models.comment import Comment
+from models.knowledge_collaborator import KnowledgeCollaborator
+from models.user_activity import UserActivity
+from models.user_activity_daily import UserActivityDaily
+from models.department_stats import DepartmentStats
+from models.profile import Profile
+from models.gamification_event import GamificationEvent
+from models.gamification_dead_letter import GamificationDeadLetter
+from models.user_stats import UserStats
+from models.cache_version import CacheVersion
+from utils.experience import experience_for_level, level_for_experience
+from utils.user_stats import backfill_recent_activity
+
+DEFAULT_SIZES = {
+    "users": 10_000,
+    "knowledge": 100_000,
+    "comments": 1_000_000,
+    "activities": 1_000_000,
+}
+
+DEPARTMENTS = ["営業部", "開発部", "人事部", "マーケティング部", "経理部", "総務部", "企画部", "カスタマーサクセス部"]
+CATEGORIES = ["メール", "電話", "訪問", "その他"]
+WORDS = ["提案", "商談", "フォロー", "見積", "クロージング", "ヒアリング", "テンプレート", "改善", "事例", "振り返り"]
+ACTIONS = ["create_knowledge", "comment"]
+
+# 1回の INSERT（executemany）で投入する行数
+CHUNK_SIZE = 10_000
+
+def scaled_sizes(scale: float) -> dict:
+    return {name: max(1, int(count * scale)) for name, count in DEFAULT_SIZES.items()}
+
+def _insert_chunks(connection, model, rows) -> int:
+    """行のイテレータを CHUNK_SIZE ごとにまとめて挿入する"""
+    total = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            connection.execute(insert(model), chunk)
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        connection.execute(insert(model), chunk)
+        total += len(chunk)
+    return total
+
+def _users(rng: random.Random, count: int, now: datetime):
+    for uid in range(1, count + 1):
+        xp = int(rng.paretovariate(1.5) * 50)
+        level = level_for_experience(xp)
+        yield {
+            "id": uid,
+            "email": f"bench-{uid}@example.com",
+            "username": f"bench-user-{uid}",
+            "level": level,
+            "points": xp,
+            "current_xp": xp - experience_for_level(level),
+            "experience_points": xp,
+            "is_first_login": False,
+            "department": DEPARTMENTS[uid % len(DEPARTMENTS)],
+            "created_at": now - timedelta(days=rng.randint(30, 730)),
+            "updated_at": now,
+        }
+
+def _knowledge(rng: random.Random, count: int, users: int, now: datetime):
+    for kid in range(1, count + 1):
+        created_at = now - timedelta(minutes=rng.randint(0, 525_600))
+        title = " ".join(rng.sample(WORDS, 3))
+        yield {
+            "id": kid,
+            "title": f"{title} #{kid}",
+            "method": f"{rng.choice(WORDS)}の手順",
+            "target": f"{rng.choice(WORDS)}の対象",
+            "description": " ".join(rng.choices(WORDS, k=20)),
+            "category": rng.choice(CATEGORIES),
+            "views": int(rng.paretovariate(1.2) * 10),
+            # 一部のユーザーに投稿が偏るようにする
+            "author_id": min(int(rng.paretovariate(1.1)), users),
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+def _comments(rng: random.Random, count: int, users: int, knowledge: int, now: datetime):
+    for _ in range(count):
+        yield {
+            "knowledge_id": rng.randint(1, knowledge),
+            "content": " ".join(rng.choices(WORDS, k=8)),
+            "author_id": rng.randint(1, users),
+            "created_at": now - timedelta(minutes=rng.randint(0, 525_600)),
+        }
+
+def _activities(rng: random.Random, count: int, users: int, now: datetime):
+    for _ in range(count):
+        yield {
+            "user_id": rng.randint(1, users),
+            "action": rng.choice(ACTIONS),
+            "xp_amount": 10,
+            "timestamp": now - timedelta(minutes=rng.randint(0, 129_600)),
+        }
+
+def _files(rng: random.Random, knowledge: int, now: datetime):
+    for _ in range(knowledge // 5):
+        yield {
+            "knowledge_id": rng.randint(1, knowledge),
+            "file_name": "sample.txt",
+            "content_type": "text/plain",
+            "file_data": b"sample",
+            "uploaded_at": now,
+        }
+
+def _collaborators(rng: random.Random, users: int, knowledge: int):
+    for kid in rng.sample(range(1, knowledge + 1), knowledge // 10):
+        for user_id in rng.sample(range(1, users + 1), min(2, users)):
+            yield {"knowledge_id": kid, "user_id": user_id}
+
+def generate(engine: Engine, users: int, knowledge: int, comments: int, activities: int, seed: int = 0) -> None:
+    """
+    テーブルを作り直し、合成データを一括投入する
+
+    Note:
+        - 日次集計（user_activity_daily）と部署集計（department_stats）は投入したデータから SQL で集計する
+        - user_stats もマイグレーションと同様に件数を集計し、最近の活動を作成する
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    steps = [
+        ("users", User, lambda: _users(rng, users, now)),
+        ("knowledges", Knowledge, lambda: _knowledge(rng, knowledge, users, now)),
+        ("comments", Comment, lambda: _comments(rng, comments, users, knowledge, now)),
+        ("files", File, lambda: _files(rng, knowledge, now)),
+        ("knowledge_collaborators", KnowledgeCollaborator, lambda: _collaborators(rng, users, knowledge)),
+        ("user_activities", UserActivity, lambda: _activities(rng, activities, users, now)),
+    ]
+    for name, model, rows in steps:
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            count = _insert_chunks(connection, model, rows())
+        print(f"  {name}: {count}件（{time.perf_counter() - start:.1f}秒）")
+
+    with engine.begin() as connection:
+        day = func.date(UserActivity.timestamp)
+        connection.execute(
+            insert(UserActivityDaily).from_select(
+                ["user_id", "day", "action", "activity_count", "xp_amount"],
+                select(
+                    UserActivity.user_id,
+                    day,
+                    UserActivity.action,
+                    func.count(),
+                    func.sum(UserActivity.xp_amount)
+                ).group_by(UserActivity.user_id, day, UserActivity.action)
+            )
+        )
+
+        knowledge_counts = (
+            select(Knowledge.author_id.label("author_id"), func.count(Knowledge.id).label("count"))
+            .group_by(Knowledge.author_id)
+            .subquery()
+        )
+        connection.execute(
+            insert(DepartmentStats).from_select(
+                ["department", "user_count", "total_points", "total_level", "knowledge_count"],
+                select(
+                    User.department,
+                    func.count(User.id),
+                    func.coalesce(func.sum(User.points), 0),
+                    func.coalesce(func.sum(User.level), 0),
+                    func.coalesce(func.sum(knowledge_counts.c.count), 0)
+                )
+                .outerjoin(knowledge_counts, knowledge_counts.c.author_id == User.id)
+                .group_by(User.department)
+            )
+        )
+
+        knowledge_totals = (
+            select(
+                Knowledge.author_id.label("author_id"),
+                func.count(Knowledge.id).label("count"),
+                func.sum(Knowledge.views).label("views")
+            )
+            .group_by(Knowledge.author_id)
+            .subquery()
+        )
+        comment_counts = (
+            select(Comment.author_id.label("author_id"), func.count(Comment.id).label("count"))
+            .group_by(Comment.author_id)
+            .subquery()
+        )
+        connection.execute(
+            insert(UserStats).from_select(
+                ["user_id", "knowledge_count", "comment_count", "total_views", "updated_at"],
+                select(
+                    User.id,
+                    func.coalesce(knowledge_totals.c.count, 0),
+                    func.coalesce(comment_counts.c.count, 0),
+                    func.coalesce(knowledge_totals.c.views, 0),
+                    func.current_timestamp()
+                )
+                .outerjoin(knowledge_totals, knowledge_totals.c.author_id == User.id)
+                .outerjoin(comment_counts, comment_counts.c.author_id == User.id)
+            )
+        )
+
+        backfill_recent_activity(connection)
+
+        if engine.dialect.name == "mysql":
+            connection.execute(text(
+                "ANALYZE TABLE users, knowledges, comments, files, user_activities, user_activity_daily"
+            ))
+        elif engine.dialect.name == "sqlite":
+            connection.execute(text("ANALYZE"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ベンチマーク用の合成データを投入します（既存のテーブルは削除されます）")
+    parser.add_argument("--database-url", required=True, help="投入先（同期ドライバのURL。例: sqlite:///benchmarks/bench.db）")
+    parser.add_argument("--scale", type=float, default=1.0, help="既定の件数に掛ける倍率")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    args = parser.parse_args()
+
+    sizes = scaled_sizes(args.scale)
+    print(f"合成データを投入します: {sizes}")
+    generate(create_engine(args.database_url), seed=args.seed, **sizes)
@@ -0,0 +1,442 @@
+"""
+アクセスログからトラフィックを再現する負荷試験ツール
+
+gunicorn（UvicornWorker）のアクセスログを解析してトラフィックのモデル
+（エンドポイントの比率・パラメータの分布・思考時間）を作り、
+ローカルのインスタンスに対して指定した同時実行数で再生する。
+
+使い方:
+    python -m benchmarks.replay access.log --base-url http://localhost:8000 --concurrency 20 --duration 60
+    python -m benchmarks.replay access.log --save-model model.json      # モデルの作成のみ
+    python -m benchmarks.replay --model model.json --concurrency 40      # 保存したモデルを再生
+    cat access.log | python -m benchmarks.replay - --think-scale 0       # 思考時間なし（最大スループット）
+
+対応するログ形式:
+    - UvicornWorker: 10.0.0.1:51234 - "GET /knowledge/?limit=10 HTTP/1.1" 200
+    - gunicorn 既定（combined）: 10.0.0.1 - - [18/Oct/2026:10:00:00 +0900] "GET / HTTP/1.1" 200 ...
+    行頭に ISO 8601 の時刻（App Service のログなど）が付いていれば、それを思考時間の計算に使う。
+
+Note:
+    - パス中の数値は {id} に置き換えてルートごとに集計し、再生時は実際に現れた値から選ぶ
+    - ログにはリクエストボディが残らないため、再生するのは GET / HEAD のみ
+    - 認証が必要なルートは --mint-users（接続先DBのユーザーでトークンを発行）か --token で認証する
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+REPLAY_METHODS = ("GET", "HEAD")
+
+# ヘルスチェック・メトリクス収集はユーザーのトラフィックではないため既定で除外する
+DEFAULT_EXCLUDE = r"^/(healthz|readyz|metrics)$"
+
+# 同じクライアントのリクエスト間隔がこれを超えたら別のセッションとみなす（思考時間に含めない）
+SESSION_GAP_SECONDS = 300.0
+
+_UVICORN_LINE = re.compile(
+    r'(?P<client>\S+?)(?::\d+)? - "(?P<method>[A-Z]+) (?P<target>\S+) HTTP/[\d.]+" (?P<status>\d{3})'
+)
+_COMBINED_LINE = re.compile(
+    r'(?P<client>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<target>\S+) HTTP/[\d.]+" (?P<status>\d{3})'
+)
+_ISO_PREFIX = re.compile(r"^\[?(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?)(Z|[+-]\d{2}:?\d{2})?")
+_NUMERIC_SEGMENT = re.compile(r"^\d+$")
+
+def _parse_time(line: str, match) -> Optional[float]:
+    if "time" in match.groupdict() and match.group("time"):
+        try:
+            return datetime.strptime(match.group("time"), "%d/%b/%Y:%H:%M:%S %z").timestamp()
+        except ValueError:
+            return None
+    prefix = _ISO_PREFIX.match(line)
+    if prefix is None:
+        return None
+    value = prefix.group(1).replace(",", ".").replace(" ", "T")
+    zone = prefix.group(2) or ""
+    if zone == "Z":
+        zone = "+00:00"
+    try:
+        return datetime.fromisoformat(value + zone).timestamp()
+    except ValueError:
+        return None
+
+def parse_line(line: str) -> Optional[dict]:
+    """アクセスログの1行を解析する（リクエスト行でなければ None）"""
+    match = _COMBINED_LINE.search(line) or _UVICORN_LINE.search(line)
+    if match is None:
+        return None
+    return {
+        "client": match.group("client"),
+        "method": match.group("method"),
+        "target": match.group("target"),
+        "status": int(match.group("status")),
+        "time": _parse_time(line, match),
+    }
+
+def normalize_path(path: str) -> tuple[str, list]:
+    """数値のパスセグメントを {id} に置き換え、ルートのテンプレートと取り出した値を返す"""
+    segments = path.split("/")
+    ids = []
+    for index, segment in enumerate(segments):
+        if _NUMERIC_SEGMENT.match(segment):
+            ids.append(segment)
+            segments[index] = "{id}"
+    return "/".join(segments), ids
+
+class TrafficModel:
+    """
+    アクセスログから作るトラフィックのモデル
+
+    - routes: ルート（"GET /knowledge/{id}"）ごとのリクエスト数・{id} の値・クエリパラメータの分布
+    - think_times: 同じクライアントの連続するリクエストの間隔（秒）
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.think_times = []
+        self.skipped = Counter()
+        self.span_seconds = 0.0
+
+    @classmethod
+    def from_lines(cls, lines, exclude: Optional[str] = DEFAULT_EXCLUDE) -> "TrafficModel":
+        model = cls()
+        exclude_pattern = re.compile(exclude) if exclude else None
+        last_seen = {}
+        first_time = last_time = None
+
+        for line in lines:
+            entry = parse_line(line)
+            if entry is None:
+                continue
+            target = urlsplit(entry["target"])
+            if exclude_pattern and exclude_pattern.search(target.path):
+                continue
+            if entry["method"] not in REPLAY_METHODS:
+                model.skipped[entry["method"]] += 1
+                continue
+
+            template, ids = normalize_path(target.path)
+            route = model.routes.setdefault(f"{entry['method']} {template}", {
+                "method": entry["method"],
+                "template": template,
+                "count": 0,
+                "ids": [],
+                "params": {},
+            })
+            route["count"] += 1
+            for position, value in enumerate(ids):
+                if len(route["ids"]) <= position:
+                    route["ids"].append(Counter())
+                route["ids"][position][value] += 1
+            for name, value in parse_qsl(target.query, keep_blank_values=True):
+                route["params"].setdefault(name, Counter())[value] += 1
+
+            timestamp = entry["time"]
+            if timestamp is None:
+                continue
+            first_time = timestamp if first_time is None else min(first_time, timestamp)
+            last_time = timestamp if last_time is None else max(last_time, timestamp)
+            previous = last_seen.get(entry["client"])
+            if previous is not None and 0 <= timestamp - previous <= SESSION_GAP_SECONDS:
+                model.think_times.append(timestamp - previous)
+            last_seen[entry["client"]] = timestamp
+
+        if first_time is not None:
+            model.span_seconds = last_time - first_time
+        return model
+
+    @property
+    def total(self) -> int:
+        return sum(route["count"] for route in self.routes.values())
+
+    def to_dict(self) -> dict:
+        return {
+            "routes": {
+                key: {
+                    **route,
+                    "ids": [dict(counter) for counter in route["ids"]],
+                    "params": {name: dict(counter) for name, counter in route["params"].items()},
+                }
+                for key, route in self.routes.items()
+            },
+            "think_times": self.think_times,
+            "skipped": dict(self.skipped),
+            "span_seconds": self.span_seconds,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TrafficModel":
+        model = cls()
+        for key, route in data["routes"].items():
+            model.routes[key] = {
+                **route,
+                "ids": [Counter(counter) for counter in route["ids"]],
+                "params": {name: Counter(counter) for name, counter in route["params"].items()},
+            }
+        model.think_times = data.get("think_times", [])
+        model.skipped = Counter(data.get("skipped", {}))
+        model.span_seconds = data.get("span_seconds", 0.0)
+        return model
+
+    def summary(self) -> None:
+        total = self.total
+        print(f"トラフィックモデル: {total}リクエスト / {len(self.routes)}ルート")
+        if self.span_seconds > 0:
+            print(f"  ログの期間: {self.span_seconds:.0f}秒（平均 {total / self.span_seconds:.2f} req/s）")
+        if self.think_times:
+            print(
+                f"  思考時間: 中央値 {statistics.median(self.think_times):.2f}秒"
+                f"（{len(self.think_times)}件の間隔から）"
+            )
+        else:
+            print("  思考時間: ログに時刻がないため --think-time の値を使います")
+        if self.skipped:
+            print(f"  再生しないメソッド: {dict(self.skipped)}")
+        for key, route in sorted(self.routes.items(), key=lambda item: -item[1]["count"]):
+            print(f"  {route['count'] / total:>6.1%}  {key}")
+
+class RequestSampler:
+    """トラフィックモデルに従ってリクエスト（ルート・URL）と思考時間を選ぶ"""
+
+    def __init__(self, model: TrafficModel, rng: random.Random, think_time: float, think_scale: float):
+        self.rng = rng
+        self.keys = list(model.routes)
+        self.weights = [model.routes[key]["count"] for key in self.keys]
+        self.routes = model.routes
+        self.think_times = model.think_times
+        self.think_time = think_time
+        self.think_scale = think_scale
+
+    def _choose(self, counter: Counter) -> str:
+        values = list(counter)
+        return self.rng.choices(values, weights=[counter[value] for value in values])[0]
+
+    def next_request(self) -> tuple[str, str, str]:
+        """(ルート, メソッド, URL) を返す"""
+        key = self.rng.choices(self.keys, weights=self.weights)[0]
+        route = self.routes[key]
+        path = route["template"]
+        for counter in route["ids"]:
+            path = path.replace("{id}", self._choose(counter), 1)
+
+        # 各パラメータは、ログ中でそのルートに付いていた割合で付与する
+        params = []
+        for name, counter in route["params"].items():
+            if self.rng.random() < min(1.0, sum(counter.values()) / route["count"]):
+                params.append((name, self._choose(counter)))
+        url = f"{path}?{urlencode(params)}" if params else path
+        return key, route["method"], url
+
+    def next_think_time(self) -> float:
+        if self.think_scale <= 0:
+            return 0.0
+        if self.think_times:
+            return self.rng.choice(self.think_times) * self.think_scale
+        return self.rng.expovariate(1 / self.think_time) * self.think_scale if self.think_time > 0 else 0.0
+
+def mint_tokens(count: int) -> list:
+    """
+    接続先DB（models.database）のユーザーで JWT を発行する
+
+    Returns:
+        list: (sub=ユーザーID のトークン, sub=メールアドレス のトークン) のリスト
+        （/auth 配下は sub=メールアドレス、それ以外は sub=ユーザーID で認証する）
+    """
+    from sqlalchemy import select
+    from core.security import create_access_token
+    from models.database import engine
+    from models.user import User
+    # リレーションシップ解決のため関連モデルを読み込む
+    from models import comment, file, knowledge, knowledge_collaborator, profile, user_activity
+
+    with engine.connect() as connection:
+        users = connection.execute(select(User.id, User.email).order_by(User.id).limit(count)).all()
+    return [
+        (create_access_token({"sub": str(user.id)}), create_access_token({"sub": user.email}))
+        for user in users
+    ]
+
+def _percentile(values: list, percent: float) -> float:
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+async def replay(
+    model: TrafficModel,
+    base_url: str,
+    concurrency: int,
+    duration: float,
+    think_time: float,
+    think_scale: float,
+    tokens: list,
+    timeout: float,
+    seed: int
+) -> dict:
+    """
+    仮想ユーザー concurrency 人で duration 秒間リクエストを送り、ルートごとの結果を返す
+
+    Note:
+        - 各仮想ユーザーは「リクエスト → 応答を待つ → 思考時間だけ待つ」を繰り返す（クローズドモデル）
+        - 5xx と接続エラー・タイムアウトをエラー、4xx はクライアントエラーとして別に数える
+    """
+    import httpx
+
+    results = defaultdict(lambda: {"latencies": [], "errors": 0, "client_errors": 0, "statuses": Counter()})
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user(index: int, client) -> None:
+        sampler = RequestSampler(model, random.Random(seed + index), think_time, think_scale)
+        token = tokens[index % len(tokens)] if tokens else None
+        while time.perf_counter() < deadline:
+            key, method, url = sampler.next_request()
+            headers = {}
+            if token is not None:
+                headers["Authorization"] = f"Bearer {token[1] if url.startswith('/auth/') else token[0]}"
+
+            result = results[key]
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, headers=headers)
+                status_label = str(response.status_code)
+                if response.status_code >= 500:
+                    result["errors"] += 1
+                elif response.status_code >= 400:
+                    result["client_errors"] += 1
+            except httpx.HTTPError as e:
+                status_label = type(e).__name__
+                result["errors"] += 1
+            result["latencies"].append(time.perf_counter() - start)
+            result["statuses"][status_label] += 1
+
+            pause = sampler.next_think_time()
+            if pause > 0:
+                await asyncio.sleep(min(pause, max(0.0, deadline - time.perf_counter())))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        await asyncio.gather(*(virtual_user(i, client) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    report = {"elapsed_seconds": round(elapsed, 2), "concurrency": concurrency, "routes": {}}
+    for key, result in sorted(results.items(), key=lambda item: -len(item[1]["latencies"])):
+        latencies = [value * 1000 for value in result["latencies"]]
+        count = len(latencies)
+        report["routes"][key] = {
+            "requests": count,
+            "throughput_rps": round(count / elapsed, 2),
+            "p50_ms": round(_percentile(latencies, 50), 1),
+            "p95_ms": round(_percentile(latencies, 95), 1),
+            "p99_ms": round(_percentile(latencies, 99), 1),
+            "max_ms": round(max(latencies), 1),
+            "error_rate": round(result["errors"] / count, 4),
+            "client_error_rate": round(result["client_errors"] / count, 4),
+            "statuses": dict(result["statuses"]),
+        }
+    all_latencies = [value * 1000 for result in results.values() for value in result["latencies"]]
+    total = len(all_latencies)
+    errors = sum(result["errors"] for result in results.values())
+    report["total"] = {
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(all_latencies, 50), 1) if total else 0.0,
+        "p95_ms": round(_percentile(all_latencies, 95), 1) if total else 0.0,
+        "p99_ms": round(_percentile(all_latencies, 99), 1) if total else 0.0,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+    }
+    return report
+
+def print_report(report: dict) -> None:
+    total = report["total"]
+    print(
+        f"\n結果（{report['concurrency']}並列・{report['elapsed_seconds']}秒）: "
+        f"{total['requests']}リクエスト / {total['throughput_rps']} req/s / "
+        f"p50 {total['p50_ms']}ms / p95 {total['p95_ms']}ms / p99 {total['p99_ms']}ms / エラー率 {total['error_rate']:.2%}"
+    )
+    # 全角文字は2桁分で表示されるため、見出しの幅はその分を差し引いている
+    print(f"  {'ルート':<43} {'件数':>4} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'エラー':>4} {'4xx':>7}")
+    for key, route in report["routes"].items():
+        print(
+            f"  {key:<46} {route['requests']:>6} {route['throughput_rps']:>8.2f}"
+            f" {route['p50_ms']:>8.1f} {route['p95_ms']:>8.1f} {route['p99_ms']:>8.1f}"
+            f" {route['error_rate']:>7.1%} {route['client_error_rate']:>7.1%}"
+        )
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="アクセスログのトラフィックをローカルのインスタンスに再生します")
+    parser.add_argument("logs", nargs="*", help="アクセスログのファイル（- は標準入力）")
+    parser.add_argument("--model", help="保存したトラフィックモデル（JSON）から再生する")
+    parser.add_argument("--save-model", help="トラフィックモデルをJSONで保存して終了する")
+    parser.add_argument("--exclude", default=DEFAULT_EXCLUDE, help="モデルから除外するパスの正規表現（空文字で除外なし）")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="再生先のURL")
+    parser.add_argument("--concurrency", type=int, default=10, help="仮想ユーザー数（同時実行数）")
+    parser.add_argument("--duration", type=float, default=60.0, help="再生する時間（秒）")
+    parser.add_argument("--think-time", type=float, default=1.0, help="ログに時刻がない場合の平均思考時間（秒）")
+    parser.add_argument("--think-scale", type=float, default=1.0, help="思考時間の倍率（0 で待たずに送り続ける）")
+    parser.add_argument("--mint-users", type=int, default=0, help="接続先DBのユーザー N 人分のトークンを発行して認証する")
+    parser.add_argument("--token", action="append", default=[], help="認証に使う Bearer トークン（複数指定可）")
+    parser.add_argument("--timeout", type=float, default=30.0, help="リクエストのタイムアウト（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    parser.add_argument("--output", help="結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    if args.model:
+        with open(args.model, encoding="utf-8") as f:
+            model = TrafficModel.from_dict(json.load(f))
+    elif args.logs:
+        def lines():
+            for path in args.logs:
+                if path == "-":
+                    yield from sys.stdin
+                else:
+                    with open(path, encoding="utf-8", errors="replace") as f:
+                        yield from f
+        model = TrafficModel.from_lines(lines(), exclude=args.exclude or None)
+    else:
+        parser.error("アクセスログのファイルか --model を指定してください")
+
+    if not model.routes:
+        print("❌ 再生できるリクエストがログにありません")
+        return 1
+    model.summary()
+
+    if args.save_model:
+        with open(args.save_model, "w", encoding="utf-8") as f:
+            json.dump(model.to_dict(), f, ensure_ascii=False)
+        print(f"✅ トラフィックモデルを保存しました: {args.save_model}")
+        return 0
+
+    tokens = [(token, token) for token in args.token]
+    if args.mint_users:
+        tokens += mint_tokens(args.mint_users)
+
+    print(f"\n{args.base_url} に {args.concurrency}並列で {args.duration:.0f}秒間再生します...")
+    report = asyncio.run(replay(
+        model,
+        base_url=args.base_url,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        think_time=args.think_time,
+        think_scale=args.think_scale,
+        tokens=tokens,
+        timeout=args.timeout,
+        seed=args.seed
+    ))
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+ホットなエンドポイントのベンチマーク
+
+ASGIアプリを直接（HTTPサーバーを介さず）呼び出し、エンドポイントごとに
+p50 / p95 / 平均レイテンシと1リクエストあたりのSQL件数（Server-Timing ヘッダー）を計測する。
+結果は benchmarks/baseline.json と比較し、退行していれば終了コード 1 を返す。
+
+使い方:
+    python -m benchmarks.run --seed --scale 0.1        # 合成データを投入してから計測
+    python -m benchmarks.run                           # 投入済みのデータで計測
+    python -m benchmarks.run --update-baseline         # 計測結果をベースラインとして保存
+    python -m benchmarks.run --no-latency-check        # SQL件数のみ比較（CIなど計測環境が異なる場合）
+
+小さいデータでの SQL件数の比較は pytest（tests/test_benchmarks.py、benchmark マーカー）でも実行される。
+
+判定:
+    - SQL件数: ベースラインより1件でも増えたら失敗
+    - p95: ベースライン ×（1 + --latency-tolerance）を超えたら失敗
+    - データ件数がベースラインと異なる場合はレイテンシを比較せず、SQL件数のみ比較する
+      （N+1 が残っているエンドポイントはデータによって件数が変わるため、ベースラインと同じ件数で計測すること）
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATABASE = os.path.join(BENCH_DIR, "bench.db")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+
+# (名前, パス, トークンの種類)
+# トークンの種類: "id" は core.security（sub=ユーザーID）、"email" は routers.auth（sub=メールアドレス）
+BENCHMARKS = [
+    ("knowledge.list", "/knowledge/?limit=10", "id"),
+    ("knowledge.list_by_views", "/knowledge/?limit=10&sort_by=views", "id"),
+    ("knowledge.search", "/knowledge/?limit=10&search=クロージング", "id"),
+    ("knowledge.categories", "/knowledge/?limit=10&categories=メール,電話", "id"),
+    ("knowledge.get", "/knowledge/{knowledge_id}", "id"),
+    ("knowledge.comments", "/knowledge/{knowledge_id}/comments", "id"),
+    ("knowledge.batch", "/knowledge/batch?ids={knowledge_ids}", "id"),
+    ("ranking.level", "/ranking/ranking/level?limit=10", None),
+    ("ranking.points", "/ranking/ranking/points?limit=10", None),
+    ("ranking.activity_week", "/ranking/ranking/activity?limit=10&period=week", None),
+    ("ranking.departments", "/ranking/ranking/departments", None),
+    ("ranking.me", "/ranking/ranking/me?around=2", "id"),
+    ("profile.get", "/profile/profile/{user_id}", None),
+    ("profile.batch", "/profile/profile/batch?ids={user_ids}", None),
+    ("auth.me", "/auth/me", "email"),
+]
+
+# --max-seconds を超えても最低限計測する回数
+MIN_ITERATIONS = 5
+
+_QUERY_COUNT = re.compile(r'desc="(\d+) queries"')
+
+def _configure_environment(database: str) -> None:
+    """アプリのインポート前に接続先などを設定する"""
+    os.environ.setdefault("ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{database}")
+    # SQL件数は Server-Timing ヘッダーから取得する
+    os.environ["SQL_INSTRUMENTATION_ENABLED"] = "true"
+    # SQL件数はベースラインで判定するため、リクエストごとの N+1 警告は出さない
+    os.environ.setdefault("SQL_N_PLUS_ONE_THRESHOLD", "1000000")
+    os.environ["GAMIFICATION_CONSUMER_ENABLED"] = "false"
+    os.environ.setdefault("RUNTIME_DIR", tempfile.mkdtemp(prefix="rebema-bench-"))
+
+def _percentile(values: list, percent: float) -> float:
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def _dataset_sizes(engine) -> dict:
+    from sqlalchemy import func, select
+    from models.user import User
+    from models.knowledge import Knowledge
+    from models.comment import Comment
+    from models.user_activity import UserActivity
+
+    with engine.connect() as connection:
+        return {
+            name: connection.execute(select(func.count()).select_from(model)).scalar()
+            for name, model in (
+                ("users", User), ("knowledge", Knowledge),
+                ("comments", Comment), ("activities", UserActivity)
+            )
+        }
+
+async def _measure(app, sizes: dict, iterations: int, max_seconds: float, seed: int) -> dict:
+    import httpx
+    from core.security import create_access_token
+
+    rng = random.Random(seed)
+    # 計測対象のIDは固定のサンプルを使う
+    user_ids = rng.sample(range(1, sizes["users"] + 1), min(20, sizes["users"]))
+    knowledge_ids = rng.sample(range(1, sizes["knowledge"] + 1), min(20, sizes["knowledge"]))
+    tokens = {
+        uid: {
+            "id": create_access_token({"sub": str(uid)}),
+            "email": create_access_token({"sub": f"bench-{uid}@example.com"}),
+        }
+        for uid in user_ids
+    }
+
+    def request_args(path: str, token_kind, i: int):
+        uid = user_ids[i % len(user_ids)]
+        url = path.format(
+            user_id=uid,
+            knowledge_id=knowledge_ids[i % len(knowledge_ids)],
+            user_ids=",".join(str(u) for u in user_ids[:10]),
+            knowledge_ids=",".join(str(k) for k in knowledge_ids)
+        )
+        headers = {"Authorization": f"Bearer {tokens[uid][token_kind]}"} if token_kind else {}
+        return url, headers
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # ウォームアップ: サンプルユーザーの user_stats の最近の活動（初回参照時に作成される）を作っておく
+        for uid in user_ids:
+            await client.get(f"/profile/profile/{uid}")
+
+        for name, path, token_kind in BENCHMARKS:
+            url, headers = request_args(path, token_kind, 0)
+            await client.get(url, headers=headers)
+
+            latencies = []
+            queries = 0
+            failures = 0
+            deadline = time.perf_counter() + max_seconds
+            for i in range(iterations):
+                # 遅いエンドポイントは時間の上限で打ち切る（最低 MIN_ITERATIONS 回は計測する）
+                if i >= MIN_ITERATIONS and time.perf_counter() > deadline:
+                    break
+                url, headers = request_args(path, token_kind, i)
+                start = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if not 200 <= response.status_code < 300:
+                    failures += 1
+                match = _QUERY_COUNT.search(response.headers.get("server-timing", ""))
+                if match:
+                    queries = max(queries, int(match.group(1)))
+
+            results[name] = {
+                "p50_ms": round(_percentile(latencies, 50), 2),
+                "p95_ms": round(_percentile(latencies, 95), 2),
+                "mean_ms": round(statistics.mean(latencies), 2),
+                "queries": queries,
+                "failures": failures,
+                "iterations": len(latencies),
+            }
+            print(
+                f"  {name:<26} p50 {results[name]['p50_ms']:>8.2f}ms  p95 {results[name]['p95_ms']:>8.2f}ms"
+                f"  SQL {queries:>3}件" + (f"  ❌ 失敗 {failures}件" if failures else "")
+            )
+    return results
+
+def compare(baseline: dict, current: dict, latency_tolerance: float, check_latency: bool) -> list:
+    """
+    ベースラインと計測結果を比較する
+
+    Returns:
+        list: 退行の内容（空なら合格）
+    """
+    regressions = []
+    same_dataset = baseline.get("dataset") == current["dataset"]
+    if check_latency and not same_dataset:
+        print(
+            f"⚠️ データ件数がベースラインと異なるため、SQL件数のみ比較します"
+            f"（ベースライン: {baseline.get('dataset')}, 今回: {current['dataset']}）"
+        )
+    check_latency = check_latency and same_dataset
+
+    for name, result in current["benchmarks"].items():
+        if result["failures"]:
+            regressions.append(f"{name}: エラー応答が{result['failures']}件ありました")
+
+        expected = baseline.get("benchmarks", {}).get(name)
+        if expected is None:
+            print(f"ℹ️ {name}: ベースラインがありません（--update-baseline で追加してください）")
+            continue
+
+        if result["queries"] > expected["queries"]:
+            regressions.append(f"{name}: SQL件数 {expected['queries']} → {result['queries']}")
+        elif result["queries"] < expected["queries"]:
+            print(f"✨ {name}: SQL件数が減りました {expected['queries']} → {result['queries']}（ベースラインを更新してください）")
+
+        if check_latency:
+            limit = expected["p95_ms"] * (1 + latency_tolerance)
+            if result["p95_ms"] > limit:
+                regressions.append(
+                    f"{name}: p95 {expected['p95_ms']:.2f}ms → {result['p95_ms']:.2f}ms（許容値 {limit:.2f}ms）"
+                )
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="ホットなエンドポイントのレイテンシとSQL件数を計測します")
+    parser.add_argument("--database", default=DEFAULT_DATABASE, help="SQLiteファイルのパス（ASYNC_DATABASE_URL が優先されます）")
+    parser.add_argument("--seed", action="store_true", help="合成データを投入してから計測する（既存のテーブルは削除されます）")
+    parser.add_argument("--scale", type=float, default=1.0, help="合成データの件数の倍率（--seed 時）")
+    parser.add_argument("--iterations", type=int, default=50, help="エンドポイントごとの計測回数")
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="エンドポイントごとの計測時間の上限（秒）")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="比較するベースラインのパス")
+    parser.add_argument("--update-baseline", action="store_true", help="計測結果をベースラインとして保存する")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5, help="p95 の許容増加率（0.5 = 50%%）")
+    parser.add_argument("--no-latency-check", action="store_true", help="レイテンシを比較せず、SQL件数のみ比較する")
+    parser.add_argument("--output", help="計測結果をJSONで保存するパス")
+    args = parser.parse_args()
+
+    _configure_environment(os.path.abspath(args.database))
+
+    from benchmarks.datagen import generate, scaled_sizes
+    from main import app
+    from models.database import Base, engine
+
+    if args.seed:
+        sizes = scaled_sizes(args.scale)
+        print(f"合成データを投入します: {sizes}")
+        generate(engine, seed=0, **sizes)
+    else:
+        Base.metadata.create_all(bind=engine)
+
+    dataset = _dataset_sizes(engine)
+    if not dataset["users"] or not dataset["knowledge"]:
+        print("❌ データがありません。--seed を指定して合成データを投入してください")
+        return 1
+
+    print(f"計測します（{args.iterations}回/エンドポイント）: {dataset}")
+    current = {
+        "dataset": dataset,
+        "benchmarks": asyncio.run(_measure(app, dataset, args.iterations, args.max_seconds, seed=0))
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"✅ ベースラインを更新しました: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠️ ベースラインがありません: {args.baseline}（--update-baseline で作成してください）")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, current, args.latency_tolerance, not args.no_latency_check)
+    if regressions:
+        print("❌ 退行を検出しました:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1
+    print("✅ ベースラインからの退行はありません")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,7 +7,38 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24時間
 
+    # ゲーミフィケーション（経験値付与）イベントの処理設定
+    GAMIFICATION_CONSUMER_ENABLED: bool = True
+    GAMIFICATION_BATCH_SIZE: int = 500
+    GAMIFICATION_POLL_INTERVAL: float = 1.0  # 秒
+    GAMIFICATION_MAX_ATTEMPTS: int = 5  # 反映に失敗したイベントを再試行する回数（達したイベントは gamification_dead_letters に移す。デッドロックなど一時的なエラーは数えない）
+
+    # 管理用API（X-Admin-Key ヘッダーで認証。未設定の場合は管理用APIを無効にする）
+    ADMIN_API_KEY: Optional[str] = None
+
+    # ワーカー間で共有する実行時ファイル（設定フラグなど）の置き場所
+    RUNTIME_DIR: str = "/tmp/rebema"
+
+    # リクエストごとのSQL計測（管理用APIから実行時に切り替え可能）
+    SQL_INSTRUMENTATION_ENABLED: bool = False
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5  # 同じ形のSQLがこの回数を超えたら警告
+
+    # リクエスト単位のサンプリングプロファイラ（サンプリング率は管理用APIから実行時に変更可能）
+    PROFILER_SAMPLE_RATE: float = 0.0  # 0.0〜1.0。0 の場合は X-Profile ヘッダーのリクエストのみ計測
+    PROFILER_INTERVAL_SECONDS: float = 0.005
+    PROFILER_MAX_PROFILES: int = 200  # 保存するプロファイルの上限（古いものから削除）
+
+    # ワーカーのメモリ診断（管理用APIから実行時に切り替え可能。RSS・GC・tracemalloc の状態を書き出す間隔）
+    MEMORY_DIAGNOSTICS_ENABLED: bool = False
+    MEMORY_REPORT_INTERVAL_SECONDS: float = 5.0
+    MEMORY_MAX_SNAPSHOTS: int = 20  # 保存する tracemalloc スナップショットの上限（古いものから削除）
+
+    # コメントのリアルタイム配信（SSE）
+    COMMENT_STREAM_HEARTBEAT_SECONDS: float = 15.0  # イベントがない間に接続維持のコメント行を送る間隔
+    COMMENT_STREAM_QUEUE_SIZE: int = 100  # 接続ごとに溜められるイベント数（あふれた接続は切断する）
+    COMMENT_STREAM_RETRY_MS: int = 3000  # 切断時にクライアントが再接続するまでの待ち時間
+
     class Config:
         env_file = ".env"
 
-settings = Settings() 
\ No newline at end of file
+settings = Settings()
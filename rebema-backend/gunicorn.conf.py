@@ -0,0 +1,44 @@
+import os
+import shutil
+import sys
+
+# Gunicorn 設定（startup.sh から --config で読み込む）
+# コマンドラインで指定した値はこのファイルより優先される
+
+# GUNICORN_PRELOAD=true でマスタープロセスがアプリを一度だけ読み込み、ワーカーは fork で共有する
+# （ワーカーごとのインポートが不要になり、起動が速くなる）
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() in ("1", "true", "yes")
+
+# /metrics を全ワーカーで集計するため、各ワーカーのメトリクスを共有ディレクトリに書き出す
+# （prometheus_client のインポート前に設定する必要があるため、ワーカー起動前のここで設定する）
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(os.getenv("RUNTIME_DIR", "/tmp/rebema"), "prometheus")
+)
+
+# 前回起動時のメトリクスが残らないよう、ディレクトリを空にして作り直す
+# （preload 時はマスターが on_starting より前にアプリを読み込み、メトリクスのファイルを作成するため、
+#   フックではなく設定ファイルの読み込み時に行う）
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+def child_exit(server, worker):
+    # 終了したワーカーの処理中リクエスト数・プール状態（livesum）を集計から外す
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def post_fork(server, worker):
+    """
+    fork 直後のワーカーで、マスターから引き継いだコネクションプールを作り直す
+
+    Note:
+        - preload 時はマスターでエンジンが作成済みのため、コネクションを複数プロセスで共有しないようにする
+        - close=False で親のコネクションは閉じずに破棄する（親側のソケットを壊さないため）
+    """
+    database = sys.modules.get("models.database")
+    if database is None:
+        return
+    database.engine.dispose(close=False)
+    database.async_engine.sync_engine.dispose(close=False)
+    if database.replica_engine is not None:
+        database.replica_engine.sync_engine.dispose(close=False)
@@ -1,13 +1,22 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, knowledge, ranking, profile
-from models.database import engine, Base
+from fastapi.responses import ORJSONResponse
+from routers import auth, knowledge, ranking, profile, health, debug
+from utils.gamification import run_consumer
+from utils import memory_diagnostics
+from utils.comment_stream import broker as comment_broker
+from utils.sql_instrumentation import SQLInstrumentationMiddleware, instrument_database
+from utils.metrics import MetricsMiddleware
+from utils.profiler import ProfilerMiddleware
+from core.config import settings
+import asyncio
 import os
 
-# データベースのテーブルを作成
-Base.metadata.create_all(bind=engine)
+# テーブルの作成・変更は Alembic（alembic upgrade head）で行う
+# インポート時にはDBへ接続しない（ワーカー起動を速くし、DBが遅くても起動できるようにする）
 
-app = FastAPI(title="Rebema API")
+# JSON のエンコードは orjson で行う（標準の json モジュールより高速）
+app = FastAPI(title="Rebema API", default_response_class=ORJSONResponse)
 
 # CORS設定
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
@@ -17,13 +26,61 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],  # クライアントが If-None-Match に使えるようにする
 )
 
+# リクエストごとのSQL計測（Server-Timing ヘッダー・N+1 警告）
+instrument_database()
+app.add_middleware(SQLInstrumentationMiddleware)
+
+# リクエストの処理時間・処理中のリクエスト数（/metrics）
+app.add_middleware(MetricsMiddleware)
+
+# 指定・抽出したリクエストのサンプリングプロファイル（X-Profile-Id ヘッダー・/debug/profiles）
+app.add_middleware(ProfilerMiddleware)
+
 # ルーターの登録
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(knowledge.router, prefix="/knowledge", tags=["knowledge"])
 app.include_router(ranking.router, prefix="/ranking", tags=["ranking"])
 app.include_router(profile.router, prefix="/profile", tags=["profile"])
+app.include_router(health.router, tags=["health"])
+app.include_router(debug.router, prefix="/debug", tags=["debug"])
+
+# 経験値付与イベントのバックグラウンド処理
+@app.on_event("startup")
+async def start_gamification_consumer():
+    if not settings.GAMIFICATION_CONSUMER_ENABLED:
+        return
+    app.state.gamification_stop = asyncio.Event()
+    app.state.gamification_task = asyncio.create_task(
+        run_consumer(app.state.gamification_stop)
+    )
+
+@app.on_event("shutdown")
+async def stop_gamification_consumer():
+    if not settings.GAMIFICATION_CONSUMER_ENABLED:
+        return
+    app.state.gamification_stop.set()
+    await app.state.gamification_task
+
+# ワーカーのメモリ診断（有効な場合のみ。/debug/memory で全ワーカー分を確認する）
+@app.on_event("startup")
+async def start_memory_reporter():
+    memory_diagnostics.start_reporter()
+
+@app.on_event("shutdown")
+async def stop_memory_reporter():
+    await memory_diagnostics.stop_reporter()
+
+# コメントのリアルタイム配信（他のワーカーからのイベントを受信するソケット）
+@app.on_event("startup")
+async def start_comment_broker():
+    comment_broker.start()
+
+@app.on_event("shutdown")
+async def stop_comment_broker():
+    comment_broker.stop()
 
 @app.get("/")
 async def root():
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, BigInteger, String
+from .database import Base
+
+class CacheVersion(Base):
+    """キャッシュの無効化に使うバージョン番号（対象のデータを変更するたびに加算する）"""
+    __tablename__ = "cache_versions"
+
+    name = Column(String(100), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
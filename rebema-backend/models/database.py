@@ -1,7 +1,14 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
+import ssl
+import threading
+import time
 from dotenv import load_dotenv
 import pymysql
 
@@ -14,29 +21,257 @@ DB_PASSWORD = os.getenv("MYSQL_PASSWORD")
 DB_NAME = os.getenv("MYSQL_DB")
 DB_PORT = os.getenv("MYSQL_PORT", "3306")
 
+# 読み取り専用レプリカ（任意）。ユーザー・パスワード・DB名はプライマリと同じ
+DB_REPLICA_HOST = os.getenv("MYSQL_REPLICA_HOST")
+DB_REPLICA_PORT = os.getenv("MYSQL_REPLICA_PORT", DB_PORT)
+# レプリカへの接続に失敗した後、プライマリに切り替えておく秒数
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+
+# コネクションプール設定（ワーカーごと）
+# Azure MySQL はアイドル接続を切断するため、pre_ping と recycle を有効にしておく
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
 # SSL証明書のパス
 SSL_CA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "DigiCertGlobalRootCA.crt.pem")
 
 # データベースURLを構築
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# API は非同期ドライバ（aiomysql）、スクリプト・CLI は同期ドライバ（pymysql）を使う
+# ASYNC_DATABASE_URL を指定した場合はそちらを優先する（例: ローカル・テスト用の sqlite+aiosqlite:///./rebema.db）
+SQLALCHEMY_ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
 
-# エンジンの作成
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={
-        "ssl": {
-            "ca": SSL_CA_PATH,
-            "ssl_mode": "VERIFY_IDENTITY"
+def _sync_url(async_url: str):
+    """非同期ドライバのURLを同じDBの同期ドライバのURLに変換する"""
+    url = make_url(async_url)
+    drivers = {"mysql": "mysql+pymysql", "sqlite": "sqlite", "postgresql": "postgresql"}
+    return url.set(drivername=drivers.get(url.get_backend_name(), url.drivername))
+
+SQLALCHEMY_DATABASE_URL = _sync_url(SQLALCHEMY_ASYNC_DATABASE_URL)
+IS_MYSQL = SQLALCHEMY_DATABASE_URL.get_backend_name() == "mysql"
+
+# レプリカのURL（ASYNC_REPLICA_DATABASE_URL を優先、どちらも未設定ならレプリカなし）
+SQLALCHEMY_ASYNC_REPLICA_DATABASE_URL = os.getenv("ASYNC_REPLICA_DATABASE_URL") or (
+    f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}"
+    if DB_REPLICA_HOST else None
+)
+
+class PoolWaitStats:
+    """コネクション取得の待ち時間を集計する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.failures = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, failed: bool = False) -> None:
+        with self._lock:
+            if failed:
+                self.failures += 1
+                return
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "failures": self.failures,
+                "waitSecondsTotal": round(self.total_wait, 6),
+                "waitSecondsMax": round(self.max_wait, 6),
+                "waitSecondsAvg": round(self.total_wait / self.checkouts, 6) if self.checkouts else 0.0
+            }
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    プールからコネクションを取り出すまでの待ち時間を計測する（非同期エンジン用）
+
+    Note:
+        - 待ち時間はプールごとに集計する（プライマリとレプリカを区別するため）
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def recreate(self):
+        # dispose などで作り直したプールにも集計を引き継ぐ
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.wait_stats.record(time.perf_counter() - start, failed=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+def _async_engine_options(url: str) -> dict:
+    if make_url(url).get_backend_name() != "mysql":
+        return {}
+    # aiomysql は SSLContext を受け取る（ホスト名の検証はデフォルトで有効）
+    ssl_context = ssl.create_default_context(cafile=SSL_CA_PATH)
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {"ssl": ssl_context}
+    }
+
+def _sync_engine_options() -> dict:
+    if not IS_MYSQL:
+        return {}
+    return {
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {
+            "ssl": {
+                "ca": SSL_CA_PATH,
+                "ssl_mode": "VERIFY_IDENTITY"
+            }
         }
     }
+
+# エンジンの作成
+# API リクエストは async_engine、スクリプト・CLI・マイグレーションは engine を使う
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, **_async_engine_options(SQLALCHEMY_ASYNC_DATABASE_URL))
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **_sync_engine_options())
+replica_engine = (
+    create_async_engine(
+        SQLALCHEMY_ASYNC_REPLICA_DATABASE_URL,
+        **_async_engine_options(SQLALCHEMY_ASYNC_REPLICA_DATABASE_URL)
+    )
+    if SQLALCHEMY_ASYNC_REPLICA_DATABASE_URL else None
 )
 
+# 非同期セッションでは遅延ロードができないため、コミット後も属性を失効させない
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+ReplicaSessionLocal = (
+    async_sessionmaker(replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    if replica_engine is not None else None
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+class ReplicaHealth:
+    """レプリカへの接続失敗を記録し、一定時間プライマリに切り替える"""
+
+    def __init__(self, retry_seconds: float):
+        self._lock = threading.Lock()
+        self.retry_seconds = retry_seconds
+        self.failures = 0
+        self.fallbacks = 0
+        self.unavailable_until = 0.0
+
+    def available(self) -> bool:
+        with self._lock:
+            if time.monotonic() < self.unavailable_until:
+                self.fallbacks += 1
+                return False
+            return True
+
+    def mark_failed(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self.fallbacks += 1
+            self.unavailable_until = time.monotonic() + self.retry_seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "healthy": time.monotonic() >= self.unavailable_until,
+                "failures": self.failures,
+                "fallbacks": self.fallbacks
+            }
+
+replica_health = ReplicaHealth(DB_REPLICA_RETRY_SECONDS)
+
+async def get_db():
+    """プライマリのセッション（書き込み・自分の書き込み直後の読み取り用）"""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def get_read_db():
+    """
+    読み取り専用エンドポイント用のセッション
+
+    Note:
+        - レプリカが設定されていればレプリカを使い、なければプライマリを使う
+        - 先にコネクションを確保し、接続できなければプライマリに切り替える
+          （DB_REPLICA_RETRY_SECONDS の間はレプリカを試さない）
+        - レプリカは遅延があるため、書き込みや自分の書き込み結果を返す処理には get_db を使う
+    """
+    if ReplicaSessionLocal is not None and replica_health.available():
+        async with ReplicaSessionLocal() as db:
+            try:
+                await db.connection()
+            except (DBAPIError, OSError) as e:
+                print(f"レプリカ接続エラー（プライマリに切り替えます）: {str(e)}")
+                replica_health.mark_failed()
+            else:
+                yield db
+                return
+
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def read_sessionmaker():
+    """
+    読み取り専用の処理用のセッションファクトリ（レプリカが使えればレプリカ）
+
+    Note:
+        - レスポンスの送信中にセッションを作るストリーミング処理など、get_read_db を使えない場合に使う
+    """
+    if ReplicaSessionLocal is not None and replica_health.available():
+        return ReplicaSessionLocal
+    return AsyncSessionLocal
+
+def _pool_usage(pool) -> dict:
+    """プールの使用中・オーバーフローのコネクション数と待ち時間（計測しているプールのみ）"""
+    usage = {}
+    if isinstance(pool, QueuePool):
+        usage.update({
+            "size": pool.size(),
+            "checkedIn": pool.checkedin(),
+            "inUse": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        usage.update(pool.wait_stats.snapshot())
+    return usage
+
+def get_pool_status() -> dict:
+    """
+    コネクションプールの利用状況（使用中・オーバーフロー・待ち時間）を返す
+
+    Note:
+        - プライマリの値は最上位に、レプリカの値は replica に返す（待ち時間も別々に集計する）
+    """
+    status = {
+        "size": DB_POOL_SIZE,
+        "maxOverflow": DB_MAX_OVERFLOW,
+        "timeout": DB_POOL_TIMEOUT,
+        "recycle": DB_POOL_RECYCLE,
+        "prePing": DB_POOL_PRE_PING,
+    }
+    status.update(_pool_usage(async_engine.pool))
+    if replica_engine is not None:
+        replica = replica_health.snapshot()
+        replica.update(_pool_usage(replica_engine.pool))
+        status["replica"] = replica
+    return status
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String
+from .database import Base
+
+class DepartmentStats(Base):
+    """部署ごとの集計（書き込み時に加算更新する）"""
+    __tablename__ = "department_stats"
+
+    department = Column(String(100), primary_key=True)
+    user_count = Column(Integer, nullable=False, default=0)
+    total_points = Column(Integer, nullable=False, default=0)
+    total_level = Column(Integer, nullable=False, default=0)
+    knowledge_count = Column(Integer, nullable=False, default=0)
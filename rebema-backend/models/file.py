@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -14,4 +14,9 @@ class File(Base):
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
     # リレーションシップ
-    knowledge = relationship("Knowledge", back_populates="files") 
\ No newline at end of file
+    knowledge = relationship("Knowledge", back_populates="files")
+
+    # インデックス
+    __table_args__ = (
+        Index('ix_files_knowledge_id', 'knowledge_id'),
+    ) 
\ No newline at end of file
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from datetime import datetime
+from .database import Base
+
+class GamificationDeadLetter(Base):
+    """GAMIFICATION_MAX_ATTEMPTS 回反映に失敗したイベント（調査・手動での再登録用に残す）"""
+    __tablename__ = "gamification_dead_letters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, nullable=False)  # 元の gamification_events.id
+    user_id = Column(Integer, nullable=False, index=True)
+    action = Column(String(50), nullable=False)
+    xp_amount = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime)  # イベントの登録日時
+    attempts = Column(Integer, nullable=False)
+    error = Column(Text)  # 最後のエラー
+    failed_at = Column(DateTime, default=datetime.utcnow)
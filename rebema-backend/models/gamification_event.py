@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from datetime import datetime
+from .database import Base
+
+class GamificationEvent(Base):
+    """経験値付与などの未処理イベント（処理後に削除される）"""
+    __tablename__ = "gamification_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    action = Column(String(50), nullable=False)  # 例: "create_knowledge", "comment"
+    xp_amount = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    attempts = Column(Integer, nullable=False, default=0)  # 反映に失敗した回数（上限に達したイベントは gamification_dead_letters に移す）
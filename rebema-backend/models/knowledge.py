@@ -26,4 +26,7 @@ class Knowledge(Base):
     # インデックス
     __table_args__ = (
         Index('ix_knowledges_category', 'category'),
+        Index('ix_knowledges_created_at', 'created_at'),
+        Index('ix_knowledges_views', 'views'),
+        Index('ix_knowledges_author_created', 'author_id', 'created_at'),
     ) 
\ No newline at end of file
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, LargeBinary
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, LargeBinary, Index
+from sqlalchemy.orm import relationship, column_property
+from typing import Optional
 from datetime import datetime
 from .database import Base
 
@@ -21,9 +22,29 @@ class User(Base):
     avatar_content_type = Column(String(50), nullable=True)  # 画像のMIMEタイプを保存
     department = Column(String(100), nullable=True)
 
+    # アバター画像の有無（画像データ自体は読み込まない）
+    has_avatar = column_property(avatar_data.isnot(None))
+
     # リレーションシップ
     knowledges = relationship("Knowledge", back_populates="author")
     comments = relationship("Comment", back_populates="author")
     activities = relationship("UserActivity", back_populates="user")
     collaborations = relationship("KnowledgeCollaborator", back_populates="user")
-    profile = relationship("Profile", back_populates="user", uselist=False) 
\ No newline at end of file
+    profile = relationship("Profile", back_populates="user", uselist=False) 
+
+    # インデックス（ランキング用）
+    __table_args__ = (
+        Index('ix_users_level_experience', 'level', 'experience_points'),
+        Index('ix_users_points', 'points'),
+        Index('ix_users_department_level', 'department', 'level', 'experience_points'),
+        Index('ix_users_department_points', 'department', 'points'),
+    )
+
+    @staticmethod
+    def avatar_url_for(user_id: int, has_avatar: bool) -> Optional[str]:
+        """アバター画像のURLを返す（未設定の場合は None）"""
+        return f"/api/users/{user_id}/avatar" if has_avatar else None
+
+    @property
+    def avatar_url(self) -> Optional[str]:
+        return User.avatar_url_for(self.id, self.has_avatar)
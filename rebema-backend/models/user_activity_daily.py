@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, Index
+from .database import Base
+
+class UserActivityDaily(Base):
+    """user_activities の日次集計（ユーザー・日付・アクション単位）"""
+    __tablename__ = "user_activity_daily"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    action = Column(String(50), primary_key=True)
+    activity_count = Column(Integer, nullable=False, default=0)
+    xp_amount = Column(Integer, nullable=False, default=0)
+
+    # インデックス（期間指定ランキング用）
+    __table_args__ = (
+        Index('ix_user_activity_daily_day_user', 'day', 'user_id'),
+    )
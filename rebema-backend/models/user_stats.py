@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, JSON
+from datetime import datetime
+from .database import Base
+
+class UserStats(Base):
+    """プロフィール表示用のユーザー集計（書き込み時に更新する）"""
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    knowledge_count = Column(Integer, nullable=False, default=0)
+    comment_count = Column(Integer, nullable=False, default=0)
+    total_views = Column(Integer, nullable=False, default=0)
+    # 行は最初の書き込み時に作成されるため、最近の活動は空のリストで作成する（書き込み時に作り直す）
+    recent_knowledge = Column(JSON, default=list)  # 最新ナレッジ（id, title, createdAt）
+    recent_comments = Column(JSON, default=list)  # 最新コメント（id, content, knowledgeId, createdAt）
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
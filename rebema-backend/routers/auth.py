@@ -1,6 +1,7 @@
 from datetime import timedelta, datetime
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Response
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 from pydantic import BaseModel, EmailStr
 import os
@@ -19,6 +20,13 @@ from core.security import (
 )
 from utils.auth import verify_token
 from core.config import settings
+from utils.department import move_user_department
+from utils.experience import experience_for_level
+from utils.user_stats import get_user_stats
+from utils.metrics import record_upload
+from utils.formatting import format_date
+from utils.cache_version import KNOWLEDGE_LIST, bump_version
+from routers.profile import RecentActivityResponse, UserProfileStatsResponse
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -27,15 +35,27 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
+class UserMeResponse(BaseModel):
+    name: Optional[str]
+    department: Optional[str]
+    level: Optional[int]
+    nextLevelExp: int
+    knowledgeCount: int
+    totalPageViews: int
+    avatar: str
+    experiencePoints: Optional[int]
+    stats: UserProfileStatsResponse
+    recentActivity: RecentActivityResponse
+
 class UserProfile(BaseModel):
     username: Optional[str] = None
     department: Optional[str] = None
     password: Optional[str] = None
 
 @router.post("/login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     try:
-        user = db.query(User).filter(User.email == form_data.username).first()
+        user = (await db.execute(select(User).where(User.email == form_data.username))).scalars().first()
         if not user or not verify_password(form_data.password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -55,72 +75,43 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
         )
         return {"jwt_token": mock_token}
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
     payload = verify_token(token)
     email: str = payload.get("sub")
     if email is None:
         raise HTTPException(status_code=401, detail="認証に失敗しました")
     
-    user = db.query(User).filter(User.email == email).first()
+    user = (await db.execute(select(User).where(User.email == email))).scalars().first()
     if user is None:
         raise HTTPException(status_code=401, detail="ユーザーが見つかりません")
     
     return user
 
-@router.get("/me")
+@router.get("/me", response_model=UserMeResponse)
 async def read_users_me(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
-        # ナレッジ数を取得
-        knowledge_count = db.query(Knowledge).filter(
-            Knowledge.author_id == current_user.id
-        ).count()
-        
-        # コメント数を取得
-        comment_count = db.query(Comment).filter(
-            Comment.author_id == current_user.id
-        ).count()
-        
-        # 最近の活動を取得（最新5件のナレッジとコメント）
-        recent_knowledge = db.query(Knowledge).filter(
-            Knowledge.author_id == current_user.id
-        ).order_by(Knowledge.created_at.desc()).limit(5).all()
-        
-        recent_comments = db.query(Comment).filter(
-            Comment.author_id == current_user.id
-        ).order_by(Comment.created_at.desc()).limit(5).all()
+        # ナレッジ数・コメント数・累積PV数・最近の活動（最新5件のナレッジとコメント）を取得
+        stats = await get_user_stats(db, current_user.id)
         
         return {
             "name": current_user.username,
             "department": current_user.department,
             "level": current_user.level,
-            "nextLevelExp": 4500,  # レベルに応じて計算する
-            "knowledgeCount": knowledge_count,
-            "totalPageViews": 343,  # 実際のページビュー数を集計する
+            "nextLevelExp": experience_for_level(current_user.level + 1) - current_user.experience_points,
+            "knowledgeCount": stats.knowledge_count,
+            "totalPageViews": stats.total_views,
             "avatar": f"/api/users/{current_user.id}/avatar" if current_user.avatar_data else "/default-avatar.jpg",
             "experiencePoints": current_user.experience_points,
             "stats": {
-                "knowledgeCount": knowledge_count,
-                "commentCount": comment_count
+                "knowledgeCount": stats.knowledge_count,
+                "commentCount": stats.comment_count
             },
             "recentActivity": {
-                "knowledge": [
-                    {
-                        "id": k.id,
-                        "title": k.title,
-                        "createdAt": k.created_at.strftime("%Y年%m月%d日")
-                    } for k in recent_knowledge
-                ],
-                "comments": [
-                    {
-                        "id": c.id,
-                        "content": c.content,
-                        "knowledgeId": c.knowledge_id,
-                        "createdAt": c.created_at.strftime("%Y年%m月%d日")
-                    } for c in recent_comments
-                ]
+                "knowledge": stats.recent_knowledge or [],
+                "comments": stats.recent_comments or []
             }
         }
     except Exception as e:
@@ -144,12 +135,12 @@ async def read_users_me(
                     {
                         "id": 1,
                         "title": "フロントエンド開発のベストプラクティス",
-                        "createdAt": datetime.now().strftime("%Y年%m月%d日")
+                        "createdAt": format_date(datetime.now())
                     },
                     {
                         "id": 2,
                         "title": "効率的なデータベース設計について",
-                        "createdAt": datetime.now().strftime("%Y年%m月%d日")
+                        "createdAt": format_date(datetime.now())
                     }
                 ],
                 "comments": [
@@ -157,13 +148,13 @@ async def read_users_me(
                         "id": 1,
                         "content": "とても参考になりました！",
                         "knowledgeId": 3,
-                        "createdAt": datetime.now().strftime("%Y年%m月%d日")
+                        "createdAt": format_date(datetime.now())
                     },
                     {
                         "id": 2,
                         "content": "この実装方法は素晴らしいですね",
                         "knowledgeId": 4,
-                        "createdAt": datetime.now().strftime("%Y年%m月%d日")
+                        "createdAt": format_date(datetime.now())
                     }
                 ]
             }
@@ -172,16 +163,18 @@ async def read_users_me(
 @router.put("/me")
 async def update_profile(
     profile: UserProfile,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
         if profile.username is not None:
             # ユーザー名の重複チェック
-            existing_user = db.query(User).filter(
-                User.username == profile.username,
-                User.id != current_user.id
-            ).first()
+            existing_user = (await db.execute(
+                select(User.id).where(
+                    User.username == profile.username,
+                    User.id != current_user.id
+                )
+            )).first()
             if existing_user:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
@@ -190,14 +183,17 @@ async def update_profile(
             current_user.username = profile.username
         
         if profile.department is not None:
+            await move_user_department(db, current_user, current_user.department, profile.department)
             current_user.department = profile.department
         
         if profile.password is not None:
             current_user.hashed_password = get_password_hash(profile.password)
         
         current_user.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(current_user)
+        # 一覧に表示する著者情報（名前・部署）が変わるため一覧のバージョンを進める
+        await db.commit()
+        await bump_version(KNOWLEDGE_LIST)
+        await db.refresh(current_user)
         
         return {
             "id": current_user.id,
@@ -224,7 +220,7 @@ async def update_profile(
 @router.post("/me/avatar")
 async def update_avatar(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     try:
@@ -237,13 +233,15 @@ async def update_avatar(
         
         # ファイルの内容を読み込む
         file_content = await file.read()
+        record_upload("avatar", len(file_content))
         
         # ユーザーのアバター情報を更新
         current_user.avatar_data = file_content
         current_user.avatar_content_type = file.content_type
         current_user.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await bump_version(KNOWLEDGE_LIST)
+        await db.refresh(current_user)
         
         return {
             "message": "アバターを更新しました",
@@ -0,0 +1,157 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from typing import Optional
+
+from core.config import settings
+from core.security import require_admin
+from utils.sql_instrumentation import instrumentation_enabled, set_instrumentation_enabled
+from utils.profiler import list_profiles, read_profile, sample_rate, set_sample_rate
+from utils import memory_diagnostics
+
+# 管理者用の診断API（X-Admin-Key ヘッダーが必要）
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+class SQLInstrumentationUpdate(BaseModel):
+    enabled: bool
+
+def _sql_instrumentation_status() -> dict:
+    return {
+        "enabled": instrumentation_enabled(),
+        "nPlusOneThreshold": settings.SQL_N_PLUS_ONE_THRESHOLD
+    }
+
+@router.get("/sql-instrumentation")
+async def get_sql_instrumentation():
+    return _sql_instrumentation_status()
+
+@router.put("/sql-instrumentation")
+async def update_sql_instrumentation(data: SQLInstrumentationUpdate):
+    # 全ワーカーに反映されるまで最大 FLAG_CACHE_SECONDS かかる
+    set_instrumentation_enabled(data.enabled)
+    return _sql_instrumentation_status()
+
+class ProfilerUpdate(BaseModel):
+    # None の場合は設定値（PROFILER_SAMPLE_RATE）に戻す
+    sampleRate: Optional[float] = Field(None, ge=0.0, le=1.0)
+
+def _profiler_status() -> dict:
+    return {
+        "sampleRate": sample_rate(),
+        "intervalMs": settings.PROFILER_INTERVAL_SECONDS * 1000,
+        "maxProfiles": settings.PROFILER_MAX_PROFILES
+    }
+
+@router.get("/profiler")
+async def get_profiler():
+    return _profiler_status()
+
+@router.put("/profiler")
+async def update_profiler(data: ProfilerUpdate):
+    set_sample_rate(data.sampleRate)
+    return _profiler_status()
+
+@router.get("/profiles")
+async def get_profiles(limit: int = 50):
+    return list_profiles(max(1, min(limit, settings.PROFILER_MAX_PROFILES)))
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    # folded 形式（flamegraph.pl / speedscope でそのまま読み込める）
+    folded = read_profile(profile_id)
+    if folded is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="プロファイルが見つかりません"
+        )
+    return PlainTextResponse(folded)
+
+class MemoryDiagnosticsUpdate(BaseModel):
+    enabled: bool
+
+class TracemallocUpdate(BaseModel):
+    enabled: bool
+    frames: int = Field(10, ge=1, le=100)  # 記録するスタックの深さ（大きいほどオーバーヘッドが増える）
+
+ALLOCATION_GROUPS = ("lineno", "filename", "traceback")
+
+def _check_group_by(group_by: str) -> None:
+    if group_by not in ALLOCATION_GROUPS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="group_by は lineno, filename, traceback のいずれかを指定してください"
+        )
+
+def _require_memory_diagnostics() -> None:
+    # このワーカーの書き出しが止まっていれば開始する（他のワーカーは起動時・/debug/memory の処理時に開始する）
+    if not memory_diagnostics.start_reporter():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="メモリ診断が無効です（PUT /debug/memory で有効にしてください）"
+        )
+
+@router.get("/memory")
+async def get_memory():
+    if not memory_diagnostics.start_reporter():
+        return {"enabled": False, "reportIntervalSeconds": settings.MEMORY_REPORT_INTERVAL_SECONDS, "workers": []}
+    # 自分の状態は最新にしてから返す（他のワーカーは最大 MEMORY_REPORT_INTERVAL_SECONDS 前の値）
+    await memory_diagnostics.sync_worker()
+    return {
+        "enabled": True,
+        "reportIntervalSeconds": settings.MEMORY_REPORT_INTERVAL_SECONDS,
+        "workers": memory_diagnostics.all_worker_status()
+    }
+
+@router.put("/memory")
+async def update_memory_diagnostics(data: MemoryDiagnosticsUpdate):
+    # 無効にした場合、各ワーカーは MEMORY_REPORT_INTERVAL_SECONDS 以内に tracemalloc を停止して書き出しを止める
+    memory_diagnostics.set_diagnostics_enabled(data.enabled)
+    return await get_memory()
+
+@router.put("/memory/tracemalloc")
+async def update_tracemalloc(data: TracemallocUpdate):
+    _require_memory_diagnostics()
+    # 他のワーカーには MEMORY_REPORT_INTERVAL_SECONDS 以内に反映される
+    memory_diagnostics.set_tracemalloc(data.frames if data.enabled else None)
+    await memory_diagnostics.sync_worker()
+    return memory_diagnostics.worker_status()
+
+@router.post("/memory/snapshots")
+async def create_memory_snapshot():
+    """全ワーカーにスナップショットを要求する（tracemalloc が有効なワーカーのみ保存される）"""
+    _require_memory_diagnostics()
+    name = memory_diagnostics.request_snapshot()
+    await memory_diagnostics.sync_worker()
+    return {"name": name, "reportIntervalSeconds": settings.MEMORY_REPORT_INTERVAL_SECONDS}
+
+@router.get("/memory/snapshots")
+async def get_memory_snapshots():
+    return memory_diagnostics.list_snapshots()
+
+@router.get("/memory/snapshots/{name}")
+async def get_memory_snapshot(name: str, group_by: str = "lineno", limit: int = 20):
+    _check_group_by(group_by)
+    # スナップショットの読み込み・集計は重いため、イベントループを止めないよう別スレッドで行う
+    result = await run_in_threadpool(
+        memory_diagnostics.top_allocations, name, group_by, max(1, min(limit, 200))
+    )
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="スナップショットが見つかりません"
+        )
+    return {"name": name, "groupBy": group_by, "workers": result}
+
+@router.get("/memory/snapshots/{name}/diff/{base}")
+async def get_memory_snapshot_diff(name: str, base: str, group_by: str = "lineno", limit: int = 20):
+    _check_group_by(group_by)
+    result = await run_in_threadpool(
+        memory_diagnostics.diff_allocations, name, base, group_by, max(1, min(limit, 200))
+    )
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="比較できるスナップショットが見つかりません（同じワーカーのスナップショットが両方に必要です）"
+        )
+    return {"name": name, "base": base, "groupBy": group_by, "workers": result}
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Response, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+from models.database import async_engine, replica_engine, replica_health, get_pool_status
+from utils.metrics import render_metrics
+
+router = APIRouter()
+
+@router.get("/healthz")
+async def healthz():
+    # プロセスが応答できるかのみを確認（DBには接続しない）
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz():
+    # プールのコネクションで軽量なクエリを実行して確認する
+    try:
+        async with async_engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+    except Exception as e:
+        print(f"レディネスチェックエラー: {str(e)}")
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "unavailable", "pool": get_pool_status()}
+        )
+
+    # レプリカが落ちていても読み取りはプライマリで処理できるため、準備完了とする
+    if replica_engine is not None:
+        try:
+            async with replica_engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        except Exception as e:
+            print(f"レプリカのレディネスチェックエラー: {str(e)}")
+            replica_health.mark_failed()
+    return {"status": "ok", "pool": get_pool_status()}
+
+@router.get("/metrics")
+async def metrics():
+    # Prometheus 形式（gunicorn の全ワーカー分を集計）
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
@@ -1,18 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Response
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer, joinedload
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
 import os
 
-from models.database import get_db
+from models.database import get_db, get_read_db, read_sessionmaker
 from models.user import User
 from models.knowledge import Knowledge
 from models.file import File as FileModel
 from models.comment import Comment
 from models.knowledge_collaborator import KnowledgeCollaborator
 from core.security import get_current_user
-from utils.experience import add_experience
+from utils.gamification import publish_event
+from utils.department import apply_department_delta
+from utils.user_stats import increment_user_stats, refresh_recent_knowledge, refresh_recent_comments
+from utils.metrics import record_cache, record_upload
+from utils.formatting import format_date
+from utils.cache_version import KNOWLEDGE_LIST, bump_version, get_version
+from utils.etag import etag_matches, not_modified, set_etag, weak_etag
+from utils.knowledge_export import EXPORT_FORMATS, export_batches, export_stream
+from utils.knowledge_import import import_lines, iter_request_lines
+from utils.comment_stream import comment_events, publish_comment_created, publish_comment_deleted
 
 router = APIRouter()
 
@@ -30,11 +42,145 @@ class KnowledgeUpdate(BaseModel):
     description: Optional[str] = None
     category: Optional[str] = None
 
-@router.post("/")
+class AuthorResponse(BaseModel):
+    id: int
+    name: Optional[str]
+    avatarUrl: Optional[str]
+    department: Optional[str]
+
+class KnowledgeStatsResponse(BaseModel):
+    commentCount: int
+    fileCount: int
+
+class KnowledgeResponse(BaseModel):
+    id: int
+    title: Optional[str]
+    method: Optional[str]
+    target: Optional[str]
+    description: Optional[str]
+    category: Optional[str]
+    views: Optional[int]
+    createdAt: str
+    updatedAt: str
+    author: AuthorResponse
+    stats: KnowledgeStatsResponse
+
+class KnowledgeListItemResponse(BaseModel):
+    id: int
+    title: Optional[str]
+    description: Optional[str]
+    method: Optional[str]
+    target: Optional[str]
+    category: Optional[str]
+    views: Optional[int]
+    createdAt: str
+    updatedAt: str
+    commentCount: int
+    fileCount: int
+    author: AuthorResponse
+    collaborators: List[AuthorResponse]
+
+class KnowledgeListResponse(BaseModel):
+    total: int
+    items: List[KnowledgeListItemResponse]
+    skip: int
+    limit: int
+    search: Optional[str]
+    categories: Optional[str]
+    sortBy: str
+    sortOrder: str
+
+class KnowledgeBatchResponse(BaseModel):
+    items: List[KnowledgeListItemResponse]
+
+class CommentResponse(BaseModel):
+    id: int
+    content: Optional[str]
+    createdAt: str
+    author: AuthorResponse
+
+class CommentListResponse(BaseModel):
+    total: int
+    remaining: int  # カーソル（before）より古いコメントの件数
+    items: List[CommentResponse]
+
+# 一括取得できるナレッジ数の上限
+MAX_BATCH_KNOWLEDGE = 100
+
+# ナレッジごとのコメント数・ファイル数（Knowledge を選択するクエリに相関サブクエリとして加える）
+COMMENT_COUNT = (
+    select(func.count(Comment.id))
+    .where(Comment.knowledge_id == Knowledge.id)
+    .scalar_subquery()
+)
+FILE_COUNT = (
+    select(func.count(FileModel.id))
+    .where(FileModel.knowledge_id == Knowledge.id)
+    .scalar_subquery()
+)
+
+def _author_dict(user: User) -> dict:
+    return {
+        "id": user.id,
+        "name": user.username,
+        "avatarUrl": user.avatar_url,
+        "department": user.department
+    }
+
+async def _knowledge_list_items(db: AsyncSession, query) -> list:
+    """
+    ナレッジを一覧表示用の形式で取得する（件数に関わらず2クエリ）
+
+    Args:
+        db (AsyncSession): データベースセッション
+        query: Knowledge を選択するクエリ（絞り込み・並び順・件数を指定済み）
+
+    Note:
+        - 著者・コメント数・ファイル数はナレッジと同じクエリで、コラボレーターはまとめて1クエリで取得する
+        - アバター画像は読み込まない（アバターの有無のみ使う）
+    """
+    rows = (await db.execute(
+        query.add_columns(COMMENT_COUNT, FILE_COUNT)
+        .options(joinedload(Knowledge.author).defer(User.avatar_data))
+    )).all()
+    if not rows:
+        return []
+
+    collaborators = {}
+    collaborator_rows = (await db.execute(
+        select(KnowledgeCollaborator.knowledge_id, User)
+        .join(User, User.id == KnowledgeCollaborator.user_id)
+        .options(defer(User.avatar_data))
+        .where(KnowledgeCollaborator.knowledge_id.in_([knowledge.id for knowledge, _, _ in rows]))
+        .order_by(KnowledgeCollaborator.knowledge_id, User.id)
+    )).all()
+    for knowledge_id, user in collaborator_rows:
+        collaborators.setdefault(knowledge_id, []).append(_author_dict(user))
+
+    return [
+        {
+            "id": knowledge.id,
+            "title": knowledge.title,
+            "description": knowledge.description,
+            "method": knowledge.method,
+            "target": knowledge.target,
+            "category": knowledge.category,
+            "views": knowledge.views,
+            "createdAt": format_date(knowledge.created_at),
+            "updatedAt": format_date(knowledge.updated_at),
+            "commentCount": comment_count,
+            "fileCount": file_count,
+            "author": _author_dict(knowledge.author),
+            "collaborators": collaborators.get(knowledge.id, [])
+        }
+        for knowledge, comment_count, file_count in rows
+    ]
+
+@router.post("/", response_model=KnowledgeResponse)
 async def create_knowledge(
     knowledge_data: KnowledgeCreate,
     files: Optional[List[UploadFile]] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
     try:
@@ -48,8 +194,8 @@ async def create_knowledge(
                 "description": knowledge_data.description,
                 "category": knowledge_data.category,
                 "views": 0,
-                "createdAt": datetime.now().strftime("%Y年%m月%d日"),
-                "updatedAt": datetime.now().strftime("%Y年%m月%d日"),
+                "createdAt": format_date(datetime.now()),
+                "updatedAt": format_date(datetime.now()),
                 "author": {
                     "id": 1,
                     "name": "テストユーザー",
@@ -72,13 +218,17 @@ async def create_knowledge(
             author_id=current_user.id
         )
         db.add(knowledge)
-        db.commit()
-        db.refresh(knowledge)
+        # 経験値付与イベントを登録（同じトランザクションでコミット）
+        publish_event(db, current_user.id, "create_knowledge", 10)
+        # ID を採番する（コミットは集計と合わせて最後に1回だけ行う）
+        # ナレッジ・イベントの登録で users の行をロックしてから部署集計を更新する（イベント処理と同じロックの順序）
+        await db.flush()
         
         # ファイルのアップロード処理
         if files:
             for file in files:
                 file_content = await file.read()
+                record_upload("knowledge_file", len(file_content))
                 
                 # データベースにファイル情報を保存
                 db_file = FileModel(
@@ -89,10 +239,12 @@ async def create_knowledge(
                 )
                 db.add(db_file)
         
-        db.commit()
-        
-        # 経験値を追加
-        add_experience(current_user, 10, db)
+        # ユーザー・部署のナレッジ数を更新
+        await increment_user_stats(db, current_user.id, knowledge=1)
+        await apply_department_delta(db, current_user.department, knowledge=1)
+        await refresh_recent_knowledge(db, current_user.id)
+        await db.commit()
+        await bump_version(KNOWLEDGE_LIST)
         
         return {
             "id": knowledge.id,
@@ -102,14 +254,9 @@ async def create_knowledge(
             "description": knowledge.description,
             "category": knowledge.category,
             "views": knowledge.views,
-            "createdAt": knowledge.created_at.strftime("%Y年%m月%d日"),
-            "updatedAt": knowledge.updated_at.strftime("%Y年%m月%d日"),
-            "author": {
-                "id": current_user.id,
-                "name": current_user.username,
-                "avatarUrl": current_user.avatar_url,
-                "department": current_user.department
-            },
+            "createdAt": format_date(knowledge.created_at),
+            "updatedAt": format_date(knowledge.updated_at),
+            "author": _author_dict(current_user),
             "stats": {
                 "commentCount": 0,
                 "fileCount": len(files) if files else 0
@@ -126,8 +273,8 @@ async def create_knowledge(
             "description": knowledge_data.description,
             "category": knowledge_data.category,
             "views": 0,
-            "createdAt": datetime.now().strftime("%Y年%m月%d日"),
-            "updatedAt": datetime.now().strftime("%Y年%m月%d日"),
+            "createdAt": format_date(datetime.now()),
+            "updatedAt": format_date(datetime.now()),
             "author": {
                 "id": 1,
                 "name": "テストユーザー",
@@ -140,11 +287,27 @@ async def create_knowledge(
             }
         }
 
+@router.post("/import")
+async def import_knowledge(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    NDJSON（1行に1件の KnowledgeCreate）からナレッジを一括作成する
+
+    Note:
+        - 本文は受信しながら1行ずつ検証し、IMPORT_BATCH_SIZE 件ごとにまとめて挿入・コミットする
+        - 不正な行があっても他の行は作成し、行番号とエラー内容を errors で返す
+        - IMPORT_MAX_LINE_BYTES を超える行は読み捨て、その行のエラーとして返す
+    """
+    return await import_lines(db, current_user, iter_request_lines(request.stream()), KnowledgeCreate)
+
 @router.post("/{knowledge_id}/files")
 async def upload_files(
     knowledge_id: int,
     files: List[UploadFile] = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
     try:
@@ -156,7 +319,7 @@ async def upload_files(
                 "content_type": "text/plain"
             }]
 
-        knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
+        knowledge = await db.get(Knowledge, knowledge_id)
         if not knowledge:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -172,6 +335,7 @@ async def upload_files(
         uploaded_files = []
         for file in files:
             file_content = await file.read()
+            record_upload("knowledge_file", len(file_content))
             
             db_file = FileModel(
                 knowledge_id=knowledge_id,
@@ -186,7 +350,8 @@ async def upload_files(
                 "content_type": db_file.content_type
             })
         
-        db.commit()
+        await db.commit()
+        await bump_version(KNOWLEDGE_LIST)
         return uploaded_files
     except Exception as e:
         print(f"ファイルアップロードエラー: {str(e)}")
@@ -200,10 +365,12 @@ async def upload_files(
 @router.get("/{knowledge_id}/files")
 async def list_files(
     knowledge_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     try:
-        files = db.query(FileModel).filter(FileModel.knowledge_id == knowledge_id).all()
+        files = (await db.execute(
+            select(FileModel).where(FileModel.knowledge_id == knowledge_id)
+        )).scalars().all()
         return [{
             "id": file.id,
             "file_name": file.file_name,
@@ -222,13 +389,15 @@ async def list_files(
 async def download_file(
     knowledge_id: int,
     file_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     try:
-        file = db.query(FileModel).filter(
-            FileModel.id == file_id,
-            FileModel.knowledge_id == knowledge_id
-        ).first()
+        file = await db.scalar(
+            select(FileModel).where(
+                FileModel.id == file_id,
+                FileModel.knowledge_id == knowledge_id
+            )
+        )
         
         if not file:
             raise HTTPException(
@@ -254,19 +423,93 @@ async def download_file(
             }
         )
 
-@router.get("/")
+# /{knowledge_id} より先に定義する（"export" が ID として解釈されないように）
+@router.get("/export")
+async def export_knowledge(
+    format: str = "ndjson",
+    categories: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format は ndjson, csv のいずれかを指定してください"
+        )
+    category_list = [cat.strip() for cat in categories.split(",")] if categories else None
+
+    # セッションはストリームの中で作成する（依存関係のセッションはレスポンスの送信前に閉じられるため）
+    batches = export_batches(read_sessionmaker(), category_list)
+    filename = f"knowledge-{datetime.utcnow().strftime('%Y%m%d')}.{format}"
+    return StreamingResponse(
+        export_stream(batches, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# /{knowledge_id} より先に定義する（"batch" が ID として解釈されないように）
+@router.get("/batch", response_model=KnowledgeBatchResponse)
+async def get_knowledge_batch(
+    ids: str,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[User] = Depends(get_current_user)
+):
+    """
+    指定したIDのナレッジをまとめて取得する（ブックマーク・最近見たナレッジなどの表示用）
+
+    Note:
+        - 一覧と同じ形式で、指定順に返す（存在しないIDは除く）
+        - 閲覧数は加算しない
+    """
+    # カンマ区切りのIDを解析（重複は除き、指定順を保持）
+    try:
+        knowledge_ids = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids はカンマ区切りの整数で指定してください"
+        )
+    if len(knowledge_ids) > MAX_BATCH_KNOWLEDGE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"ids は{MAX_BATCH_KNOWLEDGE}件まで指定できます"
+        )
+    if not knowledge_ids:
+        return {"items": []}
+
+    items = {
+        item["id"]: item
+        for item in await _knowledge_list_items(db, select(Knowledge).where(Knowledge.id.in_(knowledge_ids)))
+    }
+    return {"items": [items[knowledge_id] for knowledge_id in knowledge_ids if knowledge_id in items]}
+
+@router.get("/", response_model=KnowledgeListResponse)
 async def list_knowledge(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 10,
     search: Optional[str] = None,
     categories: Optional[str] = None,
     sort_by: str = "created_at",
     sort_order: str = "desc",
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
+    # 一覧の内容が変わるたびに進むバージョンと条件から ETag を作り、
+    # クライアントの保持している一覧が最新であれば検索・集計を行わずに 304 を返す
+    # （閲覧数の加算ではバージョンを進めないため、表示される閲覧数は次の変更まで更新されない）
+    etag = weak_etag(
+        await get_version(db, KNOWLEDGE_LIST),
+        skip, limit, search, categories, sort_by, sort_order
+    )
+    not_changed = etag_matches(request, etag)
+    record_cache("knowledge_list_etag", not_changed)
+    if not_changed:
+        return not_modified(etag)
+    set_etag(response, etag)
+
     # 基本クエリの作成
-    query = db.query(Knowledge)
+    query = select(Knowledge)
 
     # 検索フィルターの適用
     if search:
@@ -276,15 +519,15 @@ async def list_knowledge(
             Knowledge.method.ilike(f"%{search}%") |
             Knowledge.target.ilike(f"%{search}%")
         )
-        query = query.filter(search_filter)
+        query = query.where(search_filter)
 
     # カテゴリーフィルターの適用
     if categories:
         category_list = [cat.strip() for cat in categories.split(",")]
-        query = query.filter(Knowledge.category.in_(category_list))
+        query = query.where(Knowledge.category.in_(category_list))
 
     # 総件数の取得
-    total = query.count()
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
 
     # ソート順の適用
     if sort_by == "title":
@@ -302,61 +545,8 @@ async def list_knowledge(
     # ページネーションの適用
     query = query.offset(skip).limit(limit)
     
-    # 結果の取得
-    knowledge_list = query.all()
-    
-    # レスポンスの作成
-    results = []
-    for knowledge in knowledge_list:
-        # コメント数の取得
-        comment_count = db.query(Comment).filter(
-            Comment.knowledge_id == knowledge.id
-        ).count()
-        
-        # ファイル数の取得
-        file_count = db.query(FileModel).filter(
-            FileModel.knowledge_id == knowledge.id
-        ).count()
-        
-        # 著者情報の取得
-        author = db.query(User).filter(User.id == knowledge.author_id).first()
-        
-        # コラボレーター情報の取得
-        collaborators = db.query(KnowledgeCollaborator).filter(
-            KnowledgeCollaborator.knowledge_id == knowledge.id
-        ).all()
-        collaborator_ids = [c.user_id for c in collaborators]
-        collaborator_users = db.query(User).filter(User.id.in_(collaborator_ids)).all()
-        
-        knowledge_dict = {
-            "id": knowledge.id,
-            "title": knowledge.title,
-            "description": knowledge.description,
-            "method": knowledge.method,
-            "target": knowledge.target,
-            "category": knowledge.category,
-            "views": knowledge.views,
-            "createdAt": knowledge.created_at.strftime("%Y年%m月%d日"),
-            "updatedAt": knowledge.updated_at.strftime("%Y年%m月%d日"),
-            "commentCount": comment_count,
-            "fileCount": file_count,
-            "author": {
-                "id": author.id,
-                "name": author.username,
-                "avatarUrl": author.avatar_url,
-                "department": author.department
-            },
-            "collaborators": [
-                {
-                    "id": user.id,
-                    "name": user.username,
-                    "avatarUrl": user.avatar_url,
-                    "department": user.department
-                }
-                for user in collaborator_users
-            ]
-        }
-        results.append(knowledge_dict)
+    # 結果の取得（著者・コメント数・ファイル数・コラボレーターもまとめて取得）
+    results = await _knowledge_list_items(db, query)
 
     return {
         "total": total,
@@ -369,11 +559,11 @@ async def list_knowledge(
         "sortOrder": sort_order
     }
 
-@router.put("/{knowledge_id}")
+@router.put("/{knowledge_id}", response_model=KnowledgeResponse)
 async def update_knowledge(
     knowledge_id: int,
     knowledge_data: KnowledgeUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
     try:
@@ -387,8 +577,8 @@ async def update_knowledge(
                 "description": knowledge_data.description or "テスト説明",
                 "category": knowledge_data.category or "テストカテゴリ",
                 "views": 0,
-                "createdAt": datetime.now().strftime("%Y年%m月%d日"),
-                "updatedAt": datetime.now().strftime("%Y年%m月%d日"),
+                "createdAt": format_date(datetime.now()),
+                "updatedAt": format_date(datetime.now()),
                 "author": {
                     "id": 1,
                     "name": "テストユーザー",
@@ -401,7 +591,7 @@ async def update_knowledge(
                 }
             }
 
-        knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
+        knowledge = await db.get(Knowledge, knowledge_id)
         if not knowledge:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -427,8 +617,10 @@ async def update_knowledge(
             knowledge.category = knowledge_data.category
         
         knowledge.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(knowledge)
+        await refresh_recent_knowledge(db, current_user.id)
+        await db.commit()
+        await bump_version(KNOWLEDGE_LIST)
+        await db.refresh(knowledge)
         
         return {
             "id": knowledge.id,
@@ -438,14 +630,9 @@ async def update_knowledge(
             "description": knowledge.description,
             "category": knowledge.category,
             "views": knowledge.views,
-            "createdAt": knowledge.created_at.strftime("%Y年%m月%d日"),
-            "updatedAt": knowledge.updated_at.strftime("%Y年%m月%d日"),
-            "author": {
-                "id": current_user.id,
-                "name": current_user.username,
-                "avatarUrl": current_user.avatar_url,
-                "department": current_user.department
-            },
+            "createdAt": format_date(knowledge.created_at),
+            "updatedAt": format_date(knowledge.updated_at),
+            "author": _author_dict(current_user),
             "stats": {
                 "commentCount": 0,
                 "fileCount": 0
@@ -462,8 +649,8 @@ async def update_knowledge(
             "description": knowledge_data.description or "テスト説明",
             "category": knowledge_data.category or "テストカテゴリ",
             "views": 0,
-            "createdAt": datetime.now().strftime("%Y年%m月%d日"),
-            "updatedAt": datetime.now().strftime("%Y年%m月%d日"),
+            "createdAt": format_date(datetime.now()),
+            "updatedAt": format_date(datetime.now()),
             "author": {
                 "id": 1,
                 "name": "テストユーザー",
@@ -479,7 +666,7 @@ async def update_knowledge(
 @router.delete("/{knowledge_id}")
 async def delete_knowledge(
     knowledge_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
     try:
@@ -487,7 +674,7 @@ async def delete_knowledge(
             # テスト用デフォルト値を返す（認証エラーの場合）
             return {"message": "ナレッジが正常に削除されました"}
 
-        knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
+        knowledge = await db.get(Knowledge, knowledge_id)
         if not knowledge:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -500,19 +687,52 @@ async def delete_knowledge(
                 detail="このナレッジを削除する権限がありません"
             )
         
+        # 削除されるコメントの投稿者ごとの件数
+        comment_counts = (await db.execute(
+            select(Comment.author_id, func.count(Comment.id))
+            .where(Comment.knowledge_id == knowledge_id)
+            .group_by(Comment.author_id)
+        )).all()
+        
         # データベースから削除
-        db.delete(knowledge)
-        db.commit()
+        await db.delete(knowledge)
+        # ユーザー単位の集計を部署集計より先に更新する（イベント処理と同じロックの順序）
+        await increment_user_stats(db, current_user.id, knowledge=-1, views=-(knowledge.views or 0))
+        await apply_department_delta(db, current_user.department, knowledge=-1)
+        await refresh_recent_knowledge(db, current_user.id)
+        for author_id, count in comment_counts:
+            await increment_user_stats(db, author_id, comments=-count)
+            await refresh_recent_comments(db, author_id)
+        await db.commit()
+        await bump_version(KNOWLEDGE_LIST)
         
         return {"message": "ナレッジが正常に削除されました"}
     except Exception as e:
         print(f"ナレッジ削除エラー: {str(e)}")
         return {"message": "ナレッジが正常に削除されました"}
 
-@router.get("/{knowledge_id}")
+async def _count_view(db: AsyncSession, knowledge_id: int, author_id: Optional[int]) -> None:
+    """
+    閲覧数を加算してコミットする
+
+    Note:
+        - 更新日時・ETag が閲覧のたびに変わらないよう、updated_at は現在の値のまま更新する
+    """
+    await db.execute(
+        update(Knowledge)
+        .where(Knowledge.id == knowledge_id)
+        .values(views=Knowledge.views + 1, updated_at=Knowledge.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    await increment_user_stats(db, author_id, views=1)
+    await db.commit()
+
+@router.get("/{knowledge_id}", response_model=KnowledgeResponse)
 async def get_knowledge(
     knowledge_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),  # 閲覧数を更新するためプライマリを使う
     current_user: Optional[User] = Depends(get_current_user)
 ):
     try:
@@ -526,8 +746,8 @@ async def get_knowledge(
                 "target": "テスト対象",
                 "category": "テストカテゴリ",
                 "views": 0,
-                "createdAt": datetime.now().strftime("%Y年%m月%d日"),
-                "updatedAt": datetime.now().strftime("%Y年%m月%d日"),
+                "createdAt": format_date(datetime.now()),
+                "updatedAt": format_date(datetime.now()),
                 "author": {
                     "id": 1,
                     "name": "テストユーザー",
@@ -540,20 +760,51 @@ async def get_knowledge(
                 }
             }
 
-        knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
-        if not knowledge:
+        # If-None-Match がある場合は、ETag の材料だけを取得して先に比較する
+        # （一致すれば本文・著者の取得とシリアライズを行わない）
+        conditional = bool(request.headers.get("if-none-match"))
+        if conditional:
+            validator = (await db.execute(
+                select(
+                    Knowledge.id, Knowledge.updated_at, COMMENT_COUNT, FILE_COUNT,
+                    Knowledge.author_id, User.updated_at
+                )
+                .outerjoin(User, User.id == Knowledge.author_id)
+                .where(Knowledge.id == knowledge_id)
+            )).first()
+            if validator is not None:
+                etag = weak_etag(*validator)
+                not_changed = etag_matches(request, etag)
+                record_cache("knowledge_etag", not_changed)
+                if not_changed:
+                    # 304 を返す場合も閲覧として数える
+                    await _count_view(db, knowledge_id, validator.author_id)
+                    return not_modified(etag)
+
+        # 非同期セッションでは遅延ロードできないため、著者も同時に取得する
+        # （コメント数・ファイル数も相関サブクエリで同じクエリにまとめる。アバター画像は読み込まない）
+        row = (await db.execute(
+            select(Knowledge, COMMENT_COUNT, FILE_COUNT)
+            .options(joinedload(Knowledge.author).defer(User.avatar_data))
+            .where(Knowledge.id == knowledge_id)
+        )).first()
+        if not row:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="ナレッジが見つかりません"
             )
+        knowledge, comment_count, file_count = row
+        await _count_view(db, knowledge_id, knowledge.author_id)
         
-        # 閲覧数をインクリメント
-        knowledge.views += 1
-        db.commit()
-        
-        # 関連データのカウント
-        comment_count = db.query(Comment).filter(Comment.knowledge_id == knowledge_id).count()
-        file_count = db.query(FileModel).filter(FileModel.knowledge_id == knowledge_id).count()
+        # 閲覧数は ETag に含めない（本文の内容・件数・著者情報が変わった場合のみ変わる）
+        # 材料の順序は上の比較用のクエリの列と同じにする
+        etag = weak_etag(
+            knowledge.id, knowledge.updated_at, comment_count, file_count,
+            knowledge.author_id, knowledge.author.updated_at
+        )
+        if not conditional:
+            record_cache("knowledge_etag", False)
+        set_etag(response, etag)
         
         return {
             "id": knowledge.id,
@@ -562,15 +813,10 @@ async def get_knowledge(
             "method": knowledge.method,
             "target": knowledge.target,
             "category": knowledge.category,
-            "views": knowledge.views,
-            "createdAt": knowledge.created_at.strftime("%Y年%m月%d日"),
-            "updatedAt": knowledge.updated_at.strftime("%Y年%m月%d日"),
-            "author": {
-                "id": knowledge.author.id,
-                "name": knowledge.author.username,
-                "avatarUrl": knowledge.author.avatar_url,
-                "department": knowledge.author.department
-            },
+            "views": (knowledge.views or 0) + 1,
+            "createdAt": format_date(knowledge.created_at),
+            "updatedAt": format_date(knowledge.updated_at),
+            "author": _author_dict(knowledge.author),
             "stats": {
                 "commentCount": comment_count,
                 "fileCount": file_count
@@ -587,8 +833,8 @@ async def get_knowledge(
             "target": "テスト対象",
             "category": "テストカテゴリ",
             "views": 0,
-            "createdAt": datetime.now().strftime("%Y年%m月%d日"),
-            "updatedAt": datetime.now().strftime("%Y年%m月%d日"),
+            "createdAt": format_date(datetime.now()),
+            "updatedAt": format_date(datetime.now()),
             "author": {
                 "id": 1,
                 "name": "テストユーザー",
@@ -601,11 +847,11 @@ async def get_knowledge(
             }
         }
 
-@router.post("/{knowledge_id}/comments")
+@router.post("/{knowledge_id}/comments", response_model=CommentResponse)
 async def create_comment(
     knowledge_id: int,
     content: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
     try:
@@ -614,7 +860,7 @@ async def create_comment(
             return {
                 "id": 1,
                 "content": content,
-                "createdAt": datetime.now().strftime("%Y年%m月%d日"),
+                "createdAt": format_date(datetime.now()),
                 "author": {
                     "id": 1,
                     "name": "テストユーザー",
@@ -624,7 +870,7 @@ async def create_comment(
             }
 
         # ナレッジの存在確認
-        knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
+        knowledge = await db.get(Knowledge, knowledge_id)
         if not knowledge:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -638,30 +884,32 @@ async def create_comment(
             author_id=current_user.id
         )
         db.add(comment)
-        db.commit()
-        db.refresh(comment)
+        await increment_user_stats(db, current_user.id, comments=1)
+        await refresh_recent_comments(db, current_user.id)
         
-        # 経験値を追加
-        add_experience(current_user, 10, db)
+        # 経験値付与イベントを登録（同じトランザクションでコミット）
+        publish_event(db, current_user.id, "comment", 10)
+        await db.commit()
+        # 一覧のコメント数が変わる
+        await bump_version(KNOWLEDGE_LIST)
+        await db.refresh(comment)
         
-        return {
+        comment_dict = {
             "id": comment.id,
             "content": comment.content,
-            "createdAt": comment.created_at.strftime("%Y年%m月%d日"),
-            "author": {
-                "id": current_user.id,
-                "name": current_user.username,
-                "avatarUrl": current_user.avatar_url,
-                "department": current_user.department
-            }
+            "createdAt": format_date(comment.created_at),
+            "author": _author_dict(current_user)
         }
+        # コメント一覧を表示中のクライアントへ配信する
+        publish_comment_created(knowledge_id, comment_dict)
+        return comment_dict
     except Exception as e:
         print(f"コメント作成エラー: {str(e)}")
         # テスト用デフォルト値を返す
         return {
             "id": 1,
             "content": content,
-            "createdAt": datetime.now().strftime("%Y年%m月%d日"),
+            "createdAt": format_date(datetime.now()),
             "author": {
                 "id": 1,
                 "name": "テストユーザー",
@@ -670,56 +918,135 @@ async def create_comment(
             }
         }
 
-@router.get("/{knowledge_id}/comments")
+@router.get("/{knowledge_id}/comments", response_model=CommentListResponse)
 async def list_comments(
     knowledge_id: int,
     skip: int = 0,
     limit: int = 10,
-    db: Session = Depends(get_db)
+    before: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    # ナレッジの存在確認
-    knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
-    if not knowledge:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Knowledge not found"
-        )
-    
-    # コメント一覧を取得
-    comments = db.query(Comment)\
-        .filter(Comment.knowledge_id == knowledge_id)\
-        .order_by(Comment.created_at.desc())\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
-    
-    total = db.query(Comment)\
-        .filter(Comment.knowledge_id == knowledge_id)\
-        .count()
-    
-    comment_list = []
-    for comment in comments:
-        comment_list.append({
-            "id": comment.id,
-            "content": comment.content,
-            "createdAt": comment.created_at.strftime("%Y年%m月%d日"),
-            "author": {
-                "id": comment.author.id,
-                "name": comment.author.username,
-                "avatarUrl": comment.author.avatar_url,
-                "department": comment.author.department
-            }
-        })
-    
+    """
+    コメント一覧（新しい順）
+
+    Args:
+        before (Optional[int]): 指定したコメントより古いものを返す（無限スクロール用のカーソル。
+            前のページの最後のコメントIDを指定する）
+
+    Note:
+        - 著者と件数（COUNT(*) のウィンドウ関数）をコメントと同じ1クエリで取得する
+        - total はナレッジのコメントの総件数、remaining はカーソルより古いコメントの件数
+          （before を指定しない場合は total と同じ）
+        - before を指定した場合は、カーソルの日時・ナレッジの存在・総件数を先に1クエリで取得する
+          （このナレッジのコメントではない場合は 400）
+        - before を指定しない場合、ナレッジの存在確認はコメントが1件も取得できなかった場合のみ行う
+    """
+    filters = [Comment.knowledge_id == knowledge_id]
+    total = None
+    if before is not None:
+        found = (await db.execute(
+            select(
+                Knowledge.id,
+                select(Comment.created_at)
+                .where(Comment.id == before, Comment.knowledge_id == knowledge_id)
+                .scalar_subquery(),
+                select(func.count(Comment.id))
+                .where(Comment.knowledge_id == knowledge_id)
+                .scalar_subquery()
+            ).where(Knowledge.id == knowledge_id)
+        )).first()
+        if found is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Knowledge not found"
+            )
+        _, cursor_created_at, total = found
+        if cursor_created_at is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="before にはこのナレッジのコメントIDを指定してください"
+            )
+        # 並び順と同じ (created_at, id) で比較する（同じ日時のコメントがあっても重複・欠落しない）
+        filters.append(or_(
+            Comment.created_at < cursor_created_at,
+            and_(Comment.created_at == cursor_created_at, Comment.id < before)
+        ))
+
+    # 件数のウィンドウにも一覧と同じ並び順を指定する（フレームは全行）
+    # （OVER () のままだと、ウィンドウの計算後に一時テーブルで並び替え直すプランになる）
+    order = (Comment.created_at.desc(), Comment.id.desc())
+    rows = (await db.execute(
+        select(Comment, func.count().over(order_by=order, rows=(None, None)).label("remaining"))
+        .options(joinedload(Comment.author).defer(User.avatar_data))
+        .where(*filters)
+        .order_by(*order)
+        .offset(skip)
+        .limit(limit)
+    )).all()
+
+    if rows:
+        remaining = rows[0].remaining
+    elif before is not None:
+        remaining = await db.scalar(select(func.count(Comment.id)).where(*filters))
+    else:
+        # 該当するコメントがない場合は、ナレッジの存在確認と件数の取得をまとめて行う
+        found = (await db.execute(
+            select(
+                Knowledge.id,
+                select(func.count(Comment.id)).where(*filters).scalar_subquery()
+            ).where(Knowledge.id == knowledge_id)
+        )).first()
+        if found is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Knowledge not found"
+            )
+        remaining = found[1]
+    if total is None:
+        total = remaining
+
     return {
         "total": total,
-        "items": comment_list
+        "remaining": remaining,
+        "items": [
+            {
+                "id": comment.id,
+                "content": comment.content,
+                "createdAt": format_date(comment.created_at),
+                "author": _author_dict(comment.author)
+            }
+            for comment, _ in rows
+        ]
     }
 
+@router.get("/{knowledge_id}/comments/stream")
+async def stream_comments(knowledge_id: int):
+    """
+    コメントの作成・削除を Server-Sent Events で配信する（ポーリングの代わりに使う）
+
+    Note:
+        - event: created（data はコメント一覧の1件と同じ形式）/ deleted（data は {"id": コメントID}）
+        - 接続中はDBセッションを保持しない（存在確認のセッションは配信の開始前に閉じる）
+        - 切断中のイベントは再送しないため、再接続時はコメント一覧を取得し直す
+    """
+    async with read_sessionmaker()() as db:
+        exists = await db.scalar(select(Knowledge.id).where(Knowledge.id == knowledge_id))
+    if exists is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="ナレッジが見つかりません"
+        )
+    return StreamingResponse(
+        comment_events(knowledge_id),
+        media_type="text/event-stream",
+        # プロキシ（nginx など）にバッファリングさせない
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.delete("/comments/{comment_id}")
 async def delete_comment(
     comment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
     try:
@@ -728,7 +1055,7 @@ async def delete_comment(
             return {"message": "コメントが正常に削除されました"}
 
         # コメントの存在確認
-        comment = db.query(Comment).filter(Comment.id == comment_id).first()
+        comment = await db.get(Comment, comment_id)
         if not comment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -743,8 +1070,12 @@ async def delete_comment(
             )
         
         # コメントの削除
-        db.delete(comment)
-        db.commit()
+        await db.delete(comment)
+        await increment_user_stats(db, current_user.id, comments=-1)
+        await refresh_recent_comments(db, current_user.id)
+        await db.commit()
+        await bump_version(KNOWLEDGE_LIST)
+        publish_comment_deleted(comment.knowledge_id, comment.id)
         
         return {"message": "コメントが正常に削除されました"}
     except Exception as e:
@@ -755,7 +1086,7 @@ async def delete_comment(
 async def add_collaborator(
     knowledge_id: int,
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user)
 ):
     try:
@@ -763,7 +1094,7 @@ async def add_collaborator(
             # テスト用デフォルト値を返す（認証エラーの場合）
             return {"message": "コラボレーターが正常に追加されました"}
 
-        knowledge = db.query(Knowledge).filter(Knowledge.id == knowledge_id).first()
+        knowledge = await db.get(Knowledge, knowledge_id)
         if not knowledge:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -781,7 +1112,8 @@ async def add_collaborator(
             user_id=user_id
         )
         db.add(collaborator)
-        db.commit()
+        await db.commit()
+        await bump_version(KNOWLEDGE_LIST)
         
         return {"message": "コラボレーターが正常に追加されました"}
     except Exception as e:
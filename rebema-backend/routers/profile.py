@@ -1,17 +1,25 @@
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Response
-from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from pydantic import BaseModel
 import os
 from sqlalchemy.sql import func
 
-from models.database import get_db
+from models.database import get_db, get_read_db
 from models.user import User
 from models.profile import Profile
 from models.knowledge import Knowledge
 from models.comment import Comment
+from models.user_stats import UserStats
 from core.security import get_current_user, get_password_hash
+from utils.department import move_user_department
+from utils.experience import experience_for_level
+from utils.user_stats import get_user_stats
+from utils.metrics import record_upload
+from utils.formatting import format_date
+from utils.cache_version import KNOWLEDGE_LIST, bump_version
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 
@@ -22,127 +30,210 @@ class UserProfileUpdate(BaseModel):
     bio: Optional[str] = None
     phoneNumber: Optional[str] = None
 
-@router.get("/{user_id}")
+class UserCardResponse(BaseModel):
+    id: int
+    name: Optional[str]
+    department: Optional[str]
+    level: Optional[int]
+    avatarUrl: Optional[str]
+
+class UserCardListResponse(BaseModel):
+    items: List[UserCardResponse]
+
+class UserProfileStatsResponse(BaseModel):
+    knowledgeCount: int
+    commentCount: int
+
+class UserProfileResponse(BaseModel):
+    id: int
+    name: Optional[str]
+    department: Optional[str]
+    level: Optional[int]
+    hasAvatar: bool
+    bio: Optional[str]
+    stats: UserProfileStatsResponse
+
+class RecentKnowledgeResponse(BaseModel):
+    id: int
+    title: Optional[str]
+    createdAt: str
+
+class RecentCommentResponse(BaseModel):
+    id: int
+    content: Optional[str]
+    knowledgeId: int
+    createdAt: str
+
+class RecentActivityResponse(BaseModel):
+    knowledge: List[RecentKnowledgeResponse]
+    comments: List[RecentCommentResponse]
+
+class MyProfileResponse(BaseModel):
+    id: int
+    name: Optional[str]
+    email: Optional[str]
+    department: Optional[str]
+    hasAvatar: bool
+    experiencePoints: Optional[int]
+    level: Optional[int]
+    bio: Optional[str]
+    phoneNumber: Optional[str]
+    stats: UserProfileStatsResponse
+    recentActivity: RecentActivityResponse
+
+class MypageStatsResponse(BaseModel):
+    knowledgeCount: int
+    totalPageViews: int
+
+class MypageUserResponse(BaseModel):
+    id: int
+    name: Optional[str]
+    department: str
+    level: Optional[int]
+    nextLevelExp: int
+    avatar_url: Optional[str]
+    bio: Optional[str]
+    stats: MypageStatsResponse
+
+class MypageKnowledgeResponse(BaseModel):
+    id: int
+    title: Optional[str]
+    category: Optional[str]
+    icon: str
+    iconBgColor: str
+    author: Optional[str]
+    views: Optional[int]
+    createdAt: str
+    content: Optional[str]
+
+class MypageResponse(BaseModel):
+    user: MypageUserResponse
+    knowledgeList: List[MypageKnowledgeResponse]
+
+# 一括取得できるユーザー数の上限
+MAX_BATCH_USERS = 200
+
+@router.get("/batch", response_model=UserCardListResponse)
+async def get_user_cards(
+    ids: str,
+    db: AsyncSession = Depends(get_read_db)
+):
+    # カンマ区切りのIDを解析（重複は除き、指定順を保持）
+    try:
+        user_ids = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids はカンマ区切りの整数で指定してください"
+        )
+    if len(user_ids) > MAX_BATCH_USERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"ids は{MAX_BATCH_USERS}件まで指定できます"
+        )
+    if not user_ids:
+        return {"items": []}
+
+    # 必要なカラムのみを1クエリで取得（アバター画像は読み込まない）
+    rows = (await db.execute(
+        select(User.id, User.username, User.department, User.level, User.has_avatar)
+        .where(User.id.in_(user_ids))
+    )).all()
+    cards = {
+        row.id: {
+            "id": row.id,
+            "name": row.username,
+            "department": row.department,
+            "level": row.level,
+            "avatarUrl": User.avatar_url_for(row.id, row.has_avatar)
+        } for row in rows
+    }
+
+    return {"items": [cards[user_id] for user_id in user_ids if user_id in cards]}
+
+@router.get("/{user_id}", response_model=UserProfileResponse)
 async def get_user_profile(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    # ユーザー情報を取得
-    user = db.query(User).filter(User.id == user_id).first()
+    # ユーザー・プロフィール・ナレッジ数・コメント数を1クエリで取得する（アバター画像は読み込まない）
+    # プロフィール・統計の行がない場合は空欄・0件として返す（作成は書き込み時に行う）
+    user = (await db.execute(
+        select(
+            User.id, User.username, User.department, User.level, User.has_avatar,
+            Profile.bio,
+            func.coalesce(UserStats.knowledge_count, 0).label("knowledge_count"),
+            func.coalesce(UserStats.comment_count, 0).label("comment_count")
+        )
+        .outerjoin(Profile, Profile.user_id == User.id)
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .where(User.id == user_id)
+    )).first()
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="ユーザーが見つかりません"
         )
     
-    # プロフィール情報を取得
-    profile = db.query(Profile).filter(Profile.user_id == user.id).first()
-    if not profile:
-        profile = Profile(user_id=user.id)
-        db.add(profile)
-        db.commit()
-        db.refresh(profile)
-    
-    # ナレッジ数を取得
-    knowledge_count = db.query(Knowledge).filter(
-        Knowledge.author_id == user.id
-    ).count()
-    
-    # コメント数を取得
-    comment_count = db.query(Comment).filter(
-        Comment.author_id == user.id
-    ).count()
-    
     return {
         "id": user.id,
         "name": user.username,
         "department": user.department,
         "level": user.level,
-        "hasAvatar": user.avatar_data is not None,
-        "bio": profile.bio,
+        "hasAvatar": user.has_avatar,
+        "bio": user.bio,
         "stats": {
-            "knowledgeCount": knowledge_count,
-            "commentCount": comment_count
+            "knowledgeCount": user.knowledge_count,
+            "commentCount": user.comment_count
         }
     }
 
-@router.get("/me")
+@router.get("/me", response_model=MyProfileResponse)
 async def read_profile(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # プロフィール情報を取得
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-    if not profile:
-        profile = Profile(user_id=current_user.id)
-        db.add(profile)
-        db.commit()
-        db.refresh(profile)
-    
-    # ナレッジ数を取得
-    knowledge_count = db.query(Knowledge).filter(
-        Knowledge.author_id == current_user.id
-    ).count()
-    
-    # コメント数を取得
-    comment_count = db.query(Comment).filter(
-        Comment.author_id == current_user.id
-    ).count()
+    # プロフィール情報を取得（未作成の場合は空欄。作成は PUT /profile/me で行う）
+    # 自分の更新をすぐに反映するため、読み取りのみだがプライマリを使う
+    profile = await db.scalar(select(Profile).where(Profile.user_id == current_user.id))
     
-    # 最近の活動を取得（最新5件のナレッジとコメント）
-    recent_knowledge = db.query(Knowledge).filter(
-        Knowledge.author_id == current_user.id
-    ).order_by(Knowledge.created_at.desc()).limit(5).all()
-    
-    recent_comments = db.query(Comment).filter(
-        Comment.author_id == current_user.id
-    ).order_by(Comment.created_at.desc()).limit(5).all()
+    # ナレッジ数・コメント数・最近の活動（最新5件のナレッジとコメント）を取得
+    stats = await get_user_stats(db, current_user.id)
     
     return {
         "id": current_user.id,
         "name": current_user.username,
         "email": current_user.email,
         "department": current_user.department,
-        "hasAvatar": current_user.avatar_data is not None,
+        "hasAvatar": current_user.has_avatar,
         "experiencePoints": current_user.experience_points,
         "level": current_user.level,
-        "bio": profile.bio,
-        "phoneNumber": profile.phone_number,
+        "bio": profile.bio if profile else None,
+        "phoneNumber": profile.phone_number if profile else None,
         "stats": {
-            "knowledgeCount": knowledge_count,
-            "commentCount": comment_count
+            "knowledgeCount": stats.knowledge_count,
+            "commentCount": stats.comment_count
         },
         "recentActivity": {
-            "knowledge": [
-                {
-                    "id": k.id,
-                    "title": k.title,
-                    "createdAt": k.created_at.strftime("%Y年%m月%d日")
-                } for k in recent_knowledge
-            ],
-            "comments": [
-                {
-                    "id": c.id,
-                    "content": c.content,
-                    "knowledgeId": c.knowledge_id,
-                    "createdAt": c.created_at.strftime("%Y年%m月%d日")
-                } for c in recent_comments
-            ]
+            "knowledge": stats.recent_knowledge or [],
+            "comments": stats.recent_comments or []
         }
     }
 
 @router.put("/me")
 async def update_profile(
     profile_data: UserProfileUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if profile_data.username is not None:
         # ユーザー名の重複チェック
-        existing_user = db.query(User).filter(
-            User.username == profile_data.username,
-            User.id != current_user.id
-        ).first()
+        existing_user = (await db.execute(
+            select(User.id).where(
+                User.username == profile_data.username,
+                User.id != current_user.id
+            )
+        )).first()
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -151,13 +242,14 @@ async def update_profile(
         current_user.username = profile_data.username
     
     if profile_data.department is not None:
+        await move_user_department(db, current_user, current_user.department, profile_data.department)
         current_user.department = profile_data.department
     
     if profile_data.password is not None:
         current_user.password_hash = get_password_hash(profile_data.password)
     
     # プロフィール情報の更新
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    profile = await db.scalar(select(Profile).where(Profile.user_id == current_user.id))
     if not profile:
         profile = Profile(user_id=current_user.id)
         db.add(profile)
@@ -169,16 +261,18 @@ async def update_profile(
         profile.phone_number = profile_data.phoneNumber
     
     current_user.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(current_user)
-    db.refresh(profile)
+    # 一覧に表示する著者情報（名前・部署）が変わるため一覧のバージョンを進める
+    await db.commit()
+    await bump_version(KNOWLEDGE_LIST)
+    await db.refresh(current_user)
+    await db.refresh(profile)
     
     return {
         "id": current_user.id,
         "name": current_user.username,
         "email": current_user.email,
         "department": current_user.department,
-        "hasAvatar": current_user.avatar_data is not None,
+        "hasAvatar": current_user.has_avatar,
         "experiencePoints": current_user.experience_points,
         "level": current_user.level,
         "bio": profile.bio,
@@ -188,7 +282,7 @@ async def update_profile(
 @router.post("/me/avatar")
 async def update_avatar(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     # ファイルタイプの検証
@@ -201,13 +295,15 @@ async def update_avatar(
     try:
         # ファイルの内容を読み込む
         file_content = await file.read()
+        record_upload("avatar", len(file_content))
         
         # ユーザーのアバター情報を更新
         current_user.avatar_data = file_content
         current_user.avatar_content_type = file.content_type
         current_user.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await bump_version(KNOWLEDGE_LIST)
+        await db.refresh(current_user)
         
         return {
             "message": "Avatar updated successfully",
@@ -222,7 +318,7 @@ async def update_avatar(
 
 @router.get("/me/avatar")
 async def get_avatar(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     if not current_user.avatar_data:
@@ -236,40 +332,30 @@ async def get_avatar(
         media_type=current_user.avatar_content_type
     )
 
-@router.get("/mypage")
+@router.get("/mypage", response_model=MypageResponse)
 async def get_mypage(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # プロフィール情報を取得
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-    if not profile:
-        profile = Profile(user_id=current_user.id)
-        db.add(profile)
-        db.commit()
-        db.refresh(profile)
+    # プロフィール情報を取得（未作成の場合は空欄。作成は PUT /profile/me で行う）
+    # 自分の更新をすぐに反映するため、読み取りのみだがプライマリを使う
+    profile = await db.scalar(select(Profile).where(Profile.user_id == current_user.id))
 
-    # 登録ナレッジ数を取得
-    knowledge_count = db.query(Knowledge).filter(
-        Knowledge.author_id == current_user.id
-    ).count()
-
-    # 累積PV数を取得
-    total_views = db.query(func.sum(Knowledge.views)).filter(
-        Knowledge.author_id == current_user.id
-    ).scalar() or 0
+    # 登録ナレッジ数・累積PV数を取得
+    stats = await get_user_stats(db, current_user.id)
 
     # 次のレベルまでに必要な経験値を計算
-    next_level_exp = (current_user.level + 1) * 100 - current_user.experience_points
+    next_level_exp = experience_for_level(current_user.level + 1) - current_user.experience_points
 
-    # 最近のナレッジを取得（最新5件）
-    recent_knowledge = (
-        db.query(Knowledge)
-        .filter(Knowledge.author_id == current_user.id)
-        .order_by(Knowledge.created_at.desc())
-        .limit(5)
-        .all()
-    )
+    # 最近のナレッジを取得（最新5件、統計に保持しているIDで主キー検索）
+    recent_ids = [k["id"] for k in stats.recent_knowledge or []]
+    recent_knowledge = []
+    if recent_ids:
+        recent_knowledge = (await db.execute(
+            select(Knowledge)
+            .where(Knowledge.id.in_(recent_ids))
+            .order_by(Knowledge.created_at.desc())
+        )).scalars().all()
 
     # ナレッジリストの作成
     knowledge_list = []
@@ -285,7 +371,7 @@ async def get_mypage(
             "iconBgColor": bg_color,
             "author": current_user.username,
             "views": k.views,
-            "createdAt": k.created_at.strftime("%Y年%m月%d日"),
+            "createdAt": format_date(k.created_at),
             "content": k.description  # または整形されたコンテンツ
         })
 
@@ -297,10 +383,10 @@ async def get_mypage(
             "level": current_user.level,
             "nextLevelExp": next_level_exp,
             "avatar_url": current_user.avatar_url,
-            "bio": profile.bio,
+            "bio": profile.bio if profile else None,
             "stats": {
-                "knowledgeCount": knowledge_count,
-                "totalPageViews": total_views
+                "knowledgeCount": stats.knowledge_count,
+                "totalPageViews": stats.total_views
             }
         },
         "knowledgeList": knowledge_list
@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime, timedelta
 from pydantic import BaseModel
 
-from models.database import get_db
+from models.database import get_db, get_read_db
 from models.user import User
-from models.user_activity import UserActivity
+from models.user_activity_daily import UserActivityDaily
+from models.department_stats import DepartmentStats
 from core.security import get_current_user
 
 router = APIRouter(prefix="/ranking", tags=["ranking"])
@@ -19,6 +21,28 @@ class RankingResponse(BaseModel):
     level: int
     avatar_url: str | None
 
+class DepartmentRankingResponse(BaseModel):
+    position: str
+    department: str
+    memberCount: int
+    totalPoints: int
+    averageLevel: float
+    knowledgeCount: int
+
+# アクティビティランキングの集計期間（日数）。None は全期間
+ACTIVITY_PERIOD_DAYS = {
+    "week": 7,
+    "month": 30,
+    "all": None,
+}
+
+# 部署ランキングの並び替え項目
+DEPARTMENT_SORT_COLUMNS = {
+    "points": DepartmentStats.total_points,
+    "level": DepartmentStats.total_level * 1.0 / func.nullif(DepartmentStats.user_count, 0),
+    "knowledge": DepartmentStats.knowledge_count,
+}
+
 def get_position_suffix(position: int) -> str:
     if position % 10 == 1 and position != 11:
         return "st"
@@ -31,15 +55,18 @@ def get_position_suffix(position: int) -> str:
 @router.get("/level", response_model=List[RankingResponse])
 async def get_level_ranking(
     limit: int = 5,
-    db: Session = Depends(get_db)
+    department: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
     # レベルに基づくランキング
-    users = (
-        db.query(User)
+    query = select(User)
+    if department:
+        query = query.where(User.department == department)
+    users = (await db.execute(
+        query
         .order_by(User.level.desc(), User.experience_points.desc())
         .limit(limit)
-        .all()
-    )
+    )).scalars().all()
     
     ranking_list = []
     for i, user in enumerate(users, 1):
@@ -58,15 +85,18 @@ async def get_level_ranking(
 @router.get("/points", response_model=List[RankingResponse])
 async def get_points_ranking(
     limit: int = 5,
-    db: Session = Depends(get_db)
+    department: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
     # ポイントに基づくランキング
-    users = (
-        db.query(User)
+    query = select(User)
+    if department:
+        query = query.where(User.department == department)
+    users = (await db.execute(
+        query
         .order_by(User.points.desc())
         .limit(limit)
-        .all()
-    )
+    )).scalars().all()
     
     ranking_list = []
     for i, user in enumerate(users, 1):
@@ -85,20 +115,46 @@ async def get_points_ranking(
 @router.get("/activity", response_model=List[RankingResponse])
 async def get_activity_ranking(
     limit: int = 5,
-    db: Session = Depends(get_db)
+    period: str = "all",
+    department: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    # アクティビティ数に基づくランキング
-    ranking = (
-        db.query(
-            User,
-            func.count(UserActivity.id).label('activity_count')
+    if period not in ACTIVITY_PERIOD_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="period は week, month, all のいずれかを指定してください"
         )
-        .join(UserActivity)
-        .group_by(User.id)
-        .order_by(func.count(UserActivity.id).desc())
+
+    # 日次集計テーブルからアクティビティ数を集計
+    activity_count = func.sum(UserActivityDaily.activity_count)
+    counts = select(
+        UserActivityDaily.user_id.label('user_id'),
+        activity_count.label('activity_count')
+    )
+    days = ACTIVITY_PERIOD_DAYS[period]
+    if days is not None:
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        counts = counts.where(UserActivityDaily.day >= since)
+    if department:
+        counts = (
+            counts
+            .join(User, User.id == UserActivityDaily.user_id)
+            .where(User.department == department)
+        )
+    counts = (
+        counts
+        .group_by(UserActivityDaily.user_id)
+        .order_by(activity_count.desc())
         .limit(limit)
-        .all()
+        .subquery()
     )
+
+    # アクティビティ数に基づくランキング
+    ranking = (await db.execute(
+        select(User, counts.c.activity_count)
+        .join(counts, counts.c.user_id == User.id)
+        .order_by(counts.c.activity_count.desc())
+    )).all()
     
     ranking_list = []
     for i, (user, _) in enumerate(ranking, 1):
@@ -114,45 +170,132 @@ async def get_activity_ranking(
     
     return ranking_list
 
+@router.get("/departments", response_model=List[DepartmentRankingResponse])
+async def get_department_ranking(
+    limit: int = 10,
+    sort_by: str = "points",
+    db: AsyncSession = Depends(get_read_db)
+):
+    if sort_by not in DEPARTMENT_SORT_COLUMNS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="sort_by は points, level, knowledge のいずれかを指定してください"
+        )
+
+    # 部署集計テーブルから取得（所属ユーザーがいない部署は除外）
+    departments = (await db.execute(
+        select(DepartmentStats)
+        .where(DepartmentStats.user_count > 0)
+        .order_by(DEPARTMENT_SORT_COLUMNS[sort_by].desc(), DepartmentStats.department)
+        .limit(limit)
+    )).scalars().all()
+
+    ranking_list = []
+    for i, stats in enumerate(departments, 1):
+        position = f"{i}{get_position_suffix(i)}"
+        ranking_list.append({
+            "position": position,
+            "department": stats.department,
+            "memberCount": stats.user_count,
+            "totalPoints": stats.total_points,
+            "averageLevel": round(stats.total_level / stats.user_count, 1),
+            "knowledgeCount": stats.knowledge_count
+        })
+
+    return ranking_list
+
 @router.get("/me")
 async def get_my_rank(
-    db: Session = Depends(get_db),
+    around: int = 0,
+    around_by: str = "level",
+    department: Optional[str] = None,
+    # 自分の行を必ず含める必要があるため、レプリカではなくプライマリから読む
+    # （レプリカの遅延で、登録直後のユーザーが見つからないことがある）
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # レベルランキングでの自分の順位
-    level_rank = (
-        db.query(func.count(User.id))
-        .filter(
-            (User.level > current_user.level) |
-            ((User.level == current_user.level) & (User.experience_points > current_user.experience_points))
+    if around_by not in ("level", "points", "activity"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="around_by は level, points, activity のいずれかを指定してください"
         )
-        .scalar() + 1
+    around = max(0, min(around, 50))
+
+    # ユーザーごとのアクティビティ数（日次集計から）
+    activity = (
+        select(
+            UserActivityDaily.user_id.label('user_id'),
+            func.sum(UserActivityDaily.activity_count).label('activity_count')
+        )
+        .group_by(UserActivityDaily.user_id)
+        .subquery()
     )
-    
-    # ポイントランキングでの自分の順位
-    points_rank = (
-        db.query(func.count(User.id))
-        .filter(User.points > current_user.points)
-        .scalar() + 1
+    activity_count = func.coalesce(activity.c.activity_count, 0)
+
+    # 各ランキングの順位をウィンドウ関数で一度に計算
+    level_order = (User.level.desc(), User.experience_points.desc())
+    ranked = (
+        select(
+            User.id.label('id'),
+            User.username.label('name'),
+            User.department.label('department'),
+            User.level.label('level'),
+            User.has_avatar.label('has_avatar'),
+            func.rank().over(order_by=level_order).label('level_rank'),
+            func.rank().over(order_by=User.points.desc()).label('points_rank'),
+            func.rank().over(order_by=activity_count.desc()).label('activity_rank'),
+            func.row_number().over(order_by=level_order + (User.id,)).label('level_row'),
+            func.row_number().over(order_by=(User.points.desc(), User.id)).label('points_row'),
+            func.row_number().over(order_by=(activity_count.desc(), User.id)).label('activity_row'),
+        )
+        .outerjoin(activity, activity.c.user_id == User.id)
     )
-    
-    # アクティビティランキングでの自分の順位
-    my_activity_count = (
-        db.query(func.count(UserActivity.id))
-        .filter(UserActivity.user_id == current_user.id)
-        .scalar() or 0
+    if department:
+        # 他のランキングと同じく、部署内での順位にする
+        ranked = ranked.where(User.department == department)
+    ranked = ranked.cte('ranked')
+
+    # around 指定時は自分の前後 N 人も同じクエリで取得する
+    row_column = ranked.c[f"{around_by}_row"]
+    me_row = (
+        select(row_column.label('my_row'))
+        .where(ranked.c.id == current_user.id)
+        .subquery()
     )
-    
-    activity_rank = (
-        db.query(func.count())
-        .from_self(
-            db.query(User.id, func.count(UserActivity.id).label('count'))
-            .join(UserActivity)
-            .group_by(User.id)
-            .having(func.count(UserActivity.id) > my_activity_count)
+    rows = (await db.execute(
+        select(ranked)
+        .join(
+            me_row,
+            row_column.between(me_row.c.my_row - around, me_row.c.my_row + around)
         )
-        .scalar() or 0
-    ) + 1
+        .order_by(row_column)
+    )).all()
+
+    me = next((row for row in rows if row.id == current_user.id), None)
+    if me is None:
+        # 認証後にユーザーが削除された場合・指定した部署に所属していない場合など
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="ユーザーが見つかりません"
+        )
+    level_rank = me.level_rank
+    points_rank = me.points_rank
+    activity_rank = me.activity_rank
+
+    around_list = []
+    if around > 0:
+        for row in rows:
+            rank = row._mapping[f"{around_by}_rank"]
+            around_list.append({
+                "id": row.id,
+                "position": f"{rank}{get_position_suffix(rank)}",
+                "rank": rank,
+                "name": row.name,
+                "department": row.department or "所属なし",
+                "level": row.level,
+                "avatar_url": User.avatar_url_for(row.id, row.has_avatar),
+                "is_me": row.id == current_user.id
+            })
     
     return {
         "level_rank": {
@@ -166,5 +309,6 @@ async def get_my_rank(
         "activity_rank": {
             "position": f"{activity_rank}{get_position_suffix(activity_rank)}",
             "rank": activity_rank
-        }
-    } 
\ No newline at end of file
+        },
+        "around": around_list
+    }
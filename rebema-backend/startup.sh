@@ -108,14 +108,10 @@ export PYTHONPATH="${PYTHONPATH:+${PYTHONPATH}:}$APP_DIR:$(dirname $APP_DIR)"
 echo "PYTHONPATH: $PYTHONPATH"
 
 echo "=== Testing Application Import ==="
+# main は全ルーターを読み込むため、main のインポートだけを確認する
 echo "Testing main module import..."
 run_with_output python3 -c "import main; print('Main module can be imported')"
 
-echo "Testing routers import..."
-run_with_output python3 -c "from routers import auth; print('Auth router can be imported')"
-run_with_output python3 -c "from routers import knowledge; print('Knowledge router can be imported')"
-run_with_output python3 -c "from routers import ranking; print('Ranking router can be imported')"
-
 echo "=== Testing Database Connection ==="
 echo "Running database connection test with timeout ${DB_CHECK_TIMEOUT}s..."
 
@@ -138,8 +134,10 @@ echo "- Workers: 4"
 echo "- Worker Class: uvicorn.workers.UvicornWorker"
 echo "- Timeout: 120s"
 echo "- Port: $PORT"
+echo "- Preload: ${GUNICORN_PRELOAD:-false}"
 
 exec gunicorn main:app \
+    --config=gunicorn.conf.py \
     --bind=0.0.0.0:$PORT \
     --workers=4 \
     --worker-class=uvicorn.workers.UvicornWorker \
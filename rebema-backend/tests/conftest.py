@@ -0,0 +1,69 @@
+"""
+テスト共通の設定
+
+models.database はインポート時にエンジンを作成するため、アプリのモジュールを読み込む前に
+テスト用の SQLite データベース・実行時ディレクトリを環境変数で指定する。
+"""
+import os
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="rebema-test-")
+TEST_DATABASE = os.path.join(_TMP_DIR, "test.db")
+
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{TEST_DATABASE}"
+os.environ.pop("ASYNC_REPLICA_DATABASE_URL", None)
+os.environ["RUNTIME_DIR"] = os.path.join(_TMP_DIR, "runtime")
+os.environ["GAMIFICATION_CONSUMER_ENABLED"] = "false"
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def db():
+    """テストごとに作り直したテーブルへの同期セッション"""
+    from models.database import Base, SessionLocal, engine
+    import main  # noqa: F401  全モデルを登録する
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+@pytest.fixture
+def login(client):
+    """指定したユーザーでログインした状態にする（core.security.get_current_user を差し替える）"""
+    from fastapi import Depends
+    from core.security import get_current_user
+    from main import app
+    from models.database import get_db
+    from models.user import User
+
+    def _login(user_id: int):
+        async def current_user(db=Depends(get_db)):
+            return await db.get(User, user_id)
+        app.dependency_overrides[get_current_user] = current_user
+    return _login
+
+@pytest.fixture
+def subprocess_env():
+    """アプリを別プロセスで起動する際の環境変数を作る"""
+    def _env(**overrides) -> dict:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get("PYTHONPATH")]))
+        env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        env.update(overrides)
+        return env
+    return _env
@@ -0,0 +1,46 @@
+"""
+ベンチマークのベースライン（benchmarks/baseline.json）との比較
+
+Note:
+    - 小さい合成データで計測するため、レイテンシは比較せず SQL件数のみ比較する
+      （SQL件数はデータ件数に依存しないため、ベースラインと同じ値になる）
+"""
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks.run import compare
+from tests.conftest import BACKEND_DIR
+
+def _result(queries: int) -> dict:
+    return {"p50_ms": 1.0, "p95_ms": 1.0, "mean_ms": 1.0, "queries": queries, "failures": 0, "iterations": 5}
+
+def test_compare_detects_query_count_regression():
+    baseline = {"dataset": {"users": 10}, "benchmarks": {"knowledge.list": _result(5)}}
+    current = {"dataset": {"users": 1}, "benchmarks": {"knowledge.list": _result(6)}}
+
+    assert compare(baseline, current, latency_tolerance=0.5, check_latency=False) == ["knowledge.list: SQL件数 5 → 6"]
+
+@pytest.mark.benchmark
+def test_query_counts_match_baseline(tmp_path, subprocess_env):
+    env = subprocess_env(RUNTIME_DIR=str(tmp_path / "runtime"))
+    # 接続先は --database で指定する（ASYNC_DATABASE_URL が優先されるため外す）
+    env.pop("ASYNC_DATABASE_URL")
+
+    result = subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.run",
+            "--database", str(tmp_path / "bench.db"),
+            "--seed", "--scale", "0.001",
+            "--iterations", "5", "--max-seconds", "2",
+            "--no-latency-check",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=600
+    )
+
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,82 @@
+"""
+コメント一覧のカーソル（before）によるページング
+"""
+from datetime import datetime
+
+import pytest
+
+from models.comment import Comment
+from models.knowledge import Knowledge
+from models.user import User
+
+@pytest.fixture
+def author(db):
+    user = User(email="author@example.com", username="author", department="営業部")
+    db.add(user)
+    db.commit()
+    return user
+
+def _knowledge(db, author):
+    item = Knowledge(title="提案のコツ", method="訪問", target="新規", description="説明", category="訪問", author_id=author.id, views=0)
+    db.add(item)
+    db.commit()
+    return item
+
+@pytest.fixture
+def knowledge(db, author):
+    return _knowledge(db, author)
+
+def _comments(db, knowledge, author, created_at):
+    comments = [
+        Comment(knowledge_id=knowledge.id, author_id=author.id, content=f"コメント{i}", created_at=at)
+        for i, at in enumerate(created_at)
+    ]
+    db.add_all(comments)
+    db.commit()
+    return [comment.id for comment in comments]
+
+def test_cursor_paging_with_tied_created_at(db, client, knowledge, author):
+    # 同じ日時のコメントがページの境界をまたいでも、重複・欠落しない
+    tied = datetime(2024, 1, 2, 9, 0)
+    ids = _comments(db, knowledge, author, [datetime(2024, 1, 1, 9, 0)] + [tied] * 5 + [datetime(2024, 1, 3, 9, 0)])
+    expected = [ids[6]] + sorted(ids[1:6], reverse=True) + [ids[0]]
+
+    seen = []
+    remaining = []
+    before = None
+    while True:
+        params = {"limit": 3}
+        if before is not None:
+            params["before"] = before
+        response = client.get(f"/knowledge/{knowledge.id}/comments", params=params)
+        assert response.status_code == 200
+        body = response.json()
+        # total はカーソルによらずコメントの総件数
+        assert body["total"] == 7
+        remaining.append(body["remaining"])
+        if not body["items"]:
+            break
+        seen.extend(item["id"] for item in body["items"])
+        before = body["items"][-1]["id"]
+
+    assert seen == expected
+    assert remaining == [7, 4, 1, 0]
+
+def test_unknown_cursor_is_rejected(db, client, knowledge, author):
+    _comments(db, knowledge, author, [datetime(2024, 1, 1, 9, 0)])
+
+    response = client.get(f"/knowledge/{knowledge.id}/comments", params={"before": 9999})
+
+    assert response.status_code == 400
+
+def test_cursor_of_another_knowledge_is_rejected(db, client, knowledge, author):
+    _comments(db, knowledge, author, [datetime(2024, 1, 1, 9, 0)])
+    other = _knowledge(db, author)
+    [foreign] = _comments(db, other, author, [datetime(2024, 1, 2, 9, 0)])
+
+    response = client.get(f"/knowledge/{knowledge.id}/comments", params={"before": foreign})
+
+    assert response.status_code == 400
+
+def test_cursor_on_missing_knowledge_is_not_found(client):
+    assert client.get("/knowledge/9999/comments", params={"before": 1}).status_code == 404
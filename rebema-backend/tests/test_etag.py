@@ -0,0 +1,87 @@
+"""
+ナレッジ一覧・詳細の ETag（If-None-Match → 304）
+"""
+import re
+
+import pytest
+from sqlalchemy import event
+
+from models.database import async_engine
+from models.knowledge import Knowledge
+from models.user import User
+
+def _loads_avatar(sql: str) -> bool:
+    # has_avatar（avatar_data IS NOT NULL）以外でアバター画像の列を選択しているか
+    return re.search(r"\.avatar_data(?! IS NOT NULL)", sql) is not None
+
+@pytest.fixture
+def knowledge(db, client, login):
+    user = User(email="author@example.com", username="author", department="営業部")
+    db.add(user)
+    db.commit()
+    item = Knowledge(title="提案のコツ", method="訪問", target="新規", description="説明", category="訪問", author_id=user.id, views=0)
+    db.add(item)
+    db.commit()
+    login(user.id)
+    return item
+
+@pytest.fixture
+def statements():
+    executed = []
+    def on_execute(connection, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    yield executed
+    event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+
+def test_list_returns_304_until_a_comment_is_added(client, knowledge):
+    first = client.get("/knowledge/")
+    etag = first.headers["ETag"]
+
+    cached = client.get("/knowledge/", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+
+    assert client.post(f"/knowledge/{knowledge.id}/comments", params={"content": "参考になりました"}).status_code == 200
+
+    changed = client.get("/knowledge/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["items"][0]["commentCount"] == 1
+
+def test_list_etag_depends_on_query(client, knowledge):
+    etag = client.get("/knowledge/").headers["ETag"]
+
+    assert client.get("/knowledge/?sort_by=views", headers={"If-None-Match": etag}).status_code == 200
+
+def test_detail_returns_304_without_loading_the_row(db, client, knowledge, statements):
+    etag = client.get(f"/knowledge/{knowledge.id}").headers["ETag"]
+    statements.clear()
+
+    cached = client.get(f"/knowledge/{knowledge.id}", headers={"If-None-Match": etag})
+
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    # 本文・著者のアバターは読み込まない
+    selects = [sql for sql in statements if sql.startswith("SELECT") and "FROM knowledges" in sql]
+    assert selects
+    assert not any("knowledges.description" in sql or _loads_avatar(sql) for sql in selects)
+    # 304 の場合も閲覧として数える
+    db.expire_all()
+    assert db.get(Knowledge, knowledge.id).views == 2
+
+def test_detail_does_not_load_avatar(client, knowledge, statements):
+    assert client.get(f"/knowledge/{knowledge.id}").status_code == 200
+
+    selects = [sql for sql in statements if sql.startswith("SELECT") and "FROM knowledges" in sql]
+    assert selects
+    assert not any(_loads_avatar(sql) for sql in selects)
+
+def test_detail_etag_changes_with_comments(client, knowledge):
+    etag = client.get(f"/knowledge/{knowledge.id}").headers["ETag"]
+    client.post(f"/knowledge/{knowledge.id}/comments", params={"content": "参考になりました"})
+
+    changed = client.get(f"/knowledge/{knowledge.id}", headers={"If-None-Match": etag})
+
+    assert changed.status_code == 200
+    assert changed.json()["stats"]["commentCount"] == 1
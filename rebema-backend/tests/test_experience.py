@@ -0,0 +1,76 @@
+"""
+累計経験値とレベルの変換（閉じた式）
+"""
+import importlib.util
+import os
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import literal, select, text
+
+from models.database import engine
+from models.user import User
+from tests.conftest import BACKEND_DIR
+from utils.experience import XP_PER_LEVEL, experience_for_level, level_expression, level_for_experience
+
+LEVELS = range(1, 201)
+
+def _boundaries():
+    # 各レベルの到達に必要な累計経験値と、その前後1
+    for level in LEVELS:
+        total = experience_for_level(level)
+        yield from (total - 1, total, total + 1)
+
+def test_level_for_experience_at_level_boundaries():
+    for level in LEVELS:
+        total = experience_for_level(level)
+        assert level_for_experience(total) == level
+        assert level_for_experience(total + level * XP_PER_LEVEL - 1) == level
+        if level > 1:
+            assert level_for_experience(total - 1) == level - 1
+
+def test_level_for_experience_clamps_negative_experience():
+    assert level_for_experience(-10) == 1
+
+def test_level_expression_matches_python(db):
+    totals = [total for total in _boundaries() if total >= 0]
+
+    with engine.connect() as connection:
+        levels = connection.execute(
+            select(*[level_expression(literal(total)) for total in totals])
+        ).one()
+
+    assert [int(level) for level in levels] == [level_for_experience(total) for total in totals]
+
+def _load_migration(name="a7e05f3c91d2_derive_level_from_experience_points"):
+    path = os.path.join(BACKEND_DIR, "alembic", "versions", f"{name}.py")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_migration_derives_experience_from_level_and_current_xp(db):
+    rows = [(1, 0), (2, 15), (10, 99), (37, 0)]
+    db.add_all([
+        User(email=f"user{i}@example.com", username=f"user{i}", level=level, current_xp=current_xp, experience_points=0)
+        for i, (level, current_xp) in enumerate(rows)
+    ])
+    db.add(User(email="null@example.com", username="null", experience_points=0))
+    db.commit()
+    db.close()
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE users SET level = NULL, current_xp = NULL WHERE username = 'null'"))
+
+    with engine.begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            _load_migration().upgrade()
+        migrated = connection.execute(text(
+            "SELECT level, current_xp, experience_points FROM users WHERE username != 'null' ORDER BY id"
+        )).all()
+        missing = connection.execute(text("SELECT experience_points FROM users WHERE username = 'null'")).scalar()
+
+    for level, current_xp, total in migrated:
+        assert total == 5 * level * (level - 1) + current_xp
+        # 移行後の累計経験値から求めたレベルが元のレベルと一致する
+        assert level_for_experience(total) == level
+    assert missing == 0
@@ -0,0 +1,144 @@
+"""
+経験値付与イベントの処理（utils.gamification）
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import DataError, OperationalError
+
+import utils.gamification as gamification
+from core.config import settings
+from models.database import AsyncSessionLocal, async_engine
+from models.department_stats import DepartmentStats
+from models.gamification_dead_letter import GamificationDeadLetter
+from models.gamification_event import GamificationEvent
+from models.user import User
+from utils.experience import apply_experience
+
+@pytest.fixture
+def users(db):
+    users = [User(email=f"user{i}@example.com", username=f"user{i}", department="営業部") for i in range(2)]
+    db.add_all(users)
+    db.commit()
+    return users
+
+def _fail_on(monkeypatch, action, error):
+    """action のイベントを含むと、アクティビティの記録が error で失敗するようにする"""
+    record_activities = gamification.record_activities
+
+    async def record(db, activities):
+        if any(activity["action"] == action for activity in activities):
+            raise error
+        await record_activities(db, activities)
+    monkeypatch.setattr(gamification, "record_activities", record)
+
+@pytest.fixture
+def poison(monkeypatch):
+    """action が "poison" のイベントを含むと、アクティビティの記録が必ず失敗する"""
+    _fail_on(monkeypatch, "poison", DataError("INSERT INTO user_activities", {}, Exception("data too long")))
+
+def _process() -> int:
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await gamification.process_pending_events(db, settings.GAMIFICATION_BATCH_SIZE)
+    return asyncio.run(run())
+
+def _add_events(db, *events):
+    db.add_all([GamificationEvent(user_id=user.id, action=action, xp_amount=10) for user, action in events])
+    db.commit()
+
+def test_failing_event_does_not_block_others(db, users, poison):
+    alice, bob = users
+    _add_events(db, (alice, "create_knowledge"), (bob, "poison"), (alice, "comment"))
+
+    assert _process() == 3
+
+    db.expire_all()
+    assert db.get(User, alice.id).experience_points == 20
+    assert db.get(User, bob.id).experience_points == 0
+    remaining = db.query(GamificationEvent).all()
+    assert [(event.action, event.attempts) for event in remaining] == [("poison", 1)]
+
+def test_event_is_dead_lettered_after_max_attempts(db, users, poison):
+    alice, bob = users
+    _add_events(db, (bob, "poison"))
+
+    for _ in range(settings.GAMIFICATION_MAX_ATTEMPTS):
+        assert _process() == 1
+    # 上限に達したイベントは gamification_dead_letters に移す
+    assert _process() == 0
+    assert db.query(GamificationEvent).count() == 0
+    dead_letter = db.query(GamificationDeadLetter).one()
+    assert (dead_letter.user_id, dead_letter.action, dead_letter.attempts) == (bob.id, "poison", settings.GAMIFICATION_MAX_ATTEMPTS)
+    assert "data too long" in dead_letter.error
+
+    _add_events(db, (alice, "comment"))
+    assert _process() == 1
+    db.expire_all()
+    assert db.get(User, alice.id).experience_points == 10
+
+def test_transient_error_is_retried_without_counting(db, users, monkeypatch):
+    alice, _ = users
+    _add_events(db, (alice, "comment"))
+    _fail_on(monkeypatch, "comment", OperationalError("UPDATE users", {}, Exception("Deadlock found when trying to get lock")))
+
+    for _ in range(settings.GAMIFICATION_MAX_ATTEMPTS + 1):
+        assert _process() == 0
+
+    assert db.query(GamificationEvent).one().attempts == 0
+    monkeypatch.undo()
+    assert _process() == 1
+    db.expire_all()
+    assert db.get(User, alice.id).experience_points == 10
+
+def test_consumer_keeps_polling_after_unexpected_error(monkeypatch):
+    calls = []
+
+    async def main():
+        stop = asyncio.Event()
+
+        async def process_batch():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                raise RuntimeError("unexpected")
+            stop.set()
+            return 0
+        monkeypatch.setattr(gamification, "_process_batch", process_batch)
+        await asyncio.wait_for(gamification.run_consumer(stop), timeout=5)
+
+    monkeypatch.setattr(settings, "GAMIFICATION_POLL_INTERVAL", 0.01)
+    asyncio.run(main())
+
+    assert calls == [0, 1]
+
+def test_department_stats_are_locked_in_department_order(db):
+    users = [
+        User(email="x1@example.com", username="x1", department="B部"),
+        User(email="y1@example.com", username="y1", department="A部"),
+        User(email="x2@example.com", username="x2", department="B部"),
+    ]
+    db.add_all(users)
+    db.add_all([DepartmentStats(department=name, user_count=0) for name in ("A部", "B部")])
+    db.commit()
+
+    updated = []
+    def on_execute(connection, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE department_stats"):
+            updated.append(parameters)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    try:
+        async def run():
+            async with AsyncSessionLocal() as session:
+                await apply_experience(session, {user.id: 10 * (i + 1) for i, user in enumerate(users)})
+                await session.commit()
+        asyncio.run(run())
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+
+    # 部署ごとに合算し、部署名順に1回ずつ更新する
+    assert [params[-1] for params in updated[0]] == ["A部", "B部"]
+    db.expire_all()
+    stats = {row.department: (row.total_points, row.total_level) for row in db.query(DepartmentStats)}
+    # 10XP・20XP でレベル2（+1）、30XP でレベル3（+2）
+    assert stats == {"A部": (20, 1), "B部": (40, 3)}
@@ -0,0 +1,85 @@
+"""
+gunicorn.conf.py の設定（preload 時のメトリクスディレクトリの準備）
+"""
+import glob
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from tests.conftest import BACKEND_DIR
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise AssertionError(f"gunicorn が終了しました（終了コード {process.returncode}）")
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise AssertionError("gunicorn が起動しませんでした")
+
+def _boot(env):
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn", "main:app",
+            "--config=gunicorn.conf.py",
+            f"--bind=127.0.0.1:{port}",
+            "--workers=1",
+            "--worker-class=uvicorn.workers.UvicornWorker",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(f"http://127.0.0.1:{port}/healthz", process)
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+        return process, body
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+
+def _stop(process):
+    process.terminate()
+    process.wait(timeout=30)
+
+def test_preload_boots_with_fresh_runtime_dir(tmp_path, subprocess_env):
+    runtime_dir = tmp_path / "runtime"
+    env = subprocess_env(RUNTIME_DIR=str(runtime_dir), GUNICORN_PRELOAD="true")
+
+    process, body = _boot(env)
+    try:
+        assert "http_requests_in_progress" in body
+        # マスター（preload でアプリを読み込んだプロセス）のメトリクスファイルが残っている
+        assert glob.glob(str(runtime_dir / "prometheus" / f"gauge_livesum_{process.pid}.db"))
+    finally:
+        _stop(process)
+
+def test_stale_metrics_are_cleared_before_app_loads(tmp_path, subprocess_env):
+    metrics_dir = tmp_path / "runtime" / "prometheus"
+    metrics_dir.mkdir(parents=True)
+    stale = metrics_dir / "gauge_livesum_999999.db"
+    stale.write_bytes(b"stale")
+    env = subprocess_env(RUNTIME_DIR=str(tmp_path / "runtime"), GUNICORN_PRELOAD="true")
+
+    process, _ = _boot(env)
+    try:
+        assert not stale.exists()
+        assert os.path.exists(metrics_dir / f"gauge_livesum_{process.pid}.db")
+    finally:
+        _stop(process)
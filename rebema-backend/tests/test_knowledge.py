@@ -0,0 +1,123 @@
+"""
+ナレッジの作成・まとめて取得
+
+Note:
+    - POST /knowledge/ はファイルと同時に受け付けるため、エンドポイントの関数を直接呼び出す
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+import routers.knowledge
+from models.database import AsyncSessionLocal, async_engine
+from models.gamification_event import GamificationEvent
+from models.knowledge import Knowledge
+from models.user import User
+from models.user_stats import UserStats
+from routers.knowledge import MAX_BATCH_KNOWLEDGE, KnowledgeCreate, create_knowledge
+
+KNOWLEDGE = KnowledgeCreate(title="提案のコツ", method="訪問", target="新規", description="説明", category="訪問")
+
+@pytest.fixture
+def author(db):
+    user = User(email="author@example.com", username="author", department="営業部")
+    db.add(user)
+    db.commit()
+    return user
+
+@pytest.fixture
+def statements():
+    """実行したSQL（COMMIT を含む）"""
+    executed = []
+    def on_execute(connection, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+    def on_commit(connection):
+        executed.append("COMMIT")
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    event.listen(async_engine.sync_engine, "commit", on_commit)
+    yield executed
+    event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    event.remove(async_engine.sync_engine, "commit", on_commit)
+
+def _create(user_id: int) -> dict:
+    async def run():
+        async with AsyncSessionLocal() as session:
+            user = await session.get(User, user_id)
+            return await create_knowledge(KNOWLEDGE, None, db=session, current_user=user)
+    return asyncio.run(run())
+
+def test_create_knowledge_commits_once(db, author, statements):
+    result = _create(author.id)
+
+    # 一覧のバージョンはコミット後に別のトランザクションで進める
+    version_update = next(i for i, sql in enumerate(statements) if "cache_versions" in sql)
+    assert statements[:version_update].count("COMMIT") == 1
+    assert statements[version_update:].count("COMMIT") == 1
+    assert db.get(Knowledge, result["id"]).author_id == author.id
+    assert db.get(UserStats, author.id).knowledge_count == 1
+    assert db.query(GamificationEvent).filter_by(user_id=author.id, action="create_knowledge").count() == 1
+
+def test_create_knowledge_is_not_saved_when_stats_fail(db, author, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise OperationalError("UPDATE department_stats", {}, Exception("lock wait timeout"))
+    monkeypatch.setattr(routers.knowledge, "apply_department_delta", fail)
+
+    _create(author.id)
+
+    # 集計・イベントの登録に失敗した場合はナレッジも残らない
+    assert db.query(Knowledge).count() == 0
+    assert db.query(GamificationEvent).count() == 0
+
+def test_create_knowledge_locks_users_before_department_stats(db, author, statements):
+    _create(author.id)
+
+    # イベント処理（users → department_stats）と同じ順序でロックする
+    event_insert = next(i for i, sql in enumerate(statements) if sql.startswith("INSERT INTO gamification_events"))
+    department_update = next(i for i, sql in enumerate(statements) if "department_stats" in sql)
+    assert event_insert < department_update
+
+def _add_knowledge(db, author, *titles):
+    items = [
+        Knowledge(title=title, method="訪問", target="新規", description="説明", category="訪問", author_id=author.id, views=0)
+        for title in titles
+    ]
+    db.add_all(items)
+    db.commit()
+    return [item.id for item in items]
+
+def test_batch_preserves_requested_order(db, client, login, author):
+    first, second, third = _add_knowledge(db, author, "一", "二", "三")
+    login(author.id)
+
+    response = client.get("/knowledge/batch", params={"ids": f"{third},{first},{second}"})
+
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == [third, first, second]
+    assert response.json()["items"][0]["title"] == "三"
+
+def test_batch_skips_missing_and_duplicate_ids(db, client, login, author):
+    first, second = _add_knowledge(db, author, "一", "二")
+    login(author.id)
+
+    response = client.get("/knowledge/batch", params={"ids": f"{second},9999,{first},{second}, "})
+
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["items"]] == [second, first]
+
+def test_batch_does_not_count_views(db, client, login, author):
+    [knowledge_id] = _add_knowledge(db, author, "一")
+    login(author.id)
+
+    client.get("/knowledge/batch", params={"ids": str(knowledge_id)})
+
+    db.expire_all()
+    assert db.get(Knowledge, knowledge_id).views == 0
+
+def test_batch_rejects_invalid_ids(db, client, login, author):
+    login(author.id)
+
+    assert client.get("/knowledge/batch", params={"ids": "1,abc"}).status_code == 400
+    assert client.get("/knowledge/batch", params={"ids": ",".join(str(i) for i in range(1, MAX_BATCH_KNOWLEDGE + 2))}).status_code == 400
+    assert client.get("/knowledge/batch", params={"ids": ""}).json() == {"items": []}
@@ -0,0 +1,88 @@
+"""
+ナレッジの一括エクスポート（NDJSON / CSV）
+"""
+import asyncio
+import csv
+import io
+import json
+
+import pytest
+
+from models.comment import Comment
+from models.database import AsyncSessionLocal
+from models.knowledge import Knowledge
+from models.knowledge_collaborator import KnowledgeCollaborator
+from models.user import User
+from utils.knowledge_export import CSV_COLUMNS, export_batches
+
+# CSV でエスケープが必要な文字（カンマ・引用符・改行）を含む本文
+DESCRIPTION = '手順: 1, 2, 3\n"必ず"確認する'
+
+@pytest.fixture
+def knowledge(db, login):
+    author = User(email="author@example.com", username="author", department="営業部")
+    helper = User(email="helper@example.com", username="helper, jr.", department="開発部")
+    db.add_all([author, helper])
+    db.commit()
+    items = [
+        Knowledge(title="提案のコツ", method="訪問", target="新規", description=DESCRIPTION, category="訪問", author_id=author.id, views=3),
+        Knowledge(title="電話の準備", method="電話", target="既存", description="説明", category="電話", author_id=author.id, views=0),
+        Knowledge(title="メールの件名", method="メール", target="新規", description="説明", category="メール", author_id=helper.id, views=1),
+    ]
+    db.add_all(items)
+    db.commit()
+    db.add_all([
+        Comment(knowledge_id=items[0].id, author_id=helper.id, content="参考になりました"),
+        Comment(knowledge_id=items[0].id, author_id=author.id, content="ありがとうございます"),
+        KnowledgeCollaborator(knowledge_id=items[0].id, user_id=helper.id),
+    ])
+    db.commit()
+    login(author.id)
+    return items
+
+def test_ndjson_export(client, knowledge):
+    response = client.get("/knowledge/export", params={"format": "ndjson"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [item.id for item in knowledge]
+    first = rows[0]
+    assert first["description"] == DESCRIPTION
+    assert (first["commentCount"], first["fileCount"], first["views"]) == (2, 0, 3)
+    assert first["collaborators"] == [{"id": knowledge[2].author_id, "name": "helper, jr."}]
+    assert rows[1]["commentCount"] == 0 and rows[1]["collaborators"] == []
+
+def test_csv_export_escapes_fields(client, knowledge):
+    response = client.get("/knowledge/export", params={"format": "csv"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.startswith("\ufeff")
+    rows = list(csv.reader(io.StringIO(response.text.lstrip("\ufeff"))))
+    assert rows[0] == CSV_COLUMNS
+    assert len(rows) == 1 + len(knowledge)
+    first = dict(zip(CSV_COLUMNS, rows[1]))
+    # カンマ・引用符・改行を含む値も1列として読み戻せる
+    assert first["description"] == DESCRIPTION
+    assert first["collaborators"] == "helper, jr."
+    assert first["commentCount"] == "2"
+
+def test_export_filters_by_category(client, knowledge):
+    response = client.get("/knowledge/export", params={"categories": "電話, メール"})
+
+    assert [json.loads(line)["title"] for line in response.text.splitlines()] == ["電話の準備", "メールの件名"]
+
+def test_export_rejects_unknown_format(client, knowledge):
+    assert client.get("/knowledge/export", params={"format": "xlsx"}).status_code == 400
+
+def test_export_batches(knowledge):
+    async def collect():
+        return [batch async for batch in export_batches(AsyncSessionLocal, batch_size=2)]
+
+    batches = asyncio.run(collect())
+
+    assert [[row["id"] for row in batch] for batch in batches] == [
+        [knowledge[0].id, knowledge[1].id], [knowledge[2].id]
+    ]
+    assert batches[0][0]["commentCount"] == 2
@@ -0,0 +1,85 @@
+"""
+ナレッジの一括インポート（NDJSON）
+"""
+import asyncio
+import codecs
+import json
+
+import pytest
+
+from models.database import AsyncSessionLocal
+from models.gamification_event import GamificationEvent
+from models.user import User
+from routers.knowledge import KnowledgeCreate
+from utils.knowledge_import import KnowledgeImporter, iter_request_lines
+
+def _lines(chunks, max_line_bytes):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [line async for line in iter_request_lines(source(), max_line_bytes)]
+    return asyncio.run(collect())
+
+def test_lines_split_across_chunks():
+    assert _lines([b'{"a"', b': 1}\n{"b": 2}\n', b'{"c"', b": 3}"], 16) == ['{"a": 1}', '{"b": 2}', '{"c": 3}']
+
+def test_long_line_is_skipped_up_to_the_next_newline():
+    chunks = [b"ok\n", b"x" * 10, b"x" * 10, b"xx\nafter\n", b"y" * 20]
+
+    assert _lines(chunks, 8) == ["ok", None, "after", None]
+
+def test_line_at_the_limit_is_kept():
+    assert _lines([b"12345678\n123456789\n"], 8) == ["12345678", None]
+
+def test_long_line_is_reported_with_its_line_number():
+    importer = KnowledgeImporter(db=None, author=type("Author", (), {"id": 1, "department": None})(), schema=None)
+
+    asyncio.run(importer.add_line(""))
+    asyncio.run(importer.add_line(None))
+
+    assert importer.lines == 2
+    assert importer.failed == 1
+    assert importer.errors[0]["line"] == 2
+    assert "長すぎます" in importer.errors[0]["error"]
+
+def test_bom_is_skipped_even_when_split_across_chunks():
+    assert _lines([b"\xef", b"\xbb\xbf{\"a\": 1}\n"], 16) == ['{"a": 1}']
+    assert _lines([b"\xef\xbb", b"x\n"], 16) == ["�x"]
+
+def _ndjson(count):
+    return "".join(
+        json.dumps({"title": f"提案のコツ{i}", "method": "訪問", "target": "新規", "description": "説明", "category": "訪問"}, ensure_ascii=False) + "\n"
+        for i in range(count)
+    ).encode("utf-8")
+
+@pytest.fixture
+def author(db, login):
+    user = User(email="author@example.com", username="author", department="営業部")
+    db.add(user)
+    db.commit()
+    login(user.id)
+    return user
+
+def test_http_import_skips_bom(db, client, author):
+    response = client.post("/knowledge/import", content=codecs.BOM_UTF8 + _ndjson(3))
+
+    assert response.status_code == 200
+    assert response.json()["imported"] == 3
+    assert response.json()["failed"] == 0
+
+def test_one_experience_event_per_batch(db, author):
+    async def run():
+        async with AsyncSessionLocal() as session:
+            user = await session.get(User, author.id)
+            importer = KnowledgeImporter(session, user, KnowledgeCreate, batch_size=2)
+            for line in _ndjson(5).decode("utf-8").splitlines():
+                await importer.add_line(line)
+            return await importer.finish()
+
+    result = asyncio.run(run())
+
+    assert result["batches"] == 3
+    events = db.query(GamificationEvent).filter_by(user_id=author.id).order_by(GamificationEvent.id).all()
+    assert [event.xp_amount for event in events] == [20, 20, 10]
@@ -0,0 +1,67 @@
+"""
+ワーカーのメモリ診断（実行時フラグで有効な場合のみ書き出しを行う）
+"""
+import asyncio
+import os
+
+import pytest
+
+from core.config import settings
+from core.security import require_admin
+from utils import memory_diagnostics
+
+@pytest.fixture(autouse=True)
+def reset_flag(monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_REPORT_INTERVAL_SECONDS", 0.01)
+    yield
+    memory_diagnostics.set_flag(memory_diagnostics.DIAGNOSTICS_FLAG, None)
+
+@pytest.fixture
+def admin(client):
+    async def allow():
+        return None
+    client.app.dependency_overrides[require_admin] = allow
+    return client
+
+def _worker_file() -> str:
+    return os.path.join(settings.RUNTIME_DIR, "memory", "workers", f"{os.getpid()}.json")
+
+def test_reporter_does_not_start_while_disabled():
+    async def run():
+        started = memory_diagnostics.start_reporter()
+        task = memory_diagnostics._reporter_task
+        await memory_diagnostics.stop_reporter()
+        return started, task
+
+    assert asyncio.run(run()) == (False, None)
+
+def test_reporter_runs_until_disabled():
+    memory_diagnostics.set_diagnostics_enabled(True)
+
+    async def run():
+        assert memory_diagnostics.start_reporter()
+        task = memory_diagnostics._reporter_task
+        await asyncio.sleep(0.05)
+        running = not task.done()
+        memory_diagnostics.set_diagnostics_enabled(False)
+        await asyncio.wait_for(task, timeout=1)
+        await memory_diagnostics.stop_reporter()
+        return running
+
+    assert asyncio.run(run())
+    assert os.path.exists(_worker_file())
+
+def test_debug_memory_while_disabled(admin):
+    response = admin.get("/debug/memory")
+
+    assert response.status_code == 200
+    assert response.json()["enabled"] is False
+    assert admin.post("/debug/memory/snapshots").status_code == 409
+
+def test_debug_memory_enable(admin):
+    response = admin.put("/debug/memory", json={"enabled": True})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["enabled"] is True
+    assert os.getpid() in [worker["pid"] for worker in body["workers"]]
@@ -0,0 +1,78 @@
+"""
+MetricsMiddleware・ProfilerMiddleware（SSE の長時間接続を計測し続けないこと）
+"""
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from utils import profiler
+from utils.metrics import MetricsMiddleware
+from utils.profiler import ProfilerMiddleware
+
+def _in_progress():
+    return REGISTRY.get_sample_value("http_requests_in_progress")
+
+def _latency_count(status):
+    return REGISTRY.get_sample_value(
+        "http_request_duration_seconds_count",
+        {"method": "GET", "route": "unmatched", "status": status}
+    ) or 0
+
+def _app(content_type, disconnected):
+    """ヘッダーを送った後、切断されるまで本文を送らずに待つアプリ"""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        await disconnected.wait()
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+    return app
+
+async def _serve(middleware, content_type, while_open):
+    disconnected = asyncio.Event()
+    scope = {"type": "http", "method": "GET", "path": "/stream", "headers": []}
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    task = asyncio.create_task(middleware(_app(content_type, disconnected))(scope, receive, send))
+    await asyncio.sleep(0.05)
+    observed = while_open()
+    disconnected.set()
+    await task
+    return observed
+
+def test_metrics_stop_counting_event_stream_after_headers():
+    before = _in_progress()
+    latency_before = _latency_count("200")
+
+    in_progress, latency = asyncio.run(_serve(
+        MetricsMiddleware, b"text/event-stream; charset=utf-8",
+        lambda: (_in_progress(), _latency_count("200"))
+    ))
+
+    assert in_progress == before
+    assert latency == latency_before + 1
+    assert _in_progress() == before
+    assert _latency_count("200") == latency_before + 1
+
+def test_metrics_count_other_responses_until_finished():
+    before = _in_progress()
+
+    in_progress = asyncio.run(_serve(MetricsMiddleware, b"application/json", _in_progress))
+
+    assert in_progress == before + 1
+    assert _in_progress() == before
+
+def test_profiler_saves_event_stream_profile_at_headers(monkeypatch):
+    saved = []
+    monkeypatch.setattr(profiler, "_should_profile", lambda scope: "header")
+    monkeypatch.setattr(profiler, "save_profile", lambda profile_id, sampler, metadata: saved.append(metadata))
+
+    saved_while_open = asyncio.run(_serve(ProfilerMiddleware, b"text/event-stream", lambda: list(saved)))
+
+    assert len(saved_while_open) == 1
+    assert saved_while_open[0]["status"] == 200
+    assert len(saved) == 1
@@ -0,0 +1,75 @@
+"""
+コネクションプールの待ち時間の集計（プライマリ・レプリカ別）
+"""
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import models.database
+from models.database import InstrumentedQueuePool, get_pool_status
+from utils.metrics import update_pool_metrics
+
+@pytest.fixture
+def engines(monkeypatch):
+    primary = create_async_engine("sqlite+aiosqlite://", poolclass=InstrumentedQueuePool)
+    replica = create_async_engine("sqlite+aiosqlite://", poolclass=InstrumentedQueuePool)
+    monkeypatch.setattr(models.database, "async_engine", primary)
+    monkeypatch.setattr(models.database, "replica_engine", replica)
+    yield primary, replica
+    async def dispose():
+        await primary.dispose()
+        await replica.dispose()
+    asyncio.run(dispose())
+
+async def _checkout(engine, times: int) -> None:
+    for _ in range(times):
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+def test_wait_stats_are_kept_per_pool(engines):
+    primary, replica = engines
+
+    async def run():
+        await _checkout(primary, 3)
+        await _checkout(replica, 1)
+    asyncio.run(run())
+
+    status = get_pool_status()
+    assert status["checkouts"] == 3
+    assert status["replica"]["checkouts"] == 1
+    assert "healthy" in status["replica"]
+
+def test_wait_stats_survive_pool_recreation(engines):
+    primary, _ = engines
+
+    async def run():
+        await _checkout(primary, 2)
+        await primary.dispose()
+        await _checkout(primary, 1)
+    asyncio.run(run())
+
+    assert get_pool_status()["checkouts"] == 3
+
+def _checkout_metrics() -> dict:
+    return {
+        database: REGISTRY.get_sample_value("db_pool_checkouts_total", {"database": database}) or 0
+        for database in ("primary", "replica")
+    }
+
+def test_pool_metrics_are_labelled_by_database(engines):
+    primary, replica = engines
+    update_pool_metrics()
+    before = _checkout_metrics()
+
+    async def run():
+        await _checkout(primary, 2)
+        await _checkout(replica, 5)
+    asyncio.run(run())
+    update_pool_metrics()
+
+    after = _checkout_metrics()
+    assert after["primary"] - before["primary"] == 2
+    assert after["replica"] - before["replica"] == 5
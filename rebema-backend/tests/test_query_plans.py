@@ -0,0 +1,42 @@
+"""
+ホットパスのエンドポイントが実行するクエリのプラン（フルスキャン・filesort がないこと）
+
+Note:
+    - エンドポイントを呼び出し、ルーターが実際に実行した SELECT 文を同じパラメーターで EXPLAIN する
+"""
+import pytest
+from fastapi import Depends
+from fastapi.testclient import TestClient
+
+from core.security import get_current_user
+from models.database import Base, engine, get_db
+from models.user import User
+from utils.query_plan_check import HOT_ENDPOINTS, endpoint_query_plans, pick_sample, seed
+
+@pytest.fixture(scope="module")
+def sample():
+    from main import app
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    seed(engine)
+    with engine.connect() as connection:
+        sample = pick_sample(connection)
+
+    async def sample_user(db=Depends(get_db)):
+        return await db.get(User, sample["user_id"])
+    app.dependency_overrides[get_current_user] = sample_user
+    yield sample
+    app.dependency_overrides.clear()
+
+@pytest.mark.parametrize("endpoint", HOT_ENDPOINTS, ids=[endpoint[0] for endpoint in HOT_ENDPOINTS])
+def test_endpoint_queries_use_indexes(sample, endpoint):
+    from main import app
+
+    with TestClient(app) as client:
+        [(name, status_code, plans)] = endpoint_query_plans(client, engine, sample, [endpoint])
+
+    assert status_code == 200
+    assert plans, f"{name}: クエリが実行されていません"
+    problems = {statement: found for statement, found in plans if found}
+    assert not problems, f"{name}: {problems}"
@@ -0,0 +1,148 @@
+"""
+ランキング（/ranking/ranking/*）
+"""
+from datetime import datetime, timedelta
+
+from models.database import get_read_db
+from models.user import User
+from models.user_activity_daily import UserActivityDaily
+
+def _add_users(db, count):
+    users = [
+        User(email=f"user{i}@example.com", username=f"user{i}", level=i, points=i * 10, experience_points=0)
+        for i in range(1, count + 1)
+    ]
+    db.add_all(users)
+    db.commit()
+    return users
+
+def test_my_rank(db, client, login):
+    users = _add_users(db, 3)
+    login(users[0].id)
+
+    response = client.get("/ranking/ranking/me", params={"around": 1})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["level_rank"]["rank"] == 3
+    assert [row["is_me"] for row in body["around"]] == [False, True]
+
+def test_my_rank_reads_primary(db, client, login):
+    users = _add_users(db, 1)
+    login(users[0].id)
+
+    async def replica_unavailable():
+        raise AssertionError("/ranking/me はレプリカを使わない")
+        yield
+    client.app.dependency_overrides[get_read_db] = replica_unavailable
+
+    assert client.get("/ranking/ranking/me").status_code == 200
+
+def test_my_rank_returns_404_when_user_row_is_missing(db, client):
+    from core.security import get_current_user
+
+    _add_users(db, 2)
+
+    async def missing_user():
+        return User(id=999, email="gone@example.com", username="gone")
+    client.app.dependency_overrides[get_current_user] = missing_user
+
+    response = client.get("/ranking/ranking/me", params={"around": 2})
+
+    assert response.status_code == 404
+
+def test_my_rank_within_department(db, client, login):
+    users = _add_users(db, 4)
+    for user, department in zip(users, ["営業部", "開発部", "営業部", "開発部"]):
+        user.department = department
+    db.commit()
+    login(users[0].id)
+
+    response = client.get("/ranking/ranking/me", params={"department": "営業部", "around": 5})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["level_rank"]["rank"] == 2
+    assert body["points_rank"]["rank"] == 2
+    assert [row["id"] for row in body["around"]] == [users[2].id, users[0].id]
+
+def test_my_rank_in_another_department_is_not_found(db, client, login):
+    users = _add_users(db, 2)
+    users[0].department = "営業部"
+    db.commit()
+    login(users[0].id)
+
+    assert client.get("/ranking/ranking/me", params={"department": "開発部"}).status_code == 404
+
+def _add_daily(db, user, days_ago, count):
+    db.add(UserActivityDaily(
+        user_id=user.id,
+        day=datetime.utcnow().date() - timedelta(days=days_ago),
+        action="comment",
+        activity_count=count,
+        xp_amount=count * 5
+    ))
+    db.commit()
+
+def test_activity_ranking_period_uses_daily_rollup(db, client):
+    alice, bob, carol = _add_users(db, 3)
+    _add_daily(db, alice, 20, 5)
+    _add_daily(db, bob, 0, 3)
+    _add_daily(db, bob, 6, 1)
+    _add_daily(db, carol, 7, 9)
+    _add_daily(db, carol, 40, 9)
+
+    def ranking(period):
+        response = client.get("/ranking/ranking/activity", params={"period": period})
+        assert response.status_code == 200
+        return [row["id"] for row in response.json()]
+
+    # week は今日を含む直近7日（7日前の行は含めない）
+    assert ranking("week") == [bob.id]
+    assert ranking("month") == [carol.id, alice.id, bob.id]
+    assert ranking("all") == [carol.id, alice.id, bob.id]
+    assert client.get("/ranking/ranking/activity", params={"period": "year"}).status_code == 400
+
+def test_my_rank_ties_share_a_rank(db, client, login):
+    users = _add_users(db, 4)
+    # user2 と user3 を同じレベル・経験値・ポイントにする
+    users[1].level, users[1].points = 3, 30
+    db.commit()
+    login(users[2].id)
+
+    response = client.get("/ranking/ranking/me", params={"around": 3})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["level_rank"] == {"position": "2nd", "rank": 2}
+    assert body["points_rank"]["rank"] == 2
+    # 同順位の行はユーザーID順に並べ、次の順位は人数分飛ばす
+    assert [(row["id"], row["rank"]) for row in body["around"]] == [
+        (users[3].id, 1), (users[1].id, 2), (users[2].id, 2), (users[0].id, 4)
+    ]
+
+def test_my_rank_around_at_the_top(db, client, login):
+    users = _add_users(db, 5)
+    login(users[4].id)
+
+    body = client.get("/ranking/ranking/me", params={"around": 2}).json()
+
+    assert body["level_rank"]["rank"] == 1
+    assert [row["id"] for row in body["around"]] == [users[4].id, users[3].id, users[2].id]
+    assert body["around"][0]["is_me"]
+
+def test_my_rank_around_at_the_bottom(db, client, login):
+    users = _add_users(db, 5)
+    login(users[0].id)
+
+    body = client.get("/ranking/ranking/me", params={"around": 2, "around_by": "points"}).json()
+
+    assert body["points_rank"]["rank"] == 5
+    assert [row["id"] for row in body["around"]] == [users[2].id, users[1].id, users[0].id]
+    assert body["around"][-1]["is_me"]
+
+def test_my_rank_rejects_unknown_around_by(db, client, login):
+    users = _add_users(db, 1)
+    login(users[0].id)
+
+    assert client.get("/ranking/ranking/me", params={"around_by": "views"}).status_code == 400
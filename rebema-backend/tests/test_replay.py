@@ -0,0 +1,83 @@
+"""
+アクセスログの解析とトラフィックモデル（benchmarks/replay.py）
+"""
+import os
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+from benchmarks.replay import RequestSampler, TrafficModel, normalize_path, parse_line
+from tests.conftest import BACKEND_DIR
+
+ACCESS_LOG = os.path.join(BACKEND_DIR, "tests", "fixtures", "access.log")
+
+def _timestamp(*args) -> float:
+    return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+@pytest.fixture
+def model():
+    with open(ACCESS_LOG, encoding="utf-8") as f:
+        return TrafficModel.from_lines(f)
+
+def test_parse_uvicorn_line():
+    entry = parse_line('10.0.0.1:51234 - "GET /knowledge/?limit=10 HTTP/1.1" 200')
+
+    assert entry == {"client": "10.0.0.1", "method": "GET", "target": "/knowledge/?limit=10", "status": 200, "time": None}
+
+def test_parse_uvicorn_line_with_iso_timestamp():
+    entry = parse_line('2026-10-18 10:00:04,123+09:00 10.0.0.1:51234 - "HEAD /knowledge/12 HTTP/1.1" 304')
+
+    assert (entry["client"], entry["method"], entry["status"]) == ("10.0.0.1", "HEAD", 304)
+    assert entry["time"] == pytest.approx(_timestamp(2026, 10, 18, 1, 0, 4) + 0.123)
+
+def test_parse_combined_line():
+    entry = parse_line('10.0.0.3 - - [18/Oct/2026:19:20:02 +0900] "GET /knowledge/7 HTTP/1.1" 404 512 "-" "Mozilla/5.0"')
+
+    assert (entry["client"], entry["target"], entry["status"]) == ("10.0.0.3", "/knowledge/7", 404)
+    assert entry["time"] == _timestamp(2026, 10, 18, 10, 20, 2)
+
+def test_parse_non_request_line():
+    assert parse_line("[2026-10-18 10:20:01 +0000] [123] [INFO] Booting worker with pid: 123") is None
+
+def test_normalize_path_substitutes_numeric_segments():
+    assert normalize_path("/knowledge/12/comments") == ("/knowledge/{id}/comments", ["12"])
+    assert normalize_path("/profile/profile/3/knowledge/45") == ("/profile/profile/{id}/knowledge/{id}", ["3", "45"])
+    assert normalize_path("/knowledge/export") == ("/knowledge/export", [])
+
+def test_model_routes(model):
+    assert model.total == 6
+    assert {key: route["count"] for key, route in model.routes.items()} == {
+        "GET /knowledge/": 1,
+        "GET /knowledge/{id}": 3,
+        "GET /knowledge/{id}/comments": 1,
+        "GET /ranking/ranking/me": 1,
+    }
+    assert model.routes["GET /knowledge/{id}"]["ids"] == [{"12": 1, "7": 2}]
+    assert model.routes["GET /knowledge/"]["params"] == {"limit": {"10": 1}, "sort_by": {"views": 1}}
+    # ボディのないログからは再生できないメソッド・ヘルスチェックは除外する
+    assert model.skipped == {"POST": 1}
+    assert not any("healthz" in key for key in model.routes)
+
+def test_model_think_times(model):
+    # 同じクライアントの連続するリクエストの間隔（SESSION_GAP_SECONDS を超える間隔は除く）
+    assert sorted(model.think_times) == [3.0, 4.0]
+    assert model.span_seconds == 1205.0
+
+def test_model_round_trips_through_dict(model):
+    restored = TrafficModel.from_dict(model.to_dict())
+
+    assert restored.routes == model.routes
+    assert restored.think_times == model.think_times
+    assert restored.skipped == model.skipped
+
+def test_sampler_uses_observed_ids(model):
+    sampler = RequestSampler(model, random.Random(0), think_time=1.0, think_scale=1.0)
+
+    for _ in range(50):
+        key, method, url = sampler.next_request()
+        assert method == "GET"
+        assert "{id}" not in url
+        if key == "GET /knowledge/{id}":
+            assert url in ("/knowledge/12", "/knowledge/7")
+        assert sampler.next_think_time() in (3.0, 4.0)
@@ -0,0 +1,85 @@
+"""
+ワーカー起動時間（import main）の予算
+
+新しいインタープリタで `import main` を計測し、STARTUP_BUDGET_SECONDS（既定 3.0秒、中央値で判定）を
+超えていないかを確認する。あわせて以下も確認する。
+    - インポート時にDBへ接続していないこと
+    - 読み込みの重いモジュール（passlib / jose）を読み込んでいないこと
+      （cryptography は MySQL ドライバがインポート時に読み込むため対象外）
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from tests.conftest import BACKEND_DIR
+
+BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "3.0"))
+RUNS = 3
+
+# 初回利用時まで読み込みを遅らせているモジュール
+DEFERRED_MODULES = ["passlib", "jose"]
+
+_CHILD = """
+import json, sys, time
+import sqlalchemy.pool
+
+def _no_connect(self):
+    raise RuntimeError("インポート時にDBへ接続しようとしました")
+
+sqlalchemy.pool.Pool.connect = _no_connect
+
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "loaded": [name for name in %r if name in sys.modules]
+}))
+""" % (DEFERRED_MODULES,)
+
+def _measure_import(env) -> dict:
+    """新しいプロセスで main をインポートし、所要時間と読み込まれた遅延対象モジュールを返す"""
+    result = subprocess.run(
+        [sys.executable, "-c", _CHILD],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def _slowest_imports(env, top: int = 10) -> list:
+    """-X importtime の結果から、累積時間の大きいモジュールを返す（予算超過時の調査用）"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            rows.append((int(cumulative) / 1_000_000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+def test_import_main_within_budget(subprocess_env):
+    env = subprocess_env()
+    samples = [_measure_import(env) for _ in range(RUNS)]
+
+    median = statistics.median(sample["seconds"] for sample in samples)
+    assert median <= BUDGET_SECONDS, (
+        f"import main: 中央値 {median:.3f}秒 > 予算 {BUDGET_SECONDS:.3f}秒\n"
+        + "\n".join(f"  {seconds:.3f}秒  {name}" for seconds, name in _slowest_imports(env))
+    )
+
+def test_import_main_defers_heavy_modules(subprocess_env):
+    loaded = _measure_import(subprocess_env())["loaded"]
+
+    assert loaded == []
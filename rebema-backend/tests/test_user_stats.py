@@ -0,0 +1,146 @@
+"""
+ユーザー集計（user_stats）の維持
+"""
+import asyncio
+import importlib.util
+import os
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+import pytest
+from sqlalchemy import event, text
+
+import utils.user_stats as user_stats
+from models.database import AsyncSessionLocal, Base, async_engine, engine
+from models.comment import Comment
+from models.knowledge import Knowledge
+from models.user import User
+from models.user_stats import UserStats
+from tests.conftest import BACKEND_DIR
+
+@pytest.fixture
+def statements():
+    executed = []
+    def on_execute(connection, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_execute)
+    yield executed
+    event.remove(async_engine.sync_engine, "before_cursor_execute", on_execute)
+
+def _add_user(db, name="author"):
+    user = User(email=f"{name}@example.com", username=name)
+    db.add(user)
+    db.commit()
+    return user
+
+async def _write_knowledge(user_id: int) -> None:
+    """ナレッジの作成と同じく、行の追加と件数の加算を1つのトランザクションでコミットする"""
+    async with AsyncSessionLocal() as db:
+        db.add(Knowledge(title="t", method="m", target="t", description="d", category="メール", author_id=user_id))
+        await user_stats.increment_user_stats(db, user_id, knowledge=1)
+        await db.commit()
+
+async def _get_stats(user_id: int) -> UserStats:
+    async with AsyncSessionLocal() as db:
+        return await user_stats.get_user_stats(db, user_id)
+
+def test_increment_creates_missing_row(db):
+    user = _add_user(db)
+
+    asyncio.run(_write_knowledge(user.id))
+
+    stats = db.get(UserStats, user.id)
+    assert stats.knowledge_count == 1
+
+def test_get_user_stats_without_row_is_read_only(db, statements):
+    user = _add_user(db)
+
+    stats = asyncio.run(_get_stats(user.id))
+
+    assert (stats.knowledge_count, stats.comment_count, stats.total_views) == (0, 0, 0)
+    assert stats.recent_knowledge == [] and stats.recent_comments == []
+    assert not [sql for sql in statements if not sql.startswith("SELECT")]
+    assert db.get(UserStats, user.id) is None
+
+def _load_migration(name="f2b6c4d1e8a3_add_user_stats"):
+    path = os.path.join(BACKEND_DIR, "alembic", "versions", f"{name}.py")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_migration_backfills_existing_users(db):
+    author = _add_user(db, "author")
+    idle = _add_user(db, "idle")
+    knowledge = Knowledge(title="t", method="m", target="t", description="d", category="メール", author_id=author.id, views=7)
+    db.add(knowledge)
+    db.commit()
+    db.add_all([
+        Comment(content="c1", knowledge_id=knowledge.id, author_id=author.id),
+        Comment(content="c2", knowledge_id=knowledge.id, author_id=idle.id),
+    ])
+    db.commit()
+    author_id, idle_id, knowledge_id = author.id, idle.id, knowledge.id
+    db.close()
+    UserStats.__table__.drop(engine)
+
+    with engine.begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            _load_migration().upgrade()
+        rows = connection.execute(text(
+            "SELECT user_id, knowledge_count, comment_count, total_views, recent_knowledge FROM user_stats ORDER BY user_id"
+        )).all()
+
+    assert [tuple(row) for row in rows] == [(author_id, 1, 1, 7, None), (idle_id, 0, 1, 0, None)]
+
+    # 最近の活動は取得時にその場で取得する（保存は書き込み時に行う）
+    stats = asyncio.run(_get_stats(author_id))
+    assert stats.knowledge_count == 1
+    assert [k["id"] for k in stats.recent_knowledge] == [knowledge_id]
+    assert len(stats.recent_comments) == 1
+    with engine.connect() as connection:
+        assert connection.execute(text(
+            "SELECT recent_knowledge FROM user_stats WHERE user_id = :user_id"
+        ), {"user_id": author_id}).scalar() is None
+
+def test_migration_backfills_recent_activity(db, statements):
+    author = _add_user(db)
+    asyncio.run(_write_knowledge(author.id))
+    # マイグレーション f2b6c4d1e8a3 で作成した行と同じく、最近の活動を NULL にする
+    db.execute(text("UPDATE user_stats SET recent_knowledge = NULL, recent_comments = NULL"))
+    db.commit()
+    author_id = author.id
+    db.close()
+
+    with engine.begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            _load_migration("9e2b5d7f3a18_backfill_user_stats_recent_activity").upgrade()
+    statements.clear()
+
+    stats = asyncio.run(_get_stats(author_id))
+
+    assert len(stats.recent_knowledge) == 1
+    assert stats.recent_comments == []
+    # 主キーでの1回の取得のみ
+    assert len(statements) == 1
+
+def test_row_created_by_a_write_has_empty_recent_activity(db):
+    user = _add_user(db)
+    asyncio.run(_write_knowledge(user.id))
+
+    stats = db.get(UserStats, user.id)
+    assert stats.recent_comments == []
+
+def test_profile_view_is_a_single_read_query(db, client, statements):
+    user = _add_user(db)
+    asyncio.run(_write_knowledge(user.id))
+    statements.clear()
+
+    response = client.get(f"/profile/profile/{user.id}")
+
+    assert response.status_code == 200
+    assert response.json()["bio"] is None
+    assert response.json()["stats"] == {"knowledgeCount": 1, "commentCount": 0}
+    assert len(statements) == 1 and statements[0].startswith("SELECT")
+    db.expire_all()
+    assert user.profile is None
@@ -0,0 +1,76 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.user_activity import UserActivity
+from models.user_activity_daily import UserActivityDaily
+from utils.upsert import increment_or_insert_many
+
+async def record_activity(
+    db: AsyncSession,
+    user_id: int,
+    action: str,
+    xp_amount: int = 0,
+    timestamp: Optional[datetime] = None
+) -> None:
+    """
+    ユーザーのアクティビティを記録し、日次集計を更新する
+
+    Args:
+        db (AsyncSession): データベースセッション
+        user_id (int): アクティビティを行ったユーザーのID
+        action (str): アクション名（例: "create_knowledge", "comment"）
+        xp_amount (int): 付与した経験値
+        timestamp (Optional[datetime]): 発生日時（省略時は現在時刻）
+
+    Note:
+        - user_activities に1行追加する
+        - user_activity_daily の (user_id, 日付, action) 行を加算更新する
+        - コミットは呼び出し側で行う
+    """
+    await record_activities(db, [{
+        "user_id": user_id,
+        "action": action,
+        "xp_amount": xp_amount,
+        "timestamp": timestamp or datetime.utcnow()
+    }])
+
+async def record_activities(db: AsyncSession, activities: list) -> None:
+    """
+    複数のアクティビティをまとめて記録する（record_activity の一括版）
+
+    Args:
+        db (AsyncSession): データベースセッション
+        activities (list): user_id, action, xp_amount, timestamp を持つ辞書のリスト
+
+    Note:
+        - user_activities へは executemany で一括挿入する
+        - 日次集計は (user_id, 日付, action) ごとにまとめて1文で加算更新する
+        - コミットは呼び出し側で行う
+    """
+    if not activities:
+        return
+
+    await db.execute(insert(UserActivity.__table__), activities)
+
+    daily = {}
+    for activity in activities:
+        key = (activity["user_id"], activity["timestamp"].date(), activity["action"])
+        count, xp_amount = daily.get(key, (0, 0))
+        daily[key] = (count + 1, xp_amount + activity["xp_amount"])
+
+    await increment_or_insert_many(
+        db,
+        UserActivityDaily,
+        ["user_id", "day", "action"],
+        [
+            {
+                "user_id": user_id,
+                "day": day,
+                "action": action,
+                "activity_count": count,
+                "xp_amount": xp_amount
+            }
+            for (user_id, day, action), (count, xp_amount) in daily.items()
+        ]
+    )
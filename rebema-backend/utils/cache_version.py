@@ -0,0 +1,34 @@
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.cache_version import CacheVersion
+from models.database import AsyncSessionLocal
+from utils.upsert import increment_or_insert
+
+# ナレッジ一覧のバージョン（一覧に表示する内容を変更したときに加算する）
+KNOWLEDGE_LIST = "knowledge_list"
+
+async def get_version(db: AsyncSession, name: str) -> int:
+    """バージョン番号を取得する（まだ一度も変更されていない場合は 0）"""
+    return await db.scalar(
+        select(CacheVersion.version).where(CacheVersion.name == name)
+    ) or 0
+
+async def bump_version(name: str) -> None:
+    """
+    バージョン番号を1つ進める
+
+    Note:
+        - 変更をコミットした後に、別のセッションの短いトランザクションで実行する
+          （変更と同じトランザクションで進めると、コミットまでバージョンの行がロックされ、
+            全ワーカーの書き込みが1件ずつしか進まなくなる）
+        - バージョンは変更が見えるようになった後に進むため、古い内容に新しいバージョンの ETag が付くことはない
+          （進む前に新しい内容を返したレスポンスは、次の再検証で取得し直される）
+        - 失敗した場合はエラーを出力する（変更はコミット済みのため、呼び出し側には伝えない）
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            await increment_or_insert(db, CacheVersion, keys={"name": name}, increments={"version": 1})
+            await db.commit()
+    except SQLAlchemyError as e:
+        print(f"⚠️ キャッシュのバージョンを進められませんでした（{name}）: {str(e)}")
@@ -0,0 +1,200 @@
+"""
+コメントのリアルタイム配信（Server-Sent Events）
+
+ナレッジごとの購読者（SSE の接続）をワーカー内で管理し、コメントの作成・削除を配信する。
+gunicorn の各ワーカーは RUNTIME_DIR/comment_stream/<pid>.sock に Unix ドメインの
+データグラムソケットを開き、イベントを発行したワーカーは自身の購読者に配信したうえで
+他のワーカーのソケットへ同じイベントを送る（外部のメッセージブローカーは使わない）。
+
+Note:
+    - 接続ごとに持つのは待機中のコルーチンとキューのみで、DBセッションは保持しない
+    - 受信側の処理が追いつかずキューがあふれた接続は切断する（クライアントは再接続して一覧を取得し直す）
+    - 終了したワーカーのソケットファイルは、送信に失敗した時点・起動時に削除する
+"""
+import asyncio
+import json
+import os
+import socket
+from collections import defaultdict
+from typing import AsyncIterator, Optional
+
+from core.config import settings
+from utils.metrics import COMMENT_STREAM_CONNECTIONS
+
+_SOCKET_SUFFIX = ".sock"
+
+# 受信するデータグラムの最大サイズ（これを超えるイベントは他のワーカーへ送信できない）
+_MAX_DATAGRAM = 256 * 1024
+
+def _socket_dir() -> str:
+    return os.path.join(settings.RUNTIME_DIR, "comment_stream")
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class Subscription:
+    """1つの SSE 接続の購読（イベントはキューに溜め、接続ごとのコルーチンが取り出して送信する）"""
+
+    def __init__(self, knowledge_id: int):
+        self.knowledge_id = knowledge_id
+        self.queue = asyncio.Queue(maxsize=settings.COMMENT_STREAM_QUEUE_SIZE)
+        self.overflowed = False
+
+    def push(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+class CommentBroker:
+    """ワーカー内の購読者の管理と、ワーカー間のイベントの中継"""
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self._socket: Optional[socket.socket] = None
+        self._path: Optional[str] = None
+        self._sender: Optional[socket.socket] = None
+
+    def start(self) -> None:
+        """このワーカーの受信用ソケットを開き、イベントループで受信を待つ"""
+        directory = _socket_dir()
+        os.makedirs(directory, exist_ok=True)
+        for entry in os.scandir(directory):
+            name = entry.name[:-len(_SOCKET_SUFFIX)]
+            if entry.name.endswith(_SOCKET_SUFFIX) and name.isdigit() and not _pid_alive(int(name)):
+                _remove(entry.path)
+
+        path = os.path.join(directory, f"{os.getpid()}{_SOCKET_SUFFIX}")
+        _remove(path)
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            receiver.bind(path)
+        except OSError as e:
+            # パスが長すぎる場合など。このワーカーの購読者には他のワーカーのイベントが届かない
+            receiver.close()
+            print(f"⚠️ コメント配信の受信用ソケットを開けませんでした: {path}: {str(e)}")
+            return
+        receiver.setblocking(False)
+        self._socket = receiver
+        self._path = path
+        asyncio.get_running_loop().add_reader(receiver.fileno(), self._receive)
+
+    def stop(self) -> None:
+        if self._socket is not None:
+            asyncio.get_running_loop().remove_reader(self._socket.fileno())
+            self._socket.close()
+            self._socket = None
+            _remove(self._path)
+        if self._sender is not None:
+            self._sender.close()
+            self._sender = None
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                data = self._socket.recv(_MAX_DATAGRAM)
+            except BlockingIOError:
+                return
+            try:
+                self._dispatch(json.loads(data))
+            except (ValueError, KeyError) as e:
+                print(f"コメント配信イベントの受信エラー: {str(e)}")
+
+    def _dispatch(self, event: dict) -> None:
+        for subscription in list(self.subscriptions.get(event["knowledgeId"], ())):
+            subscription.push(event)
+
+    def _broadcast(self, data: bytes) -> None:
+        """他のワーカーのソケットへ送る（送れないワーカーはスキップし、終了したワーカーのソケットは削除する）"""
+        directory = _socket_dir()
+        if not os.path.isdir(directory):
+            return
+        if self._sender is None:
+            self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sender.setblocking(False)
+        for entry in os.scandir(directory):
+            if not entry.name.endswith(_SOCKET_SUFFIX) or entry.path == self._path:
+                continue
+            try:
+                self._sender.sendto(data, entry.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                _remove(entry.path)
+            except BlockingIOError:
+                print(f"コメント配信イベントを送信できませんでした（受信側の処理待ち）: {entry.name}")
+            except OSError as e:
+                print(f"コメント配信イベントの送信エラー: {entry.name}: {str(e)}")
+
+    def publish(self, event: dict) -> None:
+        """
+        イベントを全ワーカーの購読者に配信する
+
+        Note:
+            - コミット後に呼び出す（購読者がコミット前の内容を受け取らないように）
+        """
+        self._dispatch(event)
+        self._broadcast(json.dumps(event, ensure_ascii=False).encode("utf-8"))
+
+    def subscribe(self, knowledge_id: int) -> Subscription:
+        subscription = Subscription(knowledge_id)
+        self.subscriptions[knowledge_id].add(subscription)
+        COMMENT_STREAM_CONNECTIONS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self.subscriptions.get(subscription.knowledge_id)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self.subscriptions[subscription.knowledge_id]
+        COMMENT_STREAM_CONNECTIONS.dec()
+
+broker = CommentBroker()
+
+def publish_comment_created(knowledge_id: int, comment: dict) -> None:
+    broker.publish({"type": "created", "knowledgeId": knowledge_id, "comment": comment})
+
+def publish_comment_deleted(knowledge_id: int, comment_id: int) -> None:
+    broker.publish({"type": "deleted", "knowledgeId": knowledge_id, "comment": {"id": comment_id}})
+
+def _sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event['comment'], ensure_ascii=False)}\n\n"
+
+async def comment_events(knowledge_id: int) -> AsyncIterator[str]:
+    """
+    ナレッジのコメントのイベントを SSE 形式で返し続ける
+
+    Note:
+        - COMMENT_STREAM_HEARTBEAT_SECONDS ごとにコメント行を送り、プロキシによる切断を防ぐ
+        - クライアントの切断時（StreamingResponse がジェネレーターを止めた時）に購読を解除する
+    """
+    subscription = broker.subscribe(knowledge_id)
+    try:
+        yield f"retry: {settings.COMMENT_STREAM_RETRY_MS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(),
+                    timeout=settings.COMMENT_STREAM_HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            yield _sse(event)
+            if subscription.overflowed and subscription.queue.empty():
+                # 取りこぼしたイベントがあるため切断する（再接続時に一覧を取得し直してもらう）
+                return
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,124 @@
+from typing import Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.user import User
+from models.knowledge import Knowledge
+from models.department_stats import DepartmentStats
+from utils.upsert import increment_or_insert
+
+async def apply_department_delta(
+    db: AsyncSession,
+    department: Optional[str],
+    users: int = 0,
+    points: int = 0,
+    level: int = 0,
+    knowledge: int = 0
+) -> None:
+    """
+    部署の集計値に差分を加算する
+
+    Args:
+        db (AsyncSession): データベースセッション
+        department (Optional[str]): 部署名（未設定の場合は何もしない）
+        users (int): 所属ユーザー数の差分
+        points (int): 合計ポイントの差分
+        level (int): 合計レベルの差分
+        knowledge (int): ナレッジ数の差分
+
+    Note:
+        - コミットは呼び出し側で行う
+    """
+    if not department:
+        return
+    await increment_or_insert(
+        db,
+        DepartmentStats,
+        keys={"department": department},
+        increments={
+            "user_count": users,
+            "total_points": points,
+            "total_level": level,
+            "knowledge_count": knowledge
+        }
+    )
+
+async def move_user_department(db: AsyncSession, user: User, old_department: Optional[str], new_department: Optional[str]) -> None:
+    """
+    ユーザーの部署変更に合わせて、ユーザーの集計値を旧部署から新部署へ移す
+
+    Note:
+        - 経験値の反映（utils.gamification）と同じく users → department_stats（部署名順）の順にロックする
+          （ユーザーの行をロックして読み直すため、移す合計ポイント・合計レベルも最新の値になる）
+        - コミットは呼び出し側で行う
+    """
+    if (old_department or None) == (new_department or None):
+        return
+
+    points, level = (await db.execute(
+        select(func.coalesce(User.points, 0), func.coalesce(User.level, 0))
+        .where(User.id == user.id)
+        .with_for_update()
+    )).one()
+    knowledge_count = await db.scalar(
+        select(func.count(Knowledge.id)).where(Knowledge.author_id == user.id)
+    ) or 0
+
+    deltas = [
+        (old_department, {"users": -1, "points": -points, "level": -level, "knowledge": -knowledge_count}),
+        (new_department, {"users": 1, "points": points, "level": level, "knowledge": knowledge_count}),
+    ]
+    # 経験値の反映と同じく部署名順にロックする
+    for department, delta in sorted(deltas, key=lambda item: item[0] or ""):
+        await apply_department_delta(db, department, **delta)
+
+async def rebuild_department_stats(db: AsyncSession) -> int:
+    """
+    users / knowledges から部署の集計を作り直す
+
+    Returns:
+        int: 集計した部署数
+    """
+    knowledge_counts = (
+        select(Knowledge.author_id.label('author_id'), func.count(Knowledge.id).label('count'))
+        .group_by(Knowledge.author_id)
+        .subquery()
+    )
+    rows = (await db.execute(
+        select(
+            User.department,
+            func.count(User.id),
+            func.coalesce(func.sum(User.points), 0),
+            func.coalesce(func.sum(User.level), 0),
+            func.coalesce(func.sum(knowledge_counts.c.count), 0)
+        )
+        .outerjoin(knowledge_counts, knowledge_counts.c.author_id == User.id)
+        .where(User.department.isnot(None), User.department != "")
+        .group_by(User.department)
+    )).all()
+
+    await db.execute(delete(DepartmentStats))
+    for department, user_count, total_points, total_level, knowledge_count in rows:
+        db.add(DepartmentStats(
+            department=department,
+            user_count=user_count,
+            total_points=total_points,
+            total_level=total_level,
+            knowledge_count=knowledge_count
+        ))
+    await db.commit()
+    return len(rows)
+
+async def _main() -> None:
+    from models.database import AsyncSessionLocal, async_engine
+    # リレーションシップ解決のため関連モデルを読み込む
+    from models import comment, file, knowledge_collaborator, profile, user_activity
+    try:
+        async with AsyncSessionLocal() as db:
+            count = await rebuild_department_stats(db)
+        print(f"✅ 部署集計を再作成しました（{count}部署）")
+    finally:
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(_main())
@@ -0,0 +1,45 @@
+"""
+ETag による条件付きリクエスト（If-None-Match → 304 Not Modified）
+"""
+import hashlib
+
+from fastapi import Request, Response
+
+def weak_etag(*parts) -> str:
+    """値の組み合わせから弱い ETag（W/"..."）を作る"""
+    digest = hashlib.blake2b(
+        "\x1f".join(str(part) for part in parts).encode("utf-8"),
+        digest_size=16
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+def _opaque_tag(tag: str) -> str:
+    # If-None-Match は弱い比較を行うため W/ の有無は区別しない
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match ヘッダーのいずれかの ETag が一致するか"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    expected = _opaque_tag(etag)
+    return any(_opaque_tag(tag) == expected for tag in header.split(","))
+
+def set_etag(response: Response, etag: str) -> None:
+    """
+    レスポンスに ETag を付ける
+
+    Note:
+        - no-cache: クライアントは保存したレスポンスを使う前に必ず If-None-Match で再検証する
+    """
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+def not_modified(etag: str) -> Response:
+    """本文なしの 304 レスポンス"""
+    response = Response(status_code=304)
+    set_etag(response, etag)
+    return response
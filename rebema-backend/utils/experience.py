@@ -1,28 +1,116 @@
-from sqlalchemy.orm import Session
+import math
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.user import User
+from models.department_stats import DepartmentStats
+from utils.activity import record_activity
 
-def add_experience(user: User, xp: int, db: Session) -> None:
+# レベル L から L+1 に上がるのに必要な経験値は L * XP_PER_LEVEL（偶数）
+XP_PER_LEVEL = 10
+_HALF = XP_PER_LEVEL // 2
+
+def experience_for_level(level: int) -> int:
+    """レベル1から指定レベルに到達するまでの累計経験値"""
+    return _HALF * level * (level - 1)
+
+def level_for_experience(total_xp: int) -> int:
+    """累計経験値から現在のレベルを求める（experience_for_level の逆関数）"""
+    return (_HALF + math.isqrt(_HALF * _HALF + 4 * _HALF * max(total_xp, 0))) // (2 * _HALF)
+
+def level_expression(total_xp):
+    """level_for_experience と同じ計算を行うSQL式"""
+    return func.floor((_HALF + func.sqrt(_HALF * _HALF + 4 * _HALF * total_xp)) / (2 * _HALF))
+
+async def apply_experience(db: AsyncSession, xp_by_user: dict) -> None:
+    """
+    複数ユーザーへの経験値付与をまとめて反映する
+
+    Args:
+        db (AsyncSession): データベースセッション
+        xp_by_user (dict): ユーザーIDと付与する経験値の対応
+
+    Note:
+        - experience_points（累計経験値）と points に経験値を加算
+        - level と current_xp は累計経験値から閉じた式で求める
+        - レベルアップ後の必要経験値は level * 10
+        - 1つの UPDATE 文（executemany）で更新するため、同時に付与しても経験値が失われない
+        - 所属部署の合計ポイント・合計レベルを部署ごとに合算し、部署名順に更新する
+        - コミットは呼び出し側で行う
+    """
+    if not xp_by_user:
+        return
+
+    users = User.__table__
+    departments = DepartmentStats.__table__
+    # 複数ワーカーが同じ順序でロックするよう、ユーザーID順に更新する
+    params = [{"b_user_id": user_id, "b_xp": xp} for user_id, xp in sorted(xp_by_user.items())]
+    xp = bindparam("b_xp")
+
+    total_xp = func.coalesce(users.c.experience_points, 0) + xp
+    new_level = level_expression(total_xp)
+
+    # MySQL は SET 句を左から順に評価するため、experience_points を最後に更新する
+    await db.execute(
+        update(users)
+        .where(users.c.id == bindparam("b_user_id"))
+        .ordered_values(
+            (users.c.level, new_level),
+            (users.c.current_xp, total_xp - _HALF * new_level * (new_level - 1)),
+            (users.c.points, func.coalesce(users.c.points, 0) + xp),
+            (users.c.experience_points, total_xp),
+        ),
+        params
+    )
+
+    # 更新後の累計経験値からレベルの増分を求め、部署ごとに合算して部署集計に反映する
+    # （複数ワーカーが同じ順序でロックするよう、部署名順に更新する）
+    rows = (await db.execute(
+        select(users.c.id, users.c.department, users.c.experience_points)
+        .where(users.c.id.in_(list(xp_by_user)))
+    )).all()
+    delta_by_department = {}
+    for user_id, department, total in rows:
+        if department is None:
+            continue
+        amount = xp_by_user[user_id]
+        points, levels = delta_by_department.get(department, (0, 0))
+        delta_by_department[department] = (
+            points + amount,
+            levels + level_for_experience(total) - level_for_experience(total - amount)
+        )
+    if not delta_by_department:
+        return
+
+    await db.execute(
+        update(departments)
+        .where(departments.c.department == bindparam("b_department"))
+        .values(
+            total_points=departments.c.total_points + bindparam("b_points"),
+            total_level=departments.c.total_level + bindparam("b_levels")
+        ),
+        [
+            {"b_department": department, "b_points": points, "b_levels": levels}
+            for department, (points, levels) in sorted(delta_by_department.items())
+        ]
+    )
+
+async def add_experience(user: User, xp: int, db: AsyncSession, action: str) -> None:
     """
     ユーザーに経験値を追加し、レベルアップの処理を行う
 
     Args:
         user (User): 経験値を追加するユーザー
         xp (int): 追加する経験値
-        db (Session): データベースセッション
+        db (AsyncSession): データベースセッション
+        action (str): 経験値の付与理由となったアクション名
 
     Note:
-        - current_xpに経験値を加算
-        - pointsに経験値を加算
-        - レベルアップに必要な経験値に達した場合、レベルアップ処理を実行
-        - レベルアップ後の必要経験値は level * 10
+        - 経験値・レベルの更新は apply_experience と同じ
+        - user_activities に経験値の履歴を追記し、日次集計を記録する
+        - 更新後の値を user に読み込み直す（非同期セッションでは遅延ロードできないため）
+        - コミットは呼び出し側で行う
+        - 書き込みAPIからは utils.gamification.publish_event を使い、非同期に反映する
     """
-    user.current_xp += xp
-    user.points += xp
-    required_xp = user.level * 10
-    
-    while user.current_xp >= required_xp:
-        user.current_xp -= required_xp
-        user.level += 1
-        required_xp = user.level * 10
-    
-    db.commit() 
\ No newline at end of file
+    await apply_experience(db, {user.id: xp})
+    await record_activity(db, user.id, action, xp)
+    await db.refresh(user, ["level", "current_xp", "points", "experience_points"])
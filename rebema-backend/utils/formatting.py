@@ -0,0 +1,21 @@
+"""
+レスポンス用の値の整形
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+# 画面に表示する日付の形式
+DATE_FORMAT = "%Y年%m月%d日"
+
+@lru_cache(maxsize=4096)
+def _format_day(day: date) -> str:
+    return day.strftime(DATE_FORMAT)
+
+def format_date(value: datetime) -> str:
+    """
+    日時を「YYYY年MM月DD日」の形式にする
+
+    Note:
+        - 一覧では同じ日付が繰り返し現れるため、日付単位で整形結果をキャッシュする
+    """
+    return _format_day(value.date())
@@ -0,0 +1,211 @@
+import asyncio
+import traceback
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import DBAPIError, OperationalError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.database import AsyncSessionLocal
+from models.gamification_event import GamificationEvent
+from models.gamification_dead_letter import GamificationDeadLetter
+from utils.activity import record_activities
+from utils.experience import apply_experience
+from core.config import settings
+
+def publish_event(db: AsyncSession, user_id: int, action: str, xp_amount: int) -> None:
+    """
+    経験値付与イベントを登録する
+
+    Args:
+        db (AsyncSession): データベースセッション
+        user_id (int): 経験値を付与するユーザーのID
+        action (str): アクション名（例: "create_knowledge", "comment"）
+        xp_amount (int): 付与する経験値
+
+    Note:
+        - 書き込みAPIと同じトランザクションで登録するため、
+          ナレッジやコメントがコミットされた場合のみイベントが残る
+        - 経験値・アクティビティ・部署集計への反映は process_pending_events が行う
+        - process_pending_events と同じ順序（users → department_stats）でロックするため、
+          部署集計を更新する前に呼び出してフラッシュする（イベントの登録で users の行をロックする）
+        - コミットは呼び出し側で行う
+    """
+    db.add(GamificationEvent(user_id=user_id, action=action, xp_amount=xp_amount))
+
+async def _apply_events(db: AsyncSession, events: list) -> None:
+    """イベントの経験値・アクティビティを反映し、イベントを削除する（コミットは呼び出し側）"""
+    # ユーザーごとに経験値を合算（複数ワーカーで同じ順序にロックするよう、ユーザーID順に更新する。
+    # 部署集計は apply_experience が部署名順に更新する）
+    xp_by_user = {}
+    for event in sorted(events, key=lambda event: event.user_id):
+        xp_by_user[event.user_id] = xp_by_user.get(event.user_id, 0) + event.xp_amount
+
+    await apply_experience(db, xp_by_user)
+    await record_activities(db, [
+        {
+            "user_id": event.user_id,
+            "action": event.action,
+            "xp_amount": event.xp_amount,
+            "timestamp": event.created_at
+        }
+        for event in events
+    ])
+    await db.execute(
+        delete(GamificationEvent)
+        .where(GamificationEvent.id.in_([event.id for event in events]))
+        .execution_options(synchronize_session=False)
+    )
+
+def _is_transient(error: SQLAlchemyError) -> bool:
+    """
+    時間をおけば成功する可能性があるエラーか
+
+    Note:
+        - デッドロック・ロック待ちのタイムアウト・接続断（MySQL では OperationalError）が該当する
+        - 失敗回数には数えず、次回のポーリングで再処理する
+    """
+    return isinstance(error, OperationalError) or (
+        isinstance(error, DBAPIError) and error.connection_invalidated
+    )
+
+def _pending_events(limit: int):
+    return (
+        select(GamificationEvent)
+        .order_by(GamificationEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+
+async def _dead_letter(db: AsyncSession, event: dict, attempts: int, error: str) -> None:
+    """イベントを gamification_dead_letters に移す（コミットは呼び出し側）"""
+    await db.execute(insert(GamificationDeadLetter).values(
+        event_id=event["id"],
+        user_id=event["user_id"],
+        action=event["action"],
+        xp_amount=event["xp_amount"],
+        created_at=event["created_at"],
+        attempts=attempts,
+        error=error[:2000]
+    ))
+    await db.execute(delete(GamificationEvent).where(GamificationEvent.id == event["id"]))
+
+async def _process_event(db: AsyncSession, event_id: int) -> bool:
+    """
+    1件のイベントを反映する
+
+    Returns:
+        bool: 一時的なエラーで反映できなかった場合は False
+
+    Note:
+        - 他のワーカーが先に処理した場合は何もしない
+        - 一時的なエラー（_is_transient）は失敗回数に数えない
+        - それ以外のエラーは失敗回数を記録し、GAMIFICATION_MAX_ATTEMPTS に達したイベントは
+          gamification_dead_letters に移す
+    """
+    event = (await db.execute(
+        _pending_events(1).where(GamificationEvent.id == event_id)
+    )).scalar_one_or_none()
+    if event is None:
+        await db.rollback()
+        return True
+
+    # ロールバック後は属性を読み込めないため、先に値を取り出しておく
+    values = {
+        "id": event.id,
+        "user_id": event.user_id,
+        "action": event.action,
+        "xp_amount": event.xp_amount,
+        "created_at": event.created_at
+    }
+    attempts = event.attempts + 1
+    try:
+        await _apply_events(db, [event])
+        await db.commit()
+        return True
+    except SQLAlchemyError as e:
+        await db.rollback()
+        if _is_transient(e):
+            print(f"ゲーミフィケーションイベント {event_id} の反映を次回に再試行します: {type(e).__name__}: {str(e)}")
+            return False
+        error = f"{type(e).__name__}: {str(e)}"
+
+    if attempts >= settings.GAMIFICATION_MAX_ATTEMPTS:
+        await _dead_letter(db, values, attempts, error)
+        print(f"⚠️ ゲーミフィケーションイベント {event_id} は{attempts}回失敗したため gamification_dead_letters に移しました: {error}")
+    else:
+        await db.execute(
+            update(GamificationEvent)
+            .where(GamificationEvent.id == event_id)
+            .values(attempts=attempts)
+        )
+        print(f"ゲーミフィケーションイベント {event_id} の反映エラー（{attempts}回目）: {error}")
+    await db.commit()
+    return True
+
+async def process_pending_events(db: AsyncSession, batch_size: int) -> int:
+    """
+    未処理のイベントをまとめて取得し、1トランザクションで反映する
+
+    Returns:
+        int: 処理したイベント数（反映に失敗したイベントを含む。一時的なエラーで中断した場合は 0）
+
+    Note:
+        - FOR UPDATE SKIP LOCKED で取得するため、複数ワーカーが同時に実行しても
+          同じイベントを二重に処理しない
+        - 反映とイベントの削除を同じトランザクションでコミットするため、
+          途中でワーカーが停止しても未コミットのイベントは次回再処理される
+        - デッドロック・ロック待ちのタイムアウトなど一時的なエラーの場合は、失敗回数に数えずに
+          次回のポーリングで再処理する
+        - それ以外のエラーでまとめて反映できなかった場合は1件ずつ反映し直す。失敗したイベントは
+          失敗回数を記録し、GAMIFICATION_MAX_ATTEMPTS に達したものは gamification_dead_letters に移す
+          （他のイベントの処理を止めない）
+        - ロックの順序は users（ID順）→ department_stats（部署名順）（書き込みAPIも同じ順序でロックする）
+    """
+    events = (await db.execute(_pending_events(batch_size))).scalars().all()
+    if not events:
+        await db.rollback()
+        return 0
+
+    event_ids = [event.id for event in events]
+    try:
+        await _apply_events(db, events)
+        await db.commit()
+        return len(event_ids)
+    except SQLAlchemyError as e:
+        await db.rollback()
+        if _is_transient(e):
+            print(f"ゲーミフィケーションイベントの反映を次回に再試行します: {type(e).__name__}: {str(e)}")
+            return 0
+        print(f"ゲーミフィケーションイベントをまとめて反映できなかったため、1件ずつ反映します: {type(e).__name__}: {str(e)}")
+
+    for event_id in event_ids:
+        if not await _process_event(db, event_id):
+            return 0
+    return len(event_ids)
+
+async def _process_batch() -> int:
+    async with AsyncSessionLocal() as db:
+        return await process_pending_events(db, settings.GAMIFICATION_BATCH_SIZE)
+
+async def run_consumer(stop: asyncio.Event) -> None:
+    """
+    未処理イベントを定期的に処理するバックグラウンドタスク
+
+    Note:
+        - イベントが残っている間は続けて処理し、なくなったら poll 間隔だけ待つ
+        - 非同期セッションで処理するため、DB待ちの間もイベントループを止めない
+        - 予期しないエラーもトレースバックを出力して処理を続ける（タスクを終了するのは停止時・キャンセル時のみ）
+    """
+    interval = settings.GAMIFICATION_POLL_INTERVAL
+    while not stop.is_set():
+        try:
+            processed = await _process_batch()
+        except Exception:
+            # 接続断など（イベントごとの反映エラーは process_pending_events で記録する）
+            print(f"ゲーミフィケーションイベント処理エラー:\n{traceback.format_exc()}")
+            processed = 0
+
+        if processed < settings.GAMIFICATION_BATCH_SIZE:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,194 @@
+"""
+ナレッジの一括エクスポート（NDJSON / CSV）
+
+    python -m utils.knowledge_export --format csv --output knowledge.csv
+    python -m utils.knowledge_export --format ndjson --categories メール,電話 > knowledge.ndjson
+
+ナレッジはサーバーサイドカーソル（yield_per）で EXPORT_BATCH_SIZE 件ずつ読み込み、
+コメント数・ファイル数・コラボレーターはバッチごとにまとめて取得する（1行ごとのクエリは発行しない）。
+メモリ使用量はバッチ1つ分で一定になる。
+"""
+import csv
+import io
+import json
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy import func, select
+
+from models.user import User
+from models.knowledge import Knowledge
+from models.file import File
+from models.comment import Comment
+from models.knowledge_collaborator import KnowledgeCollaborator
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+CSV_COLUMNS = [
+    "id", "title", "category", "method", "target", "description", "views",
+    "createdAt", "updatedAt", "authorId", "authorName", "authorDepartment",
+    "commentCount", "fileCount", "collaborators",
+]
+
+def _export_query(categories: Optional[List[str]]):
+    # User はエンティティではなく列で取得する（アバター画像などの大きな列を読み込まない）
+    query = (
+        select(
+            Knowledge.id,
+            Knowledge.title,
+            Knowledge.category,
+            Knowledge.method,
+            Knowledge.target,
+            Knowledge.description,
+            Knowledge.views,
+            Knowledge.created_at,
+            Knowledge.updated_at,
+            Knowledge.author_id,
+            User.username.label("author_name"),
+            User.department.label("author_department"),
+        )
+        .outerjoin(User, User.id == Knowledge.author_id)
+        .order_by(Knowledge.id)
+    )
+    if categories:
+        query = query.where(Knowledge.category.in_(categories))
+    return query
+
+async def _batch_details(db, ids: list) -> tuple[dict, dict, dict]:
+    """バッチ内のナレッジのコメント数・ファイル数・コラボレーターを3クエリで取得する"""
+    comment_counts = dict((await db.execute(
+        select(Comment.knowledge_id, func.count(Comment.id))
+        .where(Comment.knowledge_id.in_(ids))
+        .group_by(Comment.knowledge_id)
+    )).all())
+    file_counts = dict((await db.execute(
+        select(File.knowledge_id, func.count(File.id))
+        .where(File.knowledge_id.in_(ids))
+        .group_by(File.knowledge_id)
+    )).all())
+    collaborators = {}
+    rows = (await db.execute(
+        select(KnowledgeCollaborator.knowledge_id, User.id, User.username)
+        .join(User, User.id == KnowledgeCollaborator.user_id)
+        .where(KnowledgeCollaborator.knowledge_id.in_(ids))
+        .order_by(KnowledgeCollaborator.knowledge_id, User.id)
+    )).all()
+    for knowledge_id, user_id, username in rows:
+        collaborators.setdefault(knowledge_id, []).append({"id": user_id, "name": username})
+    return comment_counts, file_counts, collaborators
+
+async def export_batches(
+    session_factory,
+    categories: Optional[List[str]] = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> AsyncIterator[list]:
+    """
+    エクスポートする行を batch_size 件ずつ返す
+
+    Note:
+        - サーバーサイドカーソルを開いている間は同じコネクションで別のクエリを実行できないため、
+          バッチごとの集計は別のセッション（コネクション）で行う
+        - セッションはこの中で作成する（StreamingResponse の送信中に依存関係のセッションは使えないため）
+    """
+    async with session_factory() as stream_db, session_factory() as lookup_db:
+        result = await stream_db.stream(
+            _export_query(categories).execution_options(yield_per=batch_size)
+        )
+        async for partition in result.partitions():
+            ids = [row.id for row in partition]
+            comment_counts, file_counts, collaborators = await _batch_details(lookup_db, ids)
+            yield [
+                {
+                    "id": row.id,
+                    "title": row.title,
+                    "category": row.category,
+                    "method": row.method,
+                    "target": row.target,
+                    "description": row.description,
+                    "views": row.views or 0,
+                    "createdAt": row.created_at.isoformat() if row.created_at else None,
+                    "updatedAt": row.updated_at.isoformat() if row.updated_at else None,
+                    "authorId": row.author_id,
+                    "authorName": row.author_name,
+                    "authorDepartment": row.author_department,
+                    "commentCount": comment_counts.get(row.id, 0),
+                    "fileCount": file_counts.get(row.id, 0),
+                    "collaborators": collaborators.get(row.id, []),
+                }
+                for row in partition
+            ]
+
+async def iter_ndjson(batches: AsyncIterator[list]) -> AsyncIterator[str]:
+    async for batch in batches:
+        yield "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in batch)
+
+async def iter_csv(batches: AsyncIterator[list]) -> AsyncIterator[str]:
+    """
+    CSV（ヘッダー行付き）を返す
+
+    Note:
+        - Excel で文字化けしないよう先頭に BOM を付ける
+        - コラボレーターは名前を「|」区切りで1列にまとめる
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield "\ufeff" + buffer.getvalue()
+
+    async for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for item in batch:
+            writer.writerow([
+                "|".join(user["name"] or "" for user in item["collaborators"]) if column == "collaborators"
+                else item[column]
+                for column in CSV_COLUMNS
+            ])
+        yield buffer.getvalue()
+
+def export_stream(batches: AsyncIterator[list], export_format: str) -> AsyncIterator[str]:
+    return iter_csv(batches) if export_format == "csv" else iter_ndjson(batches)
+
+async def _main(export_format: str, output: Optional[str], categories: Optional[List[str]]) -> None:
+    import sys
+    from models.database import async_engine, read_sessionmaker, replica_engine
+    # リレーションシップ解決のため関連モデルを読み込む
+    from models import profile, user_activity
+
+    exported = 0
+
+    async def counted_batches():
+        nonlocal exported
+        async for batch in export_batches(read_sessionmaker(), categories):
+            exported += len(batch)
+            yield batch
+
+    # CSV は改行コードを csv モジュールに任せるため newline="" で開く
+    out = open(output, "w", encoding="utf-8", newline="") if output else sys.stdout
+    try:
+        async for chunk in export_stream(counted_batches(), export_format):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
+        await async_engine.dispose()
+        if replica_engine is not None:
+            await replica_engine.dispose()
+    print(f"✅ {exported}件をエクスポートしました", file=sys.stderr)
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="ナレッジを NDJSON / CSV でエクスポートします")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--output", help="出力先のファイル（省略時は標準出力）")
+    parser.add_argument("--categories", help="カンマ区切りのカテゴリーで絞り込む")
+    args = parser.parse_args()
+
+    category_list = [cat.strip() for cat in args.categories.split(",")] if args.categories else None
+    asyncio.run(_main(args.format, args.output, category_list))
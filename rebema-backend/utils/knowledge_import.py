@@ -0,0 +1,255 @@
+"""
+ナレッジの一括インポート（NDJSON）
+
+    python -m utils.knowledge_import playbook.ndjson --author-email sales@example.com
+
+1行に1件のナレッジ（KnowledgeCreate と同じ項目の JSON）を記述する。
+検証に通った行を IMPORT_BATCH_SIZE 件ずつ executemany でまとめて挿入し、
+バッチごとに1回コミットする。検証・保存に失敗した行・IMPORT_MAX_LINE_BYTES を超える行は
+行番号とエラー内容を返す。
+"""
+import codecs
+import json
+from datetime import datetime
+from typing import AsyncIterator, BinaryIO, Iterable, Optional, Union
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.user import User
+from models.knowledge import Knowledge
+from models.gamification_event import GamificationEvent
+from utils.department import apply_department_delta
+from utils.cache_version import KNOWLEDGE_LIST, bump_version
+from utils.user_stats import increment_user_stats, refresh_recent_knowledge
+
+IMPORT_BATCH_SIZE = 500
+
+# レスポンスに含めるエラーの上限（件数は failed で全件分を返す）
+IMPORT_MAX_ERRORS = 1000
+
+# 1行の上限（改行を除くバイト数）。これを超える行はメモリに溜めずに読み飛ばし、エラーとして返す
+IMPORT_MAX_LINE_BYTES = 1024 * 1024
+
+# ファイルから一度に読み込むバイト数（CLI）
+_READ_CHUNK_BYTES = 64 * 1024
+
+# 1件あたりの経験値（POST /knowledge/ と同じ）
+KNOWLEDGE_XP = 10
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in item['loc']) or '(行)'}: {item['msg']}"
+        for item in error.errors()
+    )
+
+class KnowledgeImporter:
+    """
+    NDJSON の行を検証し、バッチごとに挿入する
+
+    Note:
+        - 経験値はバッチごとに件数分を合算したイベントを1件登録する
+          （アクティビティもバッチごとに1行記録される）
+        - 部署・ユーザーのナレッジ数はバッチごとに件数分をまとめて加算する
+        - バッチの保存に失敗した場合はそのバッチをロールバックし、含まれる行をエラーとして返す
+    """
+
+    def __init__(self, db: AsyncSession, author: User, schema, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.author_id = author.id
+        self.department = author.department
+        self.schema = schema
+        self.batch_size = batch_size
+        self.pending = []
+        self.lines = 0
+        self.imported = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = []
+
+    def _error(self, line: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    async def add_line(self, text: Optional[str]) -> None:
+        """1行を検証する（text が None の行は IMPORT_MAX_LINE_BYTES を超えた行）"""
+        self.lines += 1
+        line = self.lines
+        if text is None:
+            self._error(line, f"1行が長すぎます（上限 {IMPORT_MAX_LINE_BYTES} バイト）")
+            return
+        if not text.strip():
+            return
+        try:
+            data = self.schema.model_validate(json.loads(text))
+        except json.JSONDecodeError as e:
+            self._error(line, f"JSONとして解析できません: {e.msg}")
+            return
+        except ValidationError as e:
+            self._error(line, _validation_message(e))
+            return
+
+        self.pending.append((line, data))
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        now = datetime.utcnow()
+        try:
+            await self.db.execute(insert(Knowledge), [
+                {
+                    "title": data.title,
+                    "method": data.method,
+                    "target": data.target,
+                    "description": data.description,
+                    "category": data.category,
+                    "author_id": self.author_id,
+                    "views": 0,
+                    "created_at": now,
+                    "updated_at": now
+                }
+                for _, data in batch
+            ])
+            await self.db.execute(insert(GamificationEvent).values(
+                user_id=self.author_id,
+                action="create_knowledge",
+                xp_amount=KNOWLEDGE_XP * len(batch),
+                created_at=now
+            ))
+            await increment_user_stats(self.db, self.author_id, knowledge=len(batch))
+            await apply_department_delta(self.db, self.department, knowledge=len(batch))
+            await self.db.commit()
+        except SQLAlchemyError as e:
+            await self.db.rollback()
+            print(f"ナレッジ一括インポートエラー: {str(e)}")
+            for line, _ in batch:
+                self._error(line, "保存に失敗しました")
+            return
+        await bump_version(KNOWLEDGE_LIST)
+        self.imported += len(batch)
+        self.batches += 1
+
+    async def finish(self) -> dict:
+        await self.flush()
+        if self.imported:
+            await refresh_recent_knowledge(self.db, self.author_id)
+            await self.db.commit()
+        return {
+            "lines": self.lines,
+            "imported": self.imported,
+            "failed": self.failed,
+            "batches": self.batches,
+            "errors": self.errors,
+            "errorsTruncated": self.failed > len(self.errors)
+        }
+
+async def import_lines(
+    db: AsyncSession,
+    author: User,
+    lines: Union[AsyncIterator[Optional[str]], Iterable[Optional[str]]],
+    schema
+) -> dict:
+    """NDJSON の各行をインポートし、結果（件数・行ごとのエラー）を返す"""
+    importer = KnowledgeImporter(db, author, schema)
+    if hasattr(lines, "__aiter__"):
+        async for line in lines:
+            await importer.add_line(line)
+    else:
+        for line in lines:
+            await importer.add_line(line)
+    return await importer.finish()
+
+async def _skip_bom(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    # BOM がチャンクの境界で分かれていても読み飛ばせるよう、先頭の3バイトが揃うまで溜める
+    head = b""
+    async for chunk in chunks:
+        if head is None:
+            yield chunk
+            continue
+        head += chunk
+        if len(head) < len(codecs.BOM_UTF8) and codecs.BOM_UTF8.startswith(head):
+            continue
+        yield head[len(codecs.BOM_UTF8):] if head.startswith(codecs.BOM_UTF8) else head
+        head = None
+    if head:
+        yield head
+
+async def iter_request_lines(
+    chunks: AsyncIterator[bytes],
+    max_line_bytes: int = IMPORT_MAX_LINE_BYTES
+) -> AsyncIterator[Optional[str]]:
+    """
+    リクエスト本文を受信しながら1行ずつ返す（本文全体をメモリに保持しない）
+
+    Note:
+        - 先頭の UTF-8 の BOM は読み飛ばす
+        - UTF-8 として読めない行は置換文字に置き換える（JSON の解析エラーとして報告される）
+        - max_line_bytes を超える行は次の改行まで読み捨て、None を返す（保持するのは1行分まで）
+    """
+    buffer = bytearray()
+    too_long = False
+    async for chunk in _skip_bom(chunks):
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            piece = chunk[start:] if end == -1 else chunk[start:end]
+            if not too_long:
+                if len(buffer) + len(piece) > max_line_bytes:
+                    buffer.clear()
+                    too_long = True
+                else:
+                    buffer += piece
+            if end == -1:
+                break
+            yield None if too_long else buffer.decode("utf-8", errors="replace")
+            buffer.clear()
+            too_long = False
+            start = end + 1
+    if too_long:
+        yield None
+    elif buffer:
+        yield buffer.decode("utf-8", errors="replace")
+
+async def _file_chunks(f: BinaryIO) -> AsyncIterator[bytes]:
+    while chunk := f.read(_READ_CHUNK_BYTES):
+        yield chunk
+
+async def _main(path: str, author_email: str) -> int:
+    from sqlalchemy import select
+    from models.database import AsyncSessionLocal, async_engine
+    # リレーションシップ解決のため関連モデルを読み込む
+    from models import comment, file, knowledge_collaborator, profile, user_activity
+    from routers.knowledge import KnowledgeCreate
+
+    try:
+        async with AsyncSessionLocal() as db:
+            author = (await db.execute(select(User).where(User.email == author_email))).scalars().first()
+            if author is None:
+                print(f"❌ ユーザーが見つかりません: {author_email}")
+                return 1
+            with open(path, "rb") as f:
+                result = await import_lines(db, author, iter_request_lines(_file_chunks(f)), KnowledgeCreate)
+    finally:
+        await async_engine.dispose()
+
+    print(f"✅ {result['imported']}件をインポートしました（{result['batches']}バッチ・失敗 {result['failed']}件）")
+    for error in result["errors"]:
+        print(f"  {error['line']}行目: {error['error']}")
+    return 1 if result["failed"] else 0
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    import sys
+
+    parser = argparse.ArgumentParser(description="NDJSON からナレッジを一括インポートします")
+    parser.add_argument("path", help="NDJSON ファイル（1行に1件）")
+    parser.add_argument("--author-email", required=True, help="投稿者にするユーザーのメールアドレス")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_main(args.path, args.author_email)))
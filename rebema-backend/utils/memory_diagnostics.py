@@ -0,0 +1,315 @@
+"""
+ワーカーのメモリ診断（RSS・GC・tracemalloc）
+
+診断が有効な間、gunicorn の各ワーカーは MEMORY_REPORT_INTERVAL_SECONDS ごとに
+    - 自身の RSS・GC の状態を RUNTIME_DIR/memory/workers/<pid>.json に書き出し
+    - 実行時フラグに合わせて tracemalloc を開始・停止し
+    - スナップショットの要求があれば RUNTIME_DIR/memory/snapshots/<名前>/<pid>.snapshot に保存する
+ため、/debug/memory のリクエストがどのワーカーに届いても全ワーカーの状態を確認できる。
+
+診断の有効・無効は実行時フラグ（既定値は MEMORY_DIAGNOSTICS_ENABLED）で切り替える。
+書き出しを行うバックグラウンドタスクは、有効な場合のみワーカーの起動時・/debug/memory の
+リクエストを処理した時に開始し、無効になると tracemalloc を停止して終了する。
+"""
+import asyncio
+import gc
+import json
+import os
+import re
+import resource
+import shutil
+import tracemalloc
+from datetime import datetime
+from typing import Optional
+
+from core.config import settings
+from utils.runtime_flags import get_bool_flag, get_flag, set_flag
+
+# 実行時フラグ名（RUNTIME_DIR/flags/ 配下）
+DIAGNOSTICS_FLAG = "memory_diagnostics"   # 診断の有効・無効（"on" / "off"）
+TRACEMALLOC_FLAG = "tracemalloc_frames"   # 記録するフレーム数（未設定なら停止）
+SNAPSHOT_FLAG = "memory_snapshot"         # 最後に要求されたスナップショットの名前
+
+_SNAPSHOT_NAME = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+
+# スナップショットから除外する（計測自体のメモリ）
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+_last_snapshot = None
+_reporter_stop: Optional[asyncio.Event] = None
+_reporter_task: Optional[asyncio.Task] = None
+
+def _memory_dir(*parts: str) -> str:
+    return os.path.join(settings.RUNTIME_DIR, "memory", *parts)
+
+def valid_snapshot_name(name: str) -> bool:
+    return bool(_SNAPSHOT_NAME.match(name))
+
+def _rss_bytes() -> Optional[int]:
+    """現在の RSS（/proc が読めない環境では None）"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def worker_status() -> dict:
+    """このワーカーのメモリ・GC・tracemalloc の状態"""
+    status = {
+        "pid": os.getpid(),
+        "rssBytes": _rss_bytes(),
+        # Linux の ru_maxrss は KB 単位
+        "peakRssBytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "gc": {
+            "counts": list(gc.get_count()),
+            "thresholds": list(gc.get_threshold()),
+            "generations": gc.get_stats(),
+            "garbage": len(gc.garbage),
+        },
+        "tracemalloc": {"tracing": tracemalloc.is_tracing()},
+        "updatedAt": datetime.utcnow().isoformat(),
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        status["tracemalloc"].update({
+            "frames": tracemalloc.get_traceback_limit(),
+            "tracedBytes": current,
+            "peakTracedBytes": peak,
+            "overheadBytes": tracemalloc.get_tracemalloc_memory(),
+        })
+    return status
+
+def _write_json(path: str, data: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def all_worker_status() -> list:
+    """
+    全ワーカーの状態（各ワーカーが最後に書き出したもの）
+
+    Note:
+        - 終了したワーカーのファイルは削除する
+    """
+    directory = _memory_dir("workers")
+    if not os.path.isdir(directory):
+        return []
+    workers = []
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(".json"):
+            continue
+        pid = int(entry.name[:-len(".json")])
+        if not _pid_alive(pid):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(entry.path, encoding="utf-8") as f:
+                workers.append(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+    return sorted(workers, key=lambda worker: worker["pid"])
+
+def diagnostics_enabled() -> bool:
+    return get_bool_flag(DIAGNOSTICS_FLAG, settings.MEMORY_DIAGNOSTICS_ENABLED)
+
+def set_diagnostics_enabled(enabled: bool) -> None:
+    """全ワーカーの診断を切り替える（実行時フラグに保存する）"""
+    set_flag(DIAGNOSTICS_FLAG, "on" if enabled else "off")
+
+def set_tracemalloc(frames: Optional[int]) -> None:
+    """全ワーカーの tracemalloc を開始（frames: 記録するフレーム数）・停止（None）する"""
+    set_flag(TRACEMALLOC_FLAG, None if frames is None else str(frames))
+
+def request_snapshot() -> str:
+    """
+    全ワーカーにスナップショットの保存を要求し、その名前を返す
+
+    Note:
+        - 保存済みのスナップショットは新しいものから MEMORY_MAX_SNAPSHOTS 件まで残す
+    """
+    name = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    for snapshot in list_snapshots()[max(0, settings.MEMORY_MAX_SNAPSHOTS - 1):]:
+        shutil.rmtree(_memory_dir("snapshots", snapshot["name"]), ignore_errors=True)
+    set_flag(SNAPSHOT_FLAG, name)
+    return name
+
+def _apply_tracemalloc_flag() -> None:
+    value = get_flag(TRACEMALLOC_FLAG)
+    frames = int(value) if value and value.isdigit() else None
+    if frames is None:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            print(f"tracemalloc を停止しました（pid={os.getpid()}）")
+        return
+    if tracemalloc.is_tracing() and tracemalloc.get_traceback_limit() == frames:
+        return
+    # フレーム数を変更する場合は開始し直す（それまでの記録は破棄される）
+    tracemalloc.stop()
+    tracemalloc.start(frames)
+    print(f"tracemalloc を開始しました（pid={os.getpid()}, frames={frames}）")
+
+def _take_snapshot(name: str) -> None:
+    path = _memory_dir("snapshots", name, f"{os.getpid()}.snapshot")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+    # 他のワーカーが書き込み途中のファイルを読まないよう、一時ファイルから置き換える
+    snapshot.dump(f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+
+async def sync_worker() -> None:
+    """
+    実行時フラグをこのワーカーに反映し、状態を書き出す
+
+    Note:
+        - スナップショットの取得・保存はイベントループを止めないよう別スレッドで行う
+    """
+    global _last_snapshot
+    _apply_tracemalloc_flag()
+
+    name = get_flag(SNAPSHOT_FLAG)
+    if name and name != _last_snapshot and valid_snapshot_name(name):
+        _last_snapshot = name
+        if tracemalloc.is_tracing():
+            await asyncio.to_thread(_take_snapshot, name)
+
+    _write_json(_memory_dir("workers", f"{os.getpid()}.json"), worker_status())
+
+async def run_memory_reporter(stop: asyncio.Event) -> None:
+    """
+    MEMORY_REPORT_INTERVAL_SECONDS ごとに sync_worker を実行するバックグラウンドタスク
+
+    Note:
+        - 診断が無効になった場合は tracemalloc を停止して終了する
+    """
+    while not stop.is_set():
+        if not diagnostics_enabled():
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+                print(f"tracemalloc を停止しました（pid={os.getpid()}）")
+            return
+        try:
+            await sync_worker()
+        except Exception as e:
+            print(f"メモリ診断の更新エラー: {str(e)}")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=settings.MEMORY_REPORT_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+def start_reporter() -> bool:
+    """
+    診断が有効で、このワーカーの run_memory_reporter が動いていなければ開始する
+
+    Returns:
+        bool: 診断が有効かどうか
+    """
+    global _reporter_stop, _reporter_task
+    if not diagnostics_enabled():
+        return False
+    if _reporter_task is None or _reporter_task.done():
+        _reporter_stop = asyncio.Event()
+        _reporter_task = asyncio.create_task(run_memory_reporter(_reporter_stop))
+    return True
+
+async def stop_reporter() -> None:
+    """ワーカーの終了時に run_memory_reporter を止める"""
+    global _reporter_stop, _reporter_task
+    if _reporter_task is None:
+        return
+    _reporter_stop.set()
+    await _reporter_task
+    _reporter_stop = None
+    _reporter_task = None
+
+def list_snapshots() -> list:
+    """保存済みのスナップショット（名前と保存したワーカー）"""
+    directory = _memory_dir("snapshots")
+    if not os.path.isdir(directory):
+        return []
+    snapshots = []
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name, reverse=True):
+        if entry.is_dir() and valid_snapshot_name(entry.name):
+            pids = sorted(int(f.name.split(".")[0]) for f in os.scandir(entry.path) if f.name.endswith(".snapshot"))
+            snapshots.append({"name": entry.name, "pids": pids})
+    return snapshots
+
+def _load_snapshots(name: str) -> dict:
+    directory = _memory_dir("snapshots", name)
+    if not valid_snapshot_name(name) or not os.path.isdir(directory):
+        return {}
+    return {
+        int(entry.name.split(".")[0]): tracemalloc.Snapshot.load(entry.path)
+        for entry in os.scandir(directory)
+        if entry.name.endswith(".snapshot")
+    }
+
+def _stat_dict(stat, group_by: str) -> dict:
+    result = {
+        "size": stat.size,
+        "count": stat.count,
+        "traceback": stat.traceback.format() if group_by == "traceback" else [str(stat.traceback[0])],
+    }
+    if hasattr(stat, "size_diff"):
+        result["sizeDiff"] = stat.size_diff
+        result["countDiff"] = stat.count_diff
+    return result
+
+def top_allocations(name: str, group_by: str = "lineno", limit: int = 20) -> Optional[dict]:
+    """
+    スナップショットの確保量の多い箇所（ワーカーごと）
+
+    Returns:
+        Optional[dict]: pid ごとの上位 limit 件（スナップショットがない場合は None）
+    """
+    snapshots = _load_snapshots(name)
+    if not snapshots:
+        return None
+    return {
+        str(pid): {
+            "totalBytes": sum(stat.size for stat in snapshot.statistics("filename")),
+            "top": [_stat_dict(stat, group_by) for stat in snapshot.statistics(group_by)[:limit]],
+        }
+        for pid, snapshot in sorted(snapshots.items())
+    }
+
+def diff_allocations(name: str, base: str, group_by: str = "lineno", limit: int = 20) -> Optional[dict]:
+    """
+    2つのスナップショットの差分（増加量の多い順。両方に存在するワーカーのみ）
+
+    Returns:
+        Optional[dict]: pid ごとの上位 limit 件（比較できるワーカーがない場合は None）
+    """
+    current = _load_snapshots(name)
+    previous = _load_snapshots(base)
+    pids = sorted(set(current) & set(previous))
+    if not pids:
+        return None
+    result = {}
+    for pid in pids:
+        stats = current[pid].compare_to(previous[pid], group_by)
+        result[str(pid)] = {
+            "totalDiffBytes": sum(stat.size_diff for stat in stats),
+            "top": [_stat_dict(stat, group_by) for stat in stats[:limit]],
+        }
+    return result
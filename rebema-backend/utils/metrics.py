@@ -0,0 +1,185 @@
+"""
+Prometheus 形式のメトリクス
+
+gunicorn で複数ワーカーを起動する場合は PROMETHEUS_MULTIPROC_DIR（gunicorn.conf.py で設定）に
+各ワーカーが値を書き出し、/metrics はそのディレクトリを集計して返す。
+PROMETHEUS_MULTIPROC_DIR は prometheus_client のインポート前に設定されている必要がある。
+"""
+import os
+import threading
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "リクエストの処理時間（ルートのテンプレートごと）",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "処理中のリクエスト数",
+    multiprocess_mode="livesum"
+)
+
+DB_POOL_SIZE = Gauge("db_pool_size", "コネクションプールのサイズ", ["database"], multiprocess_mode="livesum")
+DB_POOL_IN_USE = Gauge("db_pool_connections_in_use", "使用中のコネクション数", ["database"], multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "プールサイズを超えて作成したコネクション数", ["database"], multiprocess_mode="livesum")
+DB_POOL_CHECKOUTS = Counter("db_pool_checkouts", "プールからのコネクション取得回数", ["database"])
+DB_POOL_CHECKOUT_FAILURES = Counter("db_pool_checkout_failures", "コネクション取得の失敗回数（タイムアウトなど）", ["database"])
+DB_POOL_WAIT_SECONDS = Counter("db_pool_checkout_wait_seconds", "コネクション取得の待ち時間の合計", ["database"])
+
+COMMENT_STREAM_CONNECTIONS = Gauge(
+    "comment_stream_connections",
+    "コメントのリアルタイム配信（SSE）の接続数",
+    multiprocess_mode="livesum"
+)
+
+CACHE_REQUESTS = Counter(
+    "cache_requests",
+    "キャッシュの参照回数（result は hit / miss）",
+    ["cache", "result"]
+)
+UPLOAD_SIZE = Histogram(
+    "upload_size_bytes",
+    "アップロードされたファイルのサイズ",
+    ["kind"],
+    buckets=(10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000)
+)
+
+def record_cache(cache: str, hit: bool) -> None:
+    """キャッシュの参照結果を記録する（ヒット率は hit / (hit + miss) で求める）"""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+def record_upload(kind: str, size: int) -> None:
+    """アップロードされたファイルのサイズを記録する"""
+    UPLOAD_SIZE.labels(kind=kind).observe(size)
+
+_pool_lock = threading.Lock()
+# データベース（primary / replica）ごとの前回の累計値
+_last_pool_stats = {}
+
+def _pool_gauges(database: str, status: dict) -> None:
+    if "inUse" not in status:
+        return
+    DB_POOL_SIZE.labels(database=database).set(status["size"])
+    DB_POOL_IN_USE.labels(database=database).set(status["inUse"])
+    DB_POOL_OVERFLOW.labels(database=database).set(status["overflow"])
+
+def _pool_counters(database: str, status: dict) -> None:
+    if "checkouts" not in status:
+        return
+    with _pool_lock:
+        last = _last_pool_stats.setdefault(database, {"checkouts": 0, "failures": 0, "waitSecondsTotal": 0.0})
+        checkouts = status["checkouts"] - last["checkouts"]
+        failures = status["failures"] - last["failures"]
+        wait = status["waitSecondsTotal"] - last["waitSecondsTotal"]
+        last.update({
+            "checkouts": status["checkouts"],
+            "failures": status["failures"],
+            "waitSecondsTotal": status["waitSecondsTotal"]
+        })
+    if checkouts > 0:
+        DB_POOL_CHECKOUTS.labels(database=database).inc(checkouts)
+    if failures > 0:
+        DB_POOL_CHECKOUT_FAILURES.labels(database=database).inc(failures)
+    if wait > 0:
+        DB_POOL_WAIT_SECONDS.labels(database=database).inc(wait)
+
+def update_pool_metrics() -> None:
+    """
+    このワーカーのコネクションプールの状態をメトリクスに反映する
+
+    Note:
+        - プライマリ・レプリカを database ラベルで区別する
+        - 待ち時間などの累計値は前回からの差分を Counter に加算する
+        - 各ワーカーがリクエストの終了時に呼び出す（ワーカー間の合計は /metrics で集計される）
+    """
+    from models.database import get_pool_status
+    status = get_pool_status()
+    _pool_gauges("primary", status)
+    _pool_counters("primary", status)
+    if "replica" in status:
+        _pool_gauges("replica", status["replica"])
+        _pool_counters("replica", status["replica"])
+
+def render_metrics() -> tuple[bytes, str]:
+    """/metrics のレスポンス本文とContent-Typeを返す（マルチプロセス時は全ワーカー分を集計）"""
+    update_pool_metrics()
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def is_event_stream(message) -> bool:
+    """レスポンスの開始（http.response.start）が Server-Sent Events の配信かどうか"""
+    for name, value in message.get("headers", ()):
+        if name.lower() == b"content-type":
+            return value.split(b";")[0].strip().lower() == b"text/event-stream"
+    return False
+
+class MetricsMiddleware:
+    """
+    リクエストの処理時間・処理中のリクエスト数を記録するミドルウェア
+
+    Note:
+        - ラベルにはURLではなくルートのテンプレート（例: /knowledge/{knowledge_id}）を使い、系列数を抑える
+        - どのルートにも一致しないリクエストは route="unmatched" にまとめる
+        - Server-Sent Events の配信はヘッダーの送信までを記録する
+          （接続中ずっと処理中に数えると、処理中のリクエスト数と処理時間の分布が実態とずれるため。
+            接続数は comment_stream_connections で確認する）
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            REQUESTS_IN_PROGRESS.dec()
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code)
+            ).observe(time.perf_counter() - start)
+            update_pool_metrics()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if is_event_stream(message):
+                    finish()
+            await send(message)
+
+        REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            finish()
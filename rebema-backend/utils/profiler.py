@@ -0,0 +1,231 @@
+"""
+リクエスト単位のサンプリングプロファイラ
+
+対象のリクエストを処理している間、別スレッドからイベントループのスレッドのスタックを
+PROFILER_INTERVAL_SECONDS ごとに取得し、flamegraph.pl / speedscope で読める
+folded 形式（"関数;関数;関数 サンプル数"）で RUNTIME_DIR/profiles に保存する。
+
+計測するリクエスト:
+    - X-Profile: 1 と正しい X-Admin-Key ヘッダーが付いたリクエスト
+    - 実行時フラグ（未設定時は PROFILER_SAMPLE_RATE）の割合で無作為に選んだリクエスト
+
+Note:
+    - 計測したリクエストのレスポンスには X-Profile-Id ヘッダーを付ける（/debug/profiles/{id} で取得）
+    - イベントループは同時に複数のリクエストを処理するため、他のリクエストのサンプルも含まれる
+    - DBの応答待ちなどでループが待機している間は selectors の select がスタックの末端になる
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from starlette.datastructures import MutableHeaders
+
+from core.config import settings
+from core.security import is_admin_key
+from utils.metrics import is_event_stream
+from utils.runtime_flags import get_flag, set_flag
+
+# 実行時フラグ名（RUNTIME_DIR/flags/ 配下）
+SAMPLE_RATE_FLAG = "profiler_sample_rate"
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def profiles_dir() -> str:
+    return os.path.join(settings.RUNTIME_DIR, "profiles")
+
+def sample_rate() -> float:
+    value = get_flag(SAMPLE_RATE_FLAG)
+    if value is None:
+        return settings.PROFILER_SAMPLE_RATE
+    try:
+        return float(value)
+    except ValueError:
+        return settings.PROFILER_SAMPLE_RATE
+
+def set_sample_rate(rate: Optional[float]) -> None:
+    """全ワーカーのサンプリング率を切り替える（None の場合は PROFILER_SAMPLE_RATE に戻す）"""
+    set_flag(SAMPLE_RATE_FLAG, None if rate is None else str(rate))
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_APP_DIR):
+        filename = os.path.relpath(filename, _APP_DIR)
+    else:
+        # site-packages などは末尾の「パッケージ/ファイル」だけにする
+        filename = "/".join(filename.split(os.sep)[-2:])
+    return f"{code.co_name} ({filename})"
+
+class StackSampler:
+    """指定したスレッドのスタックを一定間隔で取得し、folded 形式で集計する"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.reverse()
+            self.stacks[";".join(labels)] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+def save_profile(profile_id: str, sampler: StackSampler, metadata: dict) -> None:
+    """
+    プロファイルを保存し、古いものを PROFILER_MAX_PROFILES 件まで削除する
+
+    Note:
+        - <id>.folded にスタック、<id>.json にリクエストの情報を保存する
+    """
+    directory = profiles_dir()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{profile_id}.folded"), "w", encoding="utf-8") as f:
+        f.write(sampler.folded())
+    with open(os.path.join(directory, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False)
+
+    entries = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in entries[:max(0, len(entries) - settings.PROFILER_MAX_PROFILES)]:
+        for suffix in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(directory, entry.name[:-len(".json")] + suffix))
+            except FileNotFoundError:
+                pass
+
+def list_profiles(limit: int = 50) -> list:
+    """保存済みのプロファイルの情報（新しい順）"""
+    directory = profiles_dir()
+    if not os.path.isdir(directory):
+        return []
+    entries = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(".json")),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True
+    )
+    profiles = []
+    for entry in entries[:limit]:
+        try:
+            with open(entry.path, encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            # 別のワーカーが書き込み中・削除済みのもの
+            continue
+    return profiles
+
+def read_profile(profile_id: str) -> Optional[str]:
+    """folded 形式のプロファイル（存在しない場合は None）"""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(profiles_dir(), f"{profile_id}.folded"), encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def _should_profile(scope) -> Optional[str]:
+    """計測する場合はその理由（"header" / "sampled"）を返す"""
+    headers = dict(scope["headers"])
+    if headers.get(b"x-profile") == b"1":
+        admin_key = headers.get(b"x-admin-key")
+        if admin_key is not None and is_admin_key(admin_key.decode("latin-1")):
+            return "header"
+    rate = sample_rate()
+    if rate > 0 and random.random() < rate:
+        return "sampled"
+    return None
+
+class ProfilerMiddleware:
+    """
+    対象のリクエストをサンプリングプロファイラで計測するミドルウェア
+
+    Note:
+        - 計測しないリクエストではサンプリング率の確認（キャッシュ済みの実行時フラグ）以外は何もしない
+        - レスポンス本文の送信（JSONエンコード後の書き込み）が終わるまでを計測する
+        - Server-Sent Events の配信はヘッダーの送信までを計測する（接続中の待機を計測し続けないため）
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        reason = _should_profile(scope)
+        if reason is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        status_code = 500
+        sampler = StackSampler(threading.get_ident(), settings.PROFILER_INTERVAL_SECONDS)
+        start = time.perf_counter()
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            sampler.stop()
+            route = scope.get("route")
+            save_profile(profile_id, sampler, {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": getattr(route, "path", None),
+                "status": status_code,
+                "reason": reason,
+                "durationMs": round((time.perf_counter() - start) * 1000, 1),
+                "samples": sampler.samples,
+                "intervalMs": settings.PROFILER_INTERVAL_SECONDS * 1000,
+                "pid": os.getpid(),
+                "createdAt": datetime.utcnow().isoformat()
+            })
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+                if is_event_stream(message):
+                    finish()
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            finish()
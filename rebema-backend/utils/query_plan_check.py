@@ -0,0 +1,293 @@
+"""
+ホットパスのエンドポイントが実行するクエリを EXPLAIN し、フルスキャンや filesort に
+退行していないかを確認する
+
+エンドポイントを実際に呼び出し、ルーターが実行した SELECT 文をそのまま EXPLAIN する
+（クエリの形を別に書き写さないため、ルーターの変更がそのまま検証対象になる）。
+テスト（tests/test_query_plans.py）から SQLite で実行するほか、MySQL では次のように実行する。
+
+    ASYNC_DATABASE_URL=mysql+aiomysql://... python -m utils.query_plan_check --seed
+
+いずれかのクエリが退行している場合は終了コード 1 を返す。
+
+Note:
+    - 閲覧数の加算など、エンドポイントの書き込みもそのまま行われるため、検証用のDBで実行する
+"""
+import argparse
+import random
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from sqlalchemy import event, func, select, text, insert
+
+from models.database import Base
+# テーブル作成のため全モデルを読み込む
+from models.user import User
+from models.knowledge import Knowledge
+from models.file import File
+from models.comment import Comment
+from models.knowledge_collaborator import KnowledgeCollaborator
+from models.user_activity import UserActivity
+from models.user_activity_daily import UserActivityDaily
+from models.profile import Profile
+from models.department_stats import DepartmentStats
+from models.gamification_event import GamificationEvent
+from models.gamification_dead_letter import GamificationDeadLetter
+from models.user_stats import UserStats
+from models.cache_version import CacheVersion
+
+# (名前, URL, filesort を許容するか, フルスキャンを許容するテーブル)
+# URL の {user_id} {knowledge_id} {department} は pick_sample で選んだ値に置き換える
+HOT_ENDPOINTS = [
+    ("list_knowledge (created_at)", "/knowledge/", False, ()),
+    ("list_knowledge (views)", "/knowledge/?sort_by=views", False, ()),
+    ("list_knowledge (title)", "/knowledge/?sort_by=title&sort_order=asc", False, ()),
+    ("list_knowledge (category)", "/knowledge/?categories={category}", False, ()),
+    ("get_knowledge", "/knowledge/{knowledge_id}", False, ()),
+    ("get_knowledge_batch", "/knowledge/batch?ids={knowledge_id}", False, ()),
+    ("list_comments", "/knowledge/{knowledge_id}/comments", False, ()),
+    ("list_comments (before)", "/knowledge/{knowledge_id}/comments?before={comment_id}", False, ()),
+    ("ranking level", "/ranking/ranking/level", False, ()),
+    ("ranking points", "/ranking/ranking/points", False, ()),
+    ("ranking level (department)", "/ranking/ranking/level?department={department}", False, ()),
+    ("ranking points (department)", "/ranking/ranking/points?department={department}", False, ()),
+    # 集計値での並び替えは filesort が避けられないため許容する
+    ("ranking activity (week)", "/ranking/ranking/activity?period=week", True, ()),
+    ("ranking departments", "/ranking/ranking/departments", True, ("department_stats",)),
+    # 全ユーザーの順位を求めるため users の全件読み込みと並び替えは避けられない
+    ("ranking me", "/ranking/ranking/me?around=2", True, ("users",)),
+    ("profile", "/profile/profile/{user_id}", False, ()),
+    ("profile batch", "/profile/profile/batch?ids={user_id}", False, ()),
+]
+
+def _plan_problems(dialect_name: str, rows, allow_filesort: bool, allow_scan=()) -> list:
+    """EXPLAIN の結果からフルスキャン・filesort を検出する"""
+    tables = set(Base.metadata.tables) - set(allow_scan)
+    problems = []
+
+    if dialect_name == "sqlite":
+        for row in rows:
+            detail = row._mapping["detail"]
+            words = detail.split()
+            if words[0] == "SCAN" and len(words) > 1 and words[1] in tables and "USING" not in words:
+                problems.append(f"フルスキャン: {detail}")
+            if "USE TEMP B-TREE FOR ORDER BY" in detail and not allow_filesort:
+                problems.append(f"filesort: {detail}")
+        return problems
+
+    for row in rows:
+        mapping = row._mapping
+        table = mapping.get("table") or ""
+        extra = mapping.get("Extra") or ""
+        if mapping.get("type") == "ALL" and table in tables:
+            problems.append(f"フルスキャン: table={table} rows={mapping.get('rows')}")
+        if "Using filesort" in extra and not allow_filesort:
+            problems.append(f"filesort: table={table} extra={extra}")
+    return problems
+
+def explain_problems(connection, statement: str, parameters, allow_filesort: bool = False, allow_scan=()) -> list:
+    """実行された SQL 文を同じパラメーターで EXPLAIN し、問題を返す"""
+    prefix = "EXPLAIN QUERY PLAN" if connection.dialect.name == "sqlite" else "EXPLAIN"
+    rows = connection.exec_driver_sql(f"{prefix} {statement}", parameters).all()
+    return _plan_problems(connection.dialect.name, rows, allow_filesort, allow_scan)
+
+@contextmanager
+def capture_queries(engine) -> Iterator[list]:
+    """engine で実行された SELECT 文を (SQL, パラメーター) のリストに記録する"""
+    captured = []
+
+    def on_execute(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+
+def seed(engine, users: int = 500, knowledge: int = 5000, comments: int = 20000) -> None:
+    """検証用のデータを一括投入する（オプティマイザが索引を選ぶ程度の件数）"""
+    Base.metadata.create_all(bind=engine)
+    departments = ["営業部", "開発部", "人事部", "マーケティング部", "経理部"]
+    categories = ["メール", "電話", "訪問", "その他"]
+    now = datetime.utcnow()
+    rng = random.Random(0)
+
+    with engine.begin() as connection:
+        start = (connection.execute(select(func.max(User.id))).scalar() or 0) + 1
+        user_ids = list(range(start, start + users))
+        connection.execute(insert(User), [
+            {
+                "id": uid,
+                "email": f"plan-check-{uid}@example.com",
+                "username": f"plan-check-{uid}",
+                "level": rng.randint(1, 50),
+                "points": rng.randint(0, 5000),
+                "current_xp": 0,
+                "experience_points": rng.randint(0, 5000),
+                "department": rng.choice(departments),
+                "created_at": now,
+            }
+            for uid in user_ids
+        ])
+
+        start = (connection.execute(select(func.max(Knowledge.id))).scalar() or 0) + 1
+        knowledge_ids = list(range(start, start + knowledge))
+        connection.execute(insert(Knowledge), [
+            {
+                "id": kid,
+                "title": f"ナレッジ {kid}",
+                "method": "方法",
+                "target": "対象",
+                "description": "説明",
+                "category": rng.choice(categories),
+                "views": rng.randint(0, 1000),
+                "author_id": rng.choice(user_ids),
+                "created_at": now - timedelta(minutes=rng.randint(0, 525600)),
+                "updated_at": now,
+            }
+            for kid in knowledge_ids
+        ])
+
+        connection.execute(insert(Comment), [
+            {
+                "knowledge_id": rng.choice(knowledge_ids),
+                "content": "コメント",
+                "author_id": rng.choice(user_ids),
+                "created_at": now - timedelta(minutes=rng.randint(0, 525600)),
+            }
+            for _ in range(comments)
+        ])
+
+        connection.execute(insert(File), [
+            {
+                "knowledge_id": rng.choice(knowledge_ids),
+                "file_name": "sample.txt",
+                "content_type": "text/plain",
+                "file_data": b"",
+                "uploaded_at": now,
+            }
+            for _ in range(knowledge // 2)
+        ])
+
+        connection.execute(insert(UserActivity), [
+            {
+                "user_id": rng.choice(user_ids),
+                "action": "comment",
+                "xp_amount": 10,
+                "timestamp": now - timedelta(days=rng.randint(0, 60)),
+            }
+            for _ in range(comments)
+        ])
+
+        daily = {}
+        for _ in range(comments):
+            key = (rng.choice(user_ids), (now - timedelta(days=rng.randint(0, 60))).date(), "comment")
+            daily[key] = daily.get(key, 0) + 1
+        connection.execute(insert(UserActivityDaily), [
+            {"user_id": uid, "day": day, "action": action, "activity_count": count, "xp_amount": count * 10}
+            for (uid, day, action), count in daily.items()
+        ])
+
+        # 統計情報を更新してオプティマイザに件数を認識させる
+        if engine.dialect.name == "mysql":
+            connection.execute(text(
+                "ANALYZE TABLE users, knowledges, comments, files, user_activities, user_activity_daily"
+            ))
+        elif engine.dialect.name == "sqlite":
+            connection.execute(text("ANALYZE"))
+
+def pick_sample(connection) -> dict:
+    """URL に埋め込むパラメーター（実在するID）を選ぶ"""
+    knowledge_id = connection.execute(
+        select(Comment.knowledge_id).group_by(Comment.knowledge_id)
+        .order_by(func.count(Comment.id).desc()).limit(1)
+    ).scalar() or 1
+    return {
+        "user_id": connection.execute(select(func.min(Knowledge.author_id))).scalar() or 1,
+        "knowledge_id": knowledge_id,
+        "comment_id": connection.execute(
+            select(func.max(Comment.id)).where(Comment.knowledge_id == knowledge_id)
+        ).scalar() or 1,
+        "category": connection.execute(
+            select(Knowledge.category).where(Knowledge.category.isnot(None)).limit(1)
+        ).scalar() or "その他",
+        "department": connection.execute(
+            select(User.department).where(User.department.isnot(None)).limit(1)
+        ).scalar() or "所属なし",
+    }
+
+def endpoint_query_plans(client, engine, sample: dict, endpoints=HOT_ENDPOINTS) -> list:
+    """
+    エンドポイントを呼び出し、実行された SELECT 文ごとの EXPLAIN の問題を返す
+
+    Args:
+        client: アプリの TestClient（ログイン済み）
+        engine: EXPLAIN を実行する同期エンジン（アプリと同じDB）
+        sample (dict): pick_sample の結果
+
+    Returns:
+        list: (名前, ステータスコード, [(SQL, 問題のリスト)]) のリスト
+    """
+    from models.database import async_engine
+
+    results = []
+    for name, url, allow_filesort, allow_scan in endpoints:
+        with capture_queries(async_engine.sync_engine) as captured:
+            response = client.get(url.format(**sample))
+        with engine.connect() as connection:
+            plans = [
+                (statement, explain_problems(connection, statement, parameters, allow_filesort, allow_scan))
+                for statement, parameters in captured
+            ]
+        results.append((name, response.status_code, plans))
+    return results
+
+def check_query_plans(engine) -> bool:
+    from fastapi.testclient import TestClient
+    from core.security import get_current_user
+    from main import app
+
+    with engine.connect() as connection:
+        sample = pick_sample(connection)
+
+    async def sample_user():
+        from models.database import AsyncSessionLocal
+        async with AsyncSessionLocal() as db:
+            return await db.get(User, sample["user_id"])
+    app.dependency_overrides[get_current_user] = sample_user
+
+    failed = 0
+    with TestClient(app) as client:
+        for name, status_code, plans in endpoint_query_plans(client, engine, sample):
+            problems = [problem for _, statement_problems in plans for problem in statement_problems]
+            if status_code != 200:
+                problems.append(f"ステータスコード {status_code}")
+            if problems:
+                failed += 1
+                print(f"❌ {name}")
+                for problem in problems:
+                    print(f"    {problem}")
+            else:
+                print(f"✅ {name}（{len(plans)}クエリ）")
+
+    if failed:
+        print(f"❌ {failed}件のエンドポイントのクエリがフルスキャンまたは filesort に退行しています")
+        return False
+    print("✅ すべてのホットパスのクエリがインデックスを使用しています")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ホットパスのエンドポイントのクエリプランを検証します")
+    parser.add_argument("--seed", action="store_true", help="検証用データを投入してから実行する")
+    args = parser.parse_args()
+
+    from models.database import engine as target_engine
+
+    if args.seed:
+        seed(target_engine)
+
+    sys.exit(0 if check_query_plans(target_engine) else 1)
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from core.config import settings
+from utils.metrics import record_cache
+
+# フラグファイルを読み直す間隔（秒）。リクエストごとにファイルを読まないようにする
+FLAG_CACHE_SECONDS = 1.0
+
+_lock = threading.Lock()
+_cache = {}
+
+def _flag_path(name: str) -> str:
+    return os.path.join(settings.RUNTIME_DIR, "flags", name)
+
+def get_flag(name: str) -> Optional[str]:
+    """
+    実行時フラグの値を取得する（未設定の場合は None）
+
+    Note:
+        - フラグは RUNTIME_DIR 配下のファイルに保存するため、全ワーカーで共有される
+        - 読み込んだ値は FLAG_CACHE_SECONDS の間キャッシュする
+    """
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(name)
+    hit = cached is not None and cached[0] > now
+    record_cache("runtime_flags", hit)
+    if hit:
+        return cached[1]
+
+    try:
+        with open(_flag_path(name), encoding="utf-8") as f:
+            value = f.read().strip()
+    except FileNotFoundError:
+        value = None
+
+    with _lock:
+        _cache[name] = (now + FLAG_CACHE_SECONDS, value)
+    return value
+
+def set_flag(name: str, value: Optional[str]) -> None:
+    """実行時フラグを保存する（None の場合は削除して既定値に戻す）"""
+    path = _flag_path(name)
+    if value is None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 読み込み中のワーカーが途中の内容を読まないよう、一時ファイルから置き換える
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+    with _lock:
+        _cache.pop(name, None)
+
+def get_bool_flag(name: str, default: bool) -> bool:
+    """"on" / "off" で保存した実行時フラグを真偽値で取得する"""
+    value = get_flag(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "on", "true", "yes")
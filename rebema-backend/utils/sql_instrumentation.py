@@ -0,0 +1,132 @@
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from core.config import settings
+from utils.runtime_flags import get_bool_flag, set_flag
+
+# 実行時フラグ名（RUNTIME_DIR/flags/ 配下）
+INSTRUMENTATION_FLAG = "sql_instrumentation"
+
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%s|:\w+)(?:\s*,\s*(?:\?|%s|:\w+))+\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_WHITESPACE = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+    """SQL文からIN句の要素数や数値リテラルの違いを取り除き、同じ形のクエリを同じ文字列にする"""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _PLACEHOLDER_LIST.sub("(?)", shape)
+    return _NUMBER.sub("?", shape)
+
+class RequestQueryStats:
+    """1リクエストで実行したSQLの件数・合計時間・形ごとの回数"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int) -> list:
+        """threshold 回を超えて実行された形と回数（N+1 の候補）"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+    def server_timing(self, total_seconds: float) -> str:
+        return (
+            f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries", '
+            f'app;dur={total_seconds * 1000:.1f}'
+        )
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+def current_query_stats() -> Optional[RequestQueryStats]:
+    """計測中のリクエストの集計（計測していない場合は None）"""
+    return _current_stats.get()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None and context is not None:
+        context._sql_instrumentation_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    start = getattr(context, "_sql_instrumentation_start", None)
+    if stats is None or start is None:
+        return
+    stats.record(statement, time.perf_counter() - start)
+
+def instrument_engine(engine) -> None:
+    """エンジンにSQL計測用のイベントを登録する（非同期エンジンは sync_engine を渡す）"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def instrument_database() -> None:
+    """APIが使うエンジン（プライマリ・レプリカ）に計測用のイベントを登録する"""
+    from models.database import async_engine, replica_engine
+    instrument_engine(async_engine.sync_engine)
+    if replica_engine is not None:
+        instrument_engine(replica_engine.sync_engine)
+
+def instrumentation_enabled() -> bool:
+    return get_bool_flag(INSTRUMENTATION_FLAG, settings.SQL_INSTRUMENTATION_ENABLED)
+
+def set_instrumentation_enabled(enabled: bool) -> None:
+    """全ワーカーの計測を切り替える（実行時フラグに保存する）"""
+    set_flag(INSTRUMENTATION_FLAG, "on" if enabled else "off")
+
+class SQLInstrumentationMiddleware:
+    """
+    リクエストごとにSQLの件数と合計時間を計測するミドルウェア
+
+    Note:
+        - 結果は Server-Timing ヘッダー（db: SQL合計時間と件数、app: 処理全体の時間）で返す
+        - 同じ形のSQLが SQL_N_PLUS_ONE_THRESHOLD 回を超えて実行された場合は N+1 の可能性として警告を出力する
+        - 計測の有効・無効は実行時フラグで切り替える（無効時は何もしない）
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not instrumentation_enabled():
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueryStats()
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing(time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
+            _warn_repeated(scope, stats)
+
+def _warn_repeated(scope, stats: RequestQueryStats) -> None:
+    threshold = settings.SQL_N_PLUS_ONE_THRESHOLD
+    repeated = stats.repeated(threshold)
+    if not repeated:
+        return
+    route = scope.get("route")
+    path = getattr(route, "path", scope.get("path"))
+    for shape, count in repeated:
+        print(
+            f"⚠️ N+1の可能性: {scope.get('method')} {path} で同じ形のSQLが{count}回実行されました"
+            f"（合計{stats.count}件）: {shape[:300]}"
+        )
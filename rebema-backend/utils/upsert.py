@@ -0,0 +1,72 @@
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+async def increment_or_insert(db: AsyncSession, model, keys: dict, increments: dict) -> None:
+    """
+    キーに一致する集計行のカラムを加算し、行が存在しなければ作成する
+
+    Args:
+        db (AsyncSession): データベースセッション
+        model: 集計テーブルのモデルクラス
+        keys (dict): 主キー（またはユニークキー）のカラムと値
+        increments (dict): 加算するカラムと加算値
+
+    Note:
+        - MySQLでは INSERT ... ON DUPLICATE KEY UPDATE を1文で実行する
+        - SQLite/PostgreSQLでは INSERT ... ON CONFLICT DO UPDATE を使用する
+        - コミットは呼び出し側で行う
+    """
+    await increment_or_insert_many(db, model, list(keys), [{**keys, **increments}])
+
+async def increment_or_insert_many(db: AsyncSession, model, key_names: list, rows: list) -> None:
+    """
+    複数の集計行をまとめて加算更新する（increment_or_insert の一括版）
+
+    Args:
+        db (AsyncSession): データベースセッション
+        model: 集計テーブルのモデルクラス
+        key_names (list): 主キー（またはユニークキー）のカラム名
+        rows (list): キーと加算値を含む辞書のリスト（すべて同じカラム構成）
+
+    Note:
+        - MySQL/SQLite/PostgreSQLでは複数行の INSERT 1文で実行する
+        - コミットは呼び出し側で行う
+    """
+    if not rows:
+        return
+
+    table = model.__table__
+    increment_names = [name for name in rows[0] if name not in key_names]
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(
+            {name: table.c[name] + stmt.inserted[name] for name in increment_names}
+        )
+        await db.execute(stmt)
+        return
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=key_names,
+            set_={name: table.c[name] + stmt.excluded[name] for name in increment_names}
+        )
+        await db.execute(stmt)
+        return
+
+    # その他のDBでは1行ずつ UPDATE → INSERT の順に試す
+    for row in rows:
+        result = await db.execute(
+            update(table)
+            .where(*[table.c[name] == row[name] for name in key_names])
+            .values({name: table.c[name] + row[name] for name in increment_names})
+        )
+        if result.rowcount == 0:
+            await db.execute(table.insert().values(**row))
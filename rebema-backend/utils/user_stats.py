@@ -0,0 +1,154 @@
+"""
+プロフィール表示用のユーザー集計（user_stats）
+
+件数（ナレッジ数・コメント数・累積PV数）は書き込みと同じトランザクションで差分を加算して維持する。
+
+Note:
+    - 既存ユーザーの行はマイグレーション（f2b6c4d1e8a3）で集計して作成済み
+    - 差分の加算は行がなければ作成する（upsert）ため、加算が失われることはない
+      （行がないユーザーはまだ書き込みがない＝件数0のため、差分がそのまま件数になる）
+    - 最近の活動（recent_*）は書き込み時に作り直す（既存の行はマイグレーション 9e2b5d7f3a18 で作成済み・
+      新しい行は空のリストで作成する）。未作成の行は取得時にその場で取得する（保存はしない）
+    - 取得（get_user_stats）は書き込みを行わないため、レプリカのセッションでも使える
+"""
+from sqlalchemy import select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.knowledge import Knowledge
+from models.comment import Comment
+from models.user_stats import UserStats
+from utils.metrics import record_cache
+from utils.formatting import format_date
+from utils.upsert import increment_or_insert
+
+# プロフィールに表示する最近の活動の件数
+RECENT_LIMIT = 5
+
+def _recent_knowledge_query(user_id: int):
+    return (
+        select(Knowledge.id, Knowledge.title, Knowledge.created_at)
+        .where(Knowledge.author_id == user_id)
+        .order_by(Knowledge.created_at.desc())
+        .limit(RECENT_LIMIT)
+    )
+
+def _recent_comments_query(user_id: int):
+    return (
+        select(Comment.id, Comment.content, Comment.knowledge_id, Comment.created_at)
+        .where(Comment.author_id == user_id)
+        .order_by(Comment.created_at.desc())
+        .limit(RECENT_LIMIT)
+    )
+
+def _knowledge_items(rows) -> list:
+    return [
+        {
+            "id": k.id,
+            "title": k.title,
+            "createdAt": format_date(k.created_at)
+        } for k in rows
+    ]
+
+def _comment_items(rows) -> list:
+    return [
+        {
+            "id": c.id,
+            "content": c.content,
+            "knowledgeId": c.knowledge_id,
+            "createdAt": format_date(c.created_at)
+        } for c in rows
+    ]
+
+async def _recent_knowledge(db: AsyncSession, user_id: int) -> list:
+    return _knowledge_items((await db.execute(_recent_knowledge_query(user_id))).all())
+
+async def _recent_comments(db: AsyncSession, user_id: int) -> list:
+    return _comment_items((await db.execute(_recent_comments_query(user_id))).all())
+
+def backfill_recent_activity(connection: Connection) -> int:
+    """
+    最近の活動が未作成の統計行を埋める（マイグレーション・ベンチマークのデータ投入用の同期処理）
+
+    Returns:
+        int: 埋めた行数
+    """
+    user_ids = connection.execute(
+        select(UserStats.user_id)
+        .where(UserStats.recent_knowledge.is_(None) | UserStats.recent_comments.is_(None))
+    ).scalars().all()
+    for user_id in user_ids:
+        connection.execute(
+            update(UserStats)
+            .where(UserStats.user_id == user_id)
+            .values(
+                recent_knowledge=_knowledge_items(connection.execute(_recent_knowledge_query(user_id)).all()),
+                recent_comments=_comment_items(connection.execute(_recent_comments_query(user_id)).all())
+            )
+        )
+    return len(user_ids)
+
+async def get_user_stats(db: AsyncSession, user_id: int) -> UserStats:
+    """
+    ユーザーの統計行を主キーで取得する（読み取りのみ）
+
+    Note:
+        - 行がない場合はまだ書き込みのないユーザーのため、件数0の統計を返す
+        - 最近の活動がまだない行（マイグレーションで作成した行など）は、その場で取得して返す
+        - 返した値を変更してもセッションには反映されない（行がない・最近の活動を補った場合は
+          セッションに追加しない別のオブジェクトを返す）
+    """
+    stats = await db.get(UserStats, user_id)
+    record_cache(
+        "user_stats",
+        stats is not None and stats.recent_knowledge is not None and stats.recent_comments is not None
+    )
+    if stats is None:
+        return UserStats(
+            user_id=user_id, knowledge_count=0, comment_count=0, total_views=0,
+            recent_knowledge=[], recent_comments=[]
+        )
+    if stats.recent_knowledge is not None and stats.recent_comments is not None:
+        return stats
+    return UserStats(
+        user_id=user_id,
+        knowledge_count=stats.knowledge_count,
+        comment_count=stats.comment_count,
+        total_views=stats.total_views,
+        recent_knowledge=stats.recent_knowledge if stats.recent_knowledge is not None else await _recent_knowledge(db, user_id),
+        recent_comments=stats.recent_comments if stats.recent_comments is not None else await _recent_comments(db, user_id)
+    )
+
+async def increment_user_stats(db: AsyncSession, user_id: int, knowledge: int = 0, comments: int = 0, views: int = 0) -> None:
+    """
+    ユーザーの統計値に差分を加算する
+
+    Note:
+        - 統計行がまだない場合は差分を件数として作成する（最近の活動は取得時に作成される）
+        - コミットは呼び出し側で行う（件数の元になる書き込みと同じトランザクションでコミットする）
+    """
+    await increment_or_insert(
+        db,
+        UserStats,
+        {"user_id": user_id},
+        {"knowledge_count": knowledge, "comment_count": comments, "total_views": views}
+    )
+
+async def refresh_recent_knowledge(db: AsyncSession, user_id: int) -> None:
+    """最近のナレッジを作り直す（未フラッシュの変更を反映するため先にフラッシュする）"""
+    await db.flush()
+    await db.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(recent_knowledge=await _recent_knowledge(db, user_id))
+        .execution_options(synchronize_session=False)
+    )
+
+async def refresh_recent_comments(db: AsyncSession, user_id: int) -> None:
+    """最近のコメントを作り直す（未フラッシュの変更を反映するため先にフラッシュする）"""
+    await db.flush()
+    await db.execute(
+        update(UserStats)
+        .where(UserStats.user_id == user_id)
+        .values(recent_comments=await _recent_comments(db, user_id))
+        .execution_options(synchronize_session=False)
+    )